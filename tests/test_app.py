@@ -3,10 +3,19 @@ from webob import Request
 from webob import Response
 from webtest.compat import to_bytes
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from webtest.debugapp import debug_app
 from webtest import http
+from webtest import utils
+from webtest.response import LiteTestResponse
 from tests.compat import unittest
 import os
+import pickle
+import shutil
+import time
+import tempfile
+import threading
+from io import BytesIO
 from unittest import mock
 import webtest
 
@@ -43,6 +52,39 @@ class TestApp(unittest.TestCase):
             [(b'key', b'value')], [])
         self.assertIn(to_bytes('name="key"'), data[-1])
 
+    def test_encode_multipart_stream(self):
+        content = b'x' * 4096
+        content_type, body = self.app.encode_multipart_stream(
+            [('key', 'value'), ('upload', webtest.Upload('a.txt', content))],
+            [])
+        self.assertTrue(content_type.startswith('multipart/form-data'))
+        self.assertIn(content, body.parts)
+        files = [p for p in body.parts if isinstance(p, utils.FilePart)]
+        self.assertEqual(len(files), 0)
+
+        app = webtest.TestApp(debug_app,
+                              relative_to=os.path.dirname(__file__))
+        content_type, body = app.encode_multipart_stream(
+            [], [('file', 'html%s404.html' % os.sep)])
+        files = [p for p in body.parts if isinstance(p, utils.FilePart)]
+        self.assertEqual(len(files), 1)
+        # files given by name are read and closed, not kept mapped
+        self.assertFalse(files[0].shared)
+        self.assertIn(b'404.html', body.getvalue())
+        self.assertEqual(len(body), len(body.getvalue()))
+
+    def test_encode_multipart_override(self):
+        class App(webtest.TestApp):
+            def encode_multipart(self, params, files):
+                content_type, body = super().encode_multipart(params, files)
+                return content_type, body.replace(b'value', b'other')
+
+        app = App(debug_app)
+        res = app.post('/', {'key': 'value'},
+                       upload_files=[('file', 'a.txt', b'data')])
+        self.assertIn('other', res)
+        self.assertNotIn('value', res)
+
     def test_encode_multipart_content_type(self):
         data = self.app.encode_multipart(
             [], [('file', 'data.txt', b'data',
@@ -121,8 +163,67 @@ class TestParserFeature(unittest.TestCase):
 
     def test_parser_features(self):
         app = webtest.TestApp(debug_app, parser_features='custom')
-        self.assertEqual(app.RequestClass.ResponseClass.parser_features,
-                         'custom')
+        self.assertEqual(app.parser_features, 'custom')
+        self.assertEqual(app.get('/').parser_features, 'custom')
+
+    def test_parser_features_per_app(self):
+        app = webtest.TestApp(debug_app, parser_features='xml')
+        other = webtest.TestApp(debug_app)
+        self.assertEqual(app.get('/').parser_features, 'xml')
+        self.assertEqual(other.get('/').parser_features, 'html.parser')
+        self.assertEqual(webtest.TestResponse.parser_features,
+                         'html.parser')
+        other.set_parser_features('lxml')
+        self.assertEqual(other.get('/').parser_features, 'lxml')
+        self.assertEqual(app.get('/').parser_features, 'xml')
+
+    def test_parser_features_lite(self):
+        app = webtest.TestApp(debug_app, parser_features='custom',
+                              response_class=LiteTestResponse)
+        res = app.get('/')
+        self.assertEqual(res.parser_features, 'custom')
+        self.assertEqual(res.response().parser_features, 'custom')
+        result = app.batch(['/'])[0]
+        self.assertEqual(result.response().parser_features, 'custom')
+
+
+class TestThreads(unittest.TestCase):
+
+    def test_set_authorization_while_requesting(self):
+        app = webtest.TestApp(debug_app, extra_environ={'HTTP_X_A': 'a'})
+        done = threading.Event()
+
+        def toggle():
+            while not done.is_set():
+                app.set_authorization(('Bearer', 'token'))
+                app.authorization = None
+                app.restore(snapshot)
+
+        snapshot = app.snapshot()
+        thread = threading.Thread(target=toggle)
+        thread.start()
+        try:
+            for i in range(200):
+                res = app.get('/')
+                self.assertEqual(res.request.environ['HTTP_X_A'], 'a')
+                app.fork()
+        finally:
+            done.set()
+            thread.join()
+
+    def test_apps_in_threads(self):
+        apps = [webtest.TestApp(debug_app, parser_features=str(i))
+                for i in range(4)]
+
+        def run(app):
+            for i in range(20):
+                app.set_cookie('n', 'v%d' % i)
+                res = app.get('/')
+                assert res.parser_features == app.parser_features
+            return app.cookies['n'].strip('"')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(executor.map(run, apps)), ['v19'] * 4)
 
 
 class TestAppError(unittest.TestCase):
@@ -149,6 +250,40 @@ class TestAppError(unittest.TestCase):
         webtest.AppError(to_bytes('message %s'), resp)
         webtest.AppError('messag\xe9 %s', b'\xe9')
 
+    def test_app_error_is_lazy(self):
+        app = webtest.TestApp(debug_app)
+        with self.assertRaises(webtest.AppError) as cm:
+            app.get('/', params={'status': '404 Not Found'})
+        err = cm.exception
+        self.assertIsNone(err._formatted)
+        self.assertIn('404 Not Found (not 200 OK', str(err))
+        self.assertEqual(err.args, (str(err),))
+        self.assertIn('404 Not Found', repr(err))
+
+    def test_app_error_long_body(self):
+        body = b'head' + b'x' * 100000 + b'tail'
+        resp = Response(body, content_type='text/html', charset='utf8')
+        resp.headers['X-Long'] = 'y' * 200
+        err = webtest.AppError('message %s', resp)
+        message = str(err)
+        self.addCleanup(os.remove, err.body_path)
+        self.assertTrue(err.body_path.endswith('.html'))
+        with open(err.body_path, 'rb') as fd:
+            self.assertEqual(fd.read(), body)
+        self.assertTrue(message.startswith('message head'))
+        self.assertIn('[... %d bytes omitted, full body of %d bytes in %s'
+                      % (len(body) - 4096 - 1024, len(body), err.body_path),
+                      message)
+        self.assertIn('xxtail\nHeaders:\n', message)
+        self.assertIn('  X-Long: ' + 'y' * 77 + '...', message)
+        self.assertLess(len(message), 6000)
+        self.assertEqual(str(err), message)
+
+    def test_app_error_pickle(self):
+        err = webtest.AppError('message %s', Response(b'blah'))
+        self.assertEqual(pickle.loads(pickle.dumps(err)).args,
+                         ('message blah',))
+
 
 class TestPasteVariables(unittest.TestCase):
 
@@ -563,6 +698,23 @@ __end__:fileupload:mapping
 description:testdescription
 Submit:Submit""".strip(), display, display)
 
+    def test_post_with_upload_path(self):
+        deform_upload_file_app = get_submit_app('deform',
+                                                deform_upload_fields_text)
+        app = webtest.TestApp(deform_upload_file_app)
+        with tempfile.NamedTemporaryFile(suffix='.txt') as fd:
+            fd.write(b'content read from disk')
+            fd.flush()
+            for i in range(2):
+                display = app.post("/", OrderedDict([
+                    ('title', 'testtitle'),
+                    ('fileupload', webtest.Upload('test.txt', path=fd.name)),
+                    ('Submit', 'Submit')]))
+                self.assertIn(
+                    'fileupload:test.txt:content read from disk', display)
+            self.assertIs(utils.map_file(fd.name), utils.map_file(fd.name))
+        utils.clear_mapped_files()
+
     def test_field_order_is_across_all_fields(self):
         fields = """
 <input type="text" name="letter" value="a">
@@ -704,3 +856,574 @@ class TestRequest(unittest.TestCase):
 
     def test_pytest_collection_disabled(self):
         self.assertFalse(webtest.TestRequest.__test__)
+
+
+class TestPrepare(unittest.TestCase):
+
+    def setUp(self):
+        self.app = webtest.TestApp(debug_app)
+
+    def test_prepare_get(self):
+        get_item = self.app.prepare('GET', '/items/{id}?format={fmt}')
+        res = get_item(id=1, fmt='json')
+        self.assertIn('PATH_INFO: /items/1', res)
+        self.assertIn('QUERY_STRING: format=json', res)
+        self.assertIn('REQUEST_METHOD: GET', res)
+        res = get_item(id=2, fmt='html', params={'page': 3})
+        self.assertIn('PATH_INFO: /items/2', res)
+        self.assertIn('QUERY_STRING: format=html&page=3', res)
+
+    def test_prepare_quotes_values(self):
+        search = self.app.prepare('GET', '/items/{id}/{n:03d}?q={q}&r={r!r}')
+        res = search(id='50%41 b/c', n=7, q='a&b=1 2', r='x')
+        environ = res.request.environ
+        self.assertEqual(environ['PATH_INFO'], '/items/50%41 b/c/007')
+        self.assertEqual(environ['QUERY_STRING'], "q=a%26b%3D1+2&r=%27x%27")
+        self.assertEqual(res.request.GET['q'], 'a&b=1 2')
+
+        get_user = self.app.prepare('GET', '/users/{user.name}')
+        user = mock.Mock()
+        user.name = 'bob'
+        self.assertIn('PATH_INFO: /users/bob', get_user(user=user))
+        self.assertRaises(KeyError, get_user)
+
+    def test_prepare_post(self):
+        create = self.app.prepare('POST', '/items/',
+                                  headers={'X-Token': 'secret'},
+                                  content_type='application/json')
+        res = create(body='{"name": "foo"}')
+        self.assertIn('CONTENT_TYPE: application/json', res)
+        self.assertIn('HTTP_X_TOKEN: secret', res)
+        self.assertIn('{"name": "foo"}', res)
+
+        create = self.app.prepare('POST', '/items/')
+        res = create(body={'name': 'foo'})
+        self.assertIn('CONTENT_TYPE: application/x-www-form-urlencoded', res)
+        self.assertIn('name=foo', res)
+
+    def test_prepare_does_not_share_environ(self):
+        get_item = self.app.prepare('GET', '/items/{id}')
+        res1 = get_item(id=1, headers={'X-Once': '1'})
+        res2 = get_item(id=2)
+        self.assertIsNot(res1.request.environ, res2.request.environ)
+        self.assertNotIn('HTTP_X_ONCE', res2.request.environ)
+        self.assertNotIn('HTTP_X_ONCE', get_item.environ)
+        self.assertIsNot(res1.request.environ['wsgi.input'],
+                         res2.request.environ['wsgi.input'])
+
+    def test_prepare_status(self):
+        get_page = self.app.prepare('GET', '/?status={code}')
+        self.assertRaises(webtest.AppError, get_page, code=404)
+        res = get_page(code=404, status=404)
+        self.assertEqual(res.status_int, 404)
+        res = get_page(code=500, expect_errors=True)
+        self.assertEqual(res.status_int, 500)
+
+
+class TestMap(unittest.TestCase):
+
+    def test_map_keeps_order(self):
+        app = webtest.TestApp(debug_app)
+        urls = ['/page/%s' % i for i in range(20)]
+        urls.append(webtest.TestRequest.blank('/last', method='POST'))
+        res = app.map(urls, workers=4)
+        self.assertIsInstance(res, webtest.app.MapResult)
+        self.assertEqual(len(res), 21)
+        for i, r in enumerate(res[:20]):
+            self.assertIn('PATH_INFO: /page/%s' % i, r)
+        self.assertIn('REQUEST_METHOD: POST', res[-1])
+        self.assertEqual(len(res.durations), 21)
+        self.assertGreater(res.elapsed, 0)
+        self.assertGreaterEqual(res.busy, max(res.durations))
+
+    def test_map_runs_concurrently(self):
+        def sleepy_app(environ, start_response):
+            time.sleep(.05)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+        app = webtest.TestApp(sleepy_app)
+        res = app.map(['/'] * 16, workers=8)
+        self.assertLess(res.elapsed, res.busy / 2)
+
+    def test_map_status(self):
+        app = webtest.TestApp(debug_app)
+        self.assertRaises(webtest.AppError, app.map, ['/?status=404'])
+        res = app.map(['/?status=404'], status=404)
+        self.assertEqual(res[0].status_int, 404)
+
+    def test_map_sessions(self):
+        def cookie_app(environ, start_response):
+            req = Request(environ)
+            resp = Response(req.cookies.get('seen', 'none'))
+            resp.set_cookie('seen', req.path_info.strip('/'))
+            return resp(environ, start_response)
+        app = webtest.TestApp(cookie_app)
+        app.set_cookie('seen', 'start')
+        res = app.map(['/a', '/b'], workers=2, session='per-worker')
+        self.assertEqual({r.text for r in res} - {'a', 'b'}, {'start'})
+        self.assertEqual(app.cookies, {'seen': '"start"'})
+
+        app.map(['/c'], session='shared')
+        self.assertEqual(app.cookies, {'seen': 'c'})
+
+        self.assertRaises(ValueError, app.map, ['/'], session='global')
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_specs(self):
+        app = webtest.TestApp(debug_app)
+        results = app.batch([
+            '/page',
+            ('GET', '/search', {'q': 'web'}),
+            ('POST', '/items', {'name': 'foo'}),
+            {'method': 'put', 'url': '/items/1', 'json': {'name': 'bar'},
+             'headers': {'X-Token': 'abc'}},
+            webtest.TestRequest.blank('/req', method='DELETE'),
+        ])
+        self.assertEqual(len(results), 5)
+        for result in results:
+            self.assertIsInstance(result, webtest.app.BatchResult)
+            self.assertEqual(result.status, '200 OK')
+            self.assertEqual(result.status_int, 200)
+            self.assertIsInstance(result.headers, tuple)
+            self.assertGreater(result.elapsed, 0)
+        self.assertIn(b'PATH_INFO: /page', results[0].body)
+        self.assertIn(b'QUERY_STRING: q=web', results[1].body)
+        self.assertIn(b'name=foo', results[2].body)
+        self.assertIn(b'REQUEST_METHOD: PUT', results[3].body)
+        self.assertIn(b'{"name": "bar"}', results[3].body)
+        self.assertIn(b'CONTENT_TYPE: application/json', results[3].body)
+        self.assertIn(b'HTTP_X_TOKEN: abc', results[3].body)
+        self.assertIn(b'REQUEST_METHOD: DELETE', results[4].body)
+        self.assertEqual(results[0].header('content-type'), 'text/plain')
+        self.assertIsNone(results[0].header('X-Missing'))
+        self.assertIn('200 OK', repr(results[0]))
+
+    def test_response(self):
+        app = webtest.TestApp(debug_app)
+        result, = app.batch(['/page'])
+        res = result.response()
+        self.assertIsInstance(res, webtest.TestResponse)
+        self.assertIs(result.response(), res)
+        self.assertIs(res.test_app, app)
+        self.assertEqual(res.request.path_info, '/page')
+        res.mustcontain('PATH_INFO: /page')
+
+    def test_json(self):
+        def json_app(environ, start_response):
+            start_response('201 Created',
+                           [('Content-Type', 'application/json')])
+            return [b'{"id": 3}']
+        app = webtest.TestApp(json_app)
+        result, = app.batch([{'method': 'POST', 'url': '/', 'json': {},
+                              'status': 201}])
+        self.assertEqual(result.json, {'id': 3})
+
+    def test_json_gzip(self):
+        import gzip
+
+        def json_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json'),
+                                      ('Content-Encoding', 'gzip')])
+            return [gzip.compress(b'{"id": 3}')]
+        result, = webtest.TestApp(json_app).batch(['/'])
+        self.assertEqual(result.json, {'id': 3})
+        self.assertIsNone(result._response)
+
+    def test_status(self):
+        app = webtest.TestApp(debug_app)
+        with self.assertRaises(webtest.AppError) as cm:
+            app.batch(['/', '/?status=404'])
+        self.assertIn('404 Not Found', str(cm.exception))
+        results = app.batch(['/?status=404', '/?status=500'],
+                            expect_errors=True)
+        self.assertEqual([r.status_int for r in results], [404, 500])
+        results = app.batch([{'url': '/?status=404', 'status': 404}])
+        self.assertEqual(results[0].status_int, 404)
+        with self.assertRaises(webtest.AppError):
+            app.batch(['/'], status=404)
+
+    def test_errors(self):
+        app = webtest.TestApp(debug_app)
+        with self.assertRaises(webtest.AppError):
+            app.batch(['/?errorlog=oops'])
+        result, = app.batch(['/?errorlog=oops'], expect_errors=True)
+        self.assertEqual(result.response().errors, 'oops')
+
+    def test_cookies(self):
+        def cookie_app(environ, start_response):
+            req = Request(environ)
+            resp = Response(req.cookies.get('seen', 'none'))
+            resp.set_cookie('seen', req.path_info.strip('/'))
+            return resp(environ, start_response)
+        app = webtest.TestApp(cookie_app)
+        results = app.batch(['/a', '/b'])
+        self.assertEqual([r.body for r in results], [b'none', b'a'])
+        self.assertEqual(app.cookies, {'seen': 'b'})
+
+    def test_hosts(self):
+        app = webtest.TestApp(debug_app, extra_environ={'HTTP_X_APP': '1'})
+        results = app.batch(['http://example.com/a', '/b',
+                             'https://example.com:8443/c'], lint=False)
+        self.assertIn(b'HTTP_HOST: example.com:80', results[0].body)
+        self.assertIn(b'HTTP_HOST: localhost:80', results[1].body)
+        self.assertIn(b'HTTP_HOST: example.com:8443', results[2].body)
+        self.assertIn(b'wsgi.url_scheme: \'https\'', results[2].body)
+        for result in results:
+            self.assertIn(b'HTTP_X_APP: 1', result.body)
+
+    def test_generator_app(self):
+        def generator_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            yield b'one'
+            yield b'two'
+        result, = webtest.TestApp(generator_app).batch(['/'])
+        self.assertEqual(result.body, b'onetwo')
+
+
+def streaming_app(environ, start_response):
+    req = Request(environ)
+    status = req.GET.get('status', '200 OK')
+    if 'errorlog' in req.GET:
+        environ['wsgi.errors'].write(req.GET['errorlog'])
+    start_response(status, [('Content-Type', 'text/plain'),
+                            ('Set-Cookie', 'streamed=yes; Path=/')])
+    for i in range(int(req.GET.get('chunks', 3))):
+        environ['webtest.produced'] = i + 1
+        yield b'chunk%d\n' % i
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        self.app = webtest.TestApp(streaming_app)
+
+    def test_time_to_first_byte_excludes_caller(self):
+        def slow_body():
+            time.sleep(.02)
+            yield b''
+            yield b'first'
+
+        def eager_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return slow_body()
+
+        for app in (streaming_app, eager_app):
+            res = webtest.TestApp(app).get('/', stream=True)
+            time.sleep(.1)
+            self.assertTrue(b''.join(res.iter_chunks()))
+            self.assertLess(res.time_to_first_byte, .09)
+        self.assertGreaterEqual(res.time_to_first_byte, .02)
+
+    def test_body_is_not_drained(self):
+        res = self.app.get('/', stream=True)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res.content_type, 'text/plain')
+        self.assertEqual(self.app.cookies, {'streamed': 'yes'})
+        # the first chunk is needed to get the status of a generator
+        environ = res.request.environ
+        self.assertEqual(environ['webtest.produced'], 1)
+        self.assertIsNone(res.time_to_first_byte)
+        chunks = res.iter_chunks()
+        self.assertEqual(next(chunks), b'chunk0\n')
+        self.assertEqual(environ['webtest.produced'], 1)
+        self.assertGreater(res.time_to_first_byte, 0)
+        self.assertEqual(next(chunks), b'chunk1\n')
+        self.assertEqual(environ['webtest.produced'], 2)
+        self.assertEqual(list(chunks), [b'chunk2\n'])
+        self.assertEqual(res.errors, '')
+
+    def test_status_checked_on_close(self):
+        res = self.app.get('/', params={'status': '500 Error'}, stream=True)
+        self.assertEqual(res.status_int, 500)
+        self.assertRaises(webtest.AppError, res.close)
+        res = self.app.get('/', params={'status': '500 Error'}, stream=True,
+                           status=500)
+        self.assertEqual(len(list(res.iter_chunks())), 3)
+        res = self.app.post('/?status=500+Error', stream=True)
+        with self.assertRaises(webtest.AppError):
+            list(res.iter_chunks())
+
+    def test_errors_checked_on_close(self):
+        res = self.app.get('/', params={'errorlog': 'oops'}, stream=True)
+        with self.assertRaises(webtest.AppError):
+            with res:
+                pass
+        self.assertEqual(res.errors, 'oops')
+        res = self.app.request('/?errorlog=oops', stream=True,
+                               expect_errors=True)
+        with res:
+            pass
+        self.assertEqual(res.errors, 'oops')
+
+    def test_context_manager_does_not_hide_exceptions(self):
+        res = self.app.get('/', params={'status': '500 Error'}, stream=True)
+        with self.assertRaises(KeyError):
+            with res:
+                raise KeyError('test')
+
+    def test_lazy_start_response(self):
+        def lazy_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            yield b'first'
+            environ['webtest.second'] = True
+            yield b'second'
+        app = webtest.TestApp(lazy_app)
+        res = app.get('/', stream=True)
+        self.assertNotIn('webtest.second', res.request.environ)
+        with res:
+            self.assertEqual(b''.join(res.iter_chunks()), b'firstsecond')
+
+        def silent_app(environ, start_response):
+            return []
+        app = webtest.TestApp(silent_app, lint=False)
+        self.assertRaises(AssertionError, app.get, '/', stream=True)
+
+    def test_iter_chunks_without_stream(self):
+        res = self.app.get('/')
+        self.assertEqual(list(res.iter_chunks()),
+                         [b'chunk0\nchunk1\nchunk2\n'])
+        res.close()
+
+    def test_body_access_before_close(self):
+        res = self.app.get('/', stream=True)
+        self.assertEqual(res.body, b'chunk0\nchunk1\nchunk2\n')
+        res.close()
+        self.assertEqual(res.body, b'chunk0\nchunk1\nchunk2\n')
+
+
+def input_app(environ, start_response):
+    # report how the body was sent, then read it by small pieces
+    wsgi_input = environ['wsgi.input']
+    chunks = []
+    if environ.get('CONTENT_LENGTH'):
+        todo = int(environ['CONTENT_LENGTH'])
+        while todo:
+            chunk = wsgi_input.read(min(todo, 3))
+            chunks.append(chunk)
+            todo -= len(chunk)
+    else:
+        assert environ['wsgi.input_terminated']
+        chunks = list(iter(lambda: wsgi_input.read(3), b''))
+    body = '%s|%s|%s|%s' % (
+        environ.get('CONTENT_LENGTH'),
+        environ.get('CONTENT_TYPE'),
+        environ.get('HTTP_TRANSFER_ENCODING'),
+        b''.join(chunks).decode('ascii'))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [body.encode('ascii')]
+
+
+class TestStreamedBody(unittest.TestCase):
+
+    def setUp(self):
+        self.app = webtest.TestApp(input_app)
+
+    def test_generator(self):
+        consumed = []
+
+        def chunks():
+            for chunk in (b'hello', b' ', b'world'):
+                consumed.append(chunk)
+                yield chunk
+
+        res = self.app.post('/', chunks())
+        self.assertEqual(res.text,
+                         'None|application/octet-stream|chunked|hello world')
+        self.assertEqual(len(consumed), 3)
+
+    def test_file_object(self):
+        with tempfile.TemporaryFile() as fd:
+            fd.write(b'0123456789')
+            fd.seek(2)
+            res = self.app.put('/', fd, content_type='text/plain')
+        self.assertEqual(res.text, '8|text/plain|None|23456789')
+
+        res = self.app.post('/', BytesIO(b'data'))
+        self.assertEqual(res.text, '4|application/octet-stream|None|data')
+
+    def test_request_body(self):
+        res = self.app.request('/', method='POST', body=iter([b'a', b'b']))
+        self.assertEqual(res.text, 'None|None|chunked|ab')
+
+    def test_prepared_body(self):
+        upload = self.app.prepare('POST', '/', content_type='text/plain')
+        res = upload(body=iter([b'a', b'b']))
+        self.assertEqual(res.text, 'None|text/plain|chunked|ab')
+
+    def test_upload_files_conflict(self):
+        self.assertRaises(ValueError, self.app.post, '/', iter([b'a']),
+                          upload_files=[('file', 'a.txt', b'data')])
+
+
+class TestTimings(unittest.TestCase):
+
+    def test_phases(self):
+        def slow_app(environ, start_response):
+            time.sleep(.02)
+            start_response('200 OK', [('Content-Type', 'text/plain'),
+                                      ('Set-Cookie', 'a=b')])
+            yield b'first'
+            time.sleep(.02)
+            yield b'second'
+        app = webtest.TestApp(slow_app, timings=True)
+        res = app.get('/')
+        timings = res.timings
+        self.assertNotIn('webtest.started', res.request.environ)
+        for name in timings.phases:
+            self.assertGreaterEqual(getattr(timings, name), 0, name)
+        self.assertGreaterEqual(timings.start_response, .02)
+        self.assertGreaterEqual(timings.drain, .02)
+        self.assertGreaterEqual(timings.app, .04)
+        self.assertAlmostEqual(timings.app + timings.overhead, timings.wall,
+                               places=3)
+        self.assertGreaterEqual(timings.cpu, 0)
+        self.assertEqual(set(timings.as_dict()),
+                         set(timings.phases) | {'wall', 'cpu'})
+        self.assertIn('wall=', repr(timings))
+
+    def test_skipped_phases(self):
+        def empty_app(environ, start_response):
+            start_response('204 No Content', [])
+            return []
+        app = webtest.TestApp(empty_app, timings=True)
+        res = app.get('/', expect_errors=True)
+        self.assertIsNone(res.timings.first_chunk)
+        self.assertIsNone(res.timings.checks)
+        self.assertIsNotNone(res.timings.drain)
+
+        req = webtest.TestRequest.blank('/')
+        res = app.do_request(req)
+        self.assertGreaterEqual(res.timings.environ, 0)
+
+        get = app.prepare('GET', '/')
+        self.assertGreaterEqual(get().timings.wall, 0)
+
+    def test_stream(self):
+        app = webtest.TestApp(streaming_app, timings=True)
+        res = app.get('/', stream=True)
+        self.assertIsNotNone(res.timings.wall)
+        self.assertIsNone(res.timings.drain)
+        self.assertIsNone(res.timings.checks)
+        list(res.iter_chunks())
+        self.assertIsNotNone(res.timings.drain)
+        self.assertIsNotNone(res.timings.checks)
+
+    def test_disabled(self):
+        app = webtest.TestApp(debug_app)
+        res = app.get('/')
+        self.assertIsNone(res.timings)
+        self.assertNotIn('webtest.started', res.request.environ)
+        self.assertIsNone(app.prepare('GET', '/')().timings)
+        self.assertIsNone(app.get('/', stream=True).timings)
+
+
+class TestProfile(unittest.TestCase):
+
+    def test_profile(self):
+        app = webtest.TestApp(debug_app, profile=True)
+        app.get('/users/1')
+        app.get('/users/2')
+        app.post('/users/550e8400-e29b-41d4-a716-446655440000')
+        profiler = app.profiler
+        self.assertEqual(profiler.requests, {
+            'GET /users/{id}': 2, 'POST /users/{uuid}': 1})
+        self.assertEqual(set(profiler.routes()), set(profiler.requests))
+        report = profiler.report(limit=5)
+        self.assertIn('GET /users/{id}: 2 requests', report)
+        self.assertIn('debugapp.py', report)
+
+        directory = tempfile.mkdtemp()
+        try:
+            paths = profiler.dump(directory)
+            self.assertEqual(
+                sorted(os.path.basename(path) for path in paths),
+                ['GET_users_{id}.pstats', 'POST_users_{uuid}.pstats'])
+        finally:
+            shutil.rmtree(directory)
+        profiler.clear()
+        self.assertEqual(profiler.stats, {})
+
+    def test_profiling(self):
+        app = webtest.TestApp(debug_app)
+        self.assertIsNone(app.profiler)
+        with app.profiling() as profiler:
+            app.get('/')
+            with self.assertRaises(webtest.AppError):
+                app.get('/', params={'status': '500 Error'})
+        self.assertIsNone(app.profiler)
+        app.get('/')
+        self.assertEqual(profiler.requests, {'GET /': 2})
+
+    def test_shared_profiler(self):
+        app = webtest.TestApp(debug_app, profile=True)
+        other = webtest.TestApp(debug_app, profile=app.profiler)
+        app.get('/')
+        other.get('/')
+        result = app.map(['/', '/'], workers=2)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(app.profiler.requests, {'GET /': 4})
+
+
+class TestTraceMemory(unittest.TestCase):
+
+    def test_trace_memory(self):
+        def greedy_app(environ, start_response):
+            waste = [bytearray(1024 * 1024) for i in range(4)]
+            del waste
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'x' * 100000]
+        app = webtest.TestApp(greedy_app, trace_memory=True)
+        res = app.get('/')
+        self.assertGreaterEqual(res.memory.peak, 4 * 1024 * 1024)
+        self.assertLess(res.memory.retained, 1024 * 1024)
+        self.assertGreaterEqual(res.memory.retained, 100000)
+        self.assertTrue(res.memory.top)
+        self.assertLessEqual(len(res.memory.top), 10)
+        self.assertIn('test_app.py', res.memory.format(limit=1))
+        self.assertIn('peak=', repr(res.memory))
+
+        self.assertIsNone(webtest.TestApp(greedy_app).get('/').memory)
+
+
+class TestFork(unittest.TestCase):
+
+    def setUp(self):
+        def cookie_app(environ, start_response):
+            req = Request(environ)
+            headers = [('Content-Type', 'text/plain')]
+            if 'set' in req.GET:
+                headers.append(('Set-Cookie', req.GET['set'] + '; Path=/'))
+            start_response('200 OK', headers)
+            return [environ.get('HTTP_COOKIE', '').encode('latin-1')]
+        self.app = webtest.TestApp(cookie_app,
+                                   extra_environ={'REMOTE_USER': 'bob'})
+        self.app.get('/', params={'set': 'session=1'})
+
+    def test_fork(self):
+        fork = self.app.fork()
+        self.assertIs(fork.app, self.app.app)
+        self.assertEqual(fork.cookies, {'session': '1'})
+        fork.get('/', params={'set': 'session=2'})
+        fork.extra_environ['REMOTE_USER'] = 'alice'
+        self.assertEqual(fork.get('/').text, 'session=2')
+        self.assertEqual(self.app.get('/').text, 'session=1')
+        self.assertEqual(self.app.extra_environ, {'REMOTE_USER': 'bob'})
+
+    def test_snapshot_restore(self):
+        cookiejar = self.app.cookiejar
+        extra_environ = self.app.extra_environ
+        snapshot = self.app.snapshot()
+        for i in range(2):
+            self.app.get('/', params={'set': 'other=%s' % i})
+            self.app.extra_environ['REMOTE_USER'] = 'alice'
+            self.assertEqual(len(self.app.cookies), 2)
+            self.app.restore(snapshot)
+            self.assertEqual(self.app.cookies, {'session': '1'})
+            self.assertEqual(self.app.extra_environ, {'REMOTE_USER': 'bob'})
+        self.assertIs(self.app.cookiejar, cookiejar)
+        self.assertIs(self.app.extra_environ, extra_environ)
+        self.app.reset()
+        self.app.restore(snapshot)
+        self.assertEqual(self.app.get('/').text, 'session=1')
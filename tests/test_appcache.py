@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import webtest
+from webtest import appcache
+from webtest.appcache import AppCache
+from tests.compat import unittest
+
+HERE = os.path.dirname(__file__)
+
+
+class TestAppCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.config = os.path.join(self.dir, 'test.ini')
+        shutil.copy(os.path.join(HERE, 'deploy.ini'), self.config)
+        self.loads = []
+        self.cache = AppCache()
+
+    def loader(self, uri, relative_to=None):
+        self.loads.append((uri, relative_to))
+        return object()
+
+    def test_config_path(self):
+        self.assertEqual(
+            AppCache.config_path('config:test.ini#main', '/srv'),
+            os.path.normpath('/srv/test.ini'))
+        self.assertEqual(
+            AppCache.config_path('config:/etc/test.ini', '/srv'),
+            os.path.normpath('/etc/test.ini'))
+        self.assertIsNone(AppCache.config_path('egg:myapp', '/srv'))
+
+    def test_hit(self):
+        app = self.cache.load('config:test.ini', self.dir, self.loader)
+        self.assertIs(
+            self.cache.load('config:test.ini', self.dir, self.loader), app)
+        self.assertEqual(len(self.loads), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['apps']),
+                         (1, 1, 1))
+        self.assertEqual(stats['saved'], stats['load_time'])
+        self.assertIn('1 hits', repr(self.cache))
+
+    def test_key(self):
+        app = self.cache.load('config:test.ini', self.dir, self.loader)
+        self.assertIsNot(
+            self.cache.load('config:test.ini#main', self.dir, self.loader),
+            app)
+        self.assertIsNot(
+            self.cache.load('config:%s' % self.config, None, self.loader),
+            app)
+        self.assertEqual(len(self.loads), 3)
+
+    def test_modified(self):
+        app = self.cache.load('config:test.ini', self.dir, self.loader)
+        stat = os.stat(self.config)
+        os.utime(self.config, ns=(stat.st_atime_ns,
+                                  stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNot(
+            self.cache.load('config:test.ini', self.dir, self.loader), app)
+        self.assertEqual(self.cache.stats()['apps'], 1)
+
+    def test_invalidate(self):
+        self.cache.load('config:test.ini', self.dir, self.loader)
+        self.cache.load('config:test.ini', '/other', self.loader)
+        self.cache.load('egg:myapp', None, self.loader)
+        self.assertEqual(
+            self.cache.invalidate('config:test.ini', relative_to='/other'), 1)
+        self.assertEqual(self.cache.invalidate('config:test.ini'), 1)
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.cache.load('config:test.ini', self.dir, self.loader)
+        self.assertEqual(len(self.loads), 4)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['misses'], 0)
+
+    def test_testapp(self):
+        uri = 'config:test.ini#main'
+        app1 = webtest.TestApp(uri, relative_to=self.dir,
+                               app_cache=self.cache)
+        app2 = webtest.TestApp(uri, relative_to=self.dir,
+                               app_cache=self.cache)
+        self.assertIs(app1.app, app2.app)
+        self.assertEqual(app2.get('/').status_int, 200)
+        app3 = webtest.TestApp(uri, relative_to=self.dir)
+        self.assertIsNot(app3.app, app1.app)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_testapp_default_cache(self):
+        self.addCleanup(appcache.cache.clear)
+        uri = 'config:test.ini#main'
+        app1 = webtest.TestApp(uri, relative_to=self.dir, app_cache=True)
+        with mock.patch.dict(os.environ, {'WEBTEST_APP_CACHE': '1'}):
+            app2 = webtest.TestApp(uri, relative_to=self.dir)
+        self.assertIs(app1.app, app2.app)
+        self.assertEqual(appcache.cache.stats()['hits'], 1)
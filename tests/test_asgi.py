@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+from unittest import mock
+
+from tests.compat import unittest
+from webtest.asgi import AsyncTestApp
+import webtest
+
+
+FORM = b'''<html><body>
+<form action="/submit" method="POST">
+    <input type="text" name="name" value="">
+    <input type="submit" name="go" value="Go">
+</form>
+<a href="/json">json</a>
+</body></html>'''
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def asgi_app(scope, receive, send):
+    assert scope['type'] == 'http'
+    path = scope['path']
+    headers = [(b'content-type', b'text/plain')]
+    status = 200
+    if path == '/form':
+        headers = [(b'content-type', b'text/html; charset=utf-8')]
+        body = FORM
+    elif path == '/json':
+        headers = [(b'content-type', b'application/json')]
+        body = json.dumps({'path': path}).encode('utf8')
+    elif path == '/login':
+        headers.append((b'set-cookie', b'session=abc; Path=/'))
+        body = b'logged in'
+    elif path == '/redirect':
+        status = 302
+        headers.append((b'location', b'/json'))
+        body = b''
+    elif path == '/sleep':
+        await asyncio.sleep(.05)
+        body = b'awake'
+    elif path == '/missing':
+        status = 404
+        body = b'not found'
+    else:
+        request_headers = dict(scope['headers'])
+        body = b'\n'.join([
+            scope['method'].encode('ascii'),
+            path.encode('utf8'),
+            scope['query_string'],
+            request_headers.get(b'cookie', b''),
+            await read_body(receive),
+        ])
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+    # send the body in two chunks
+    await send({'type': 'http.response.body', 'body': body[:2],
+                'more_body': True})
+    await send({'type': 'http.response.body', 'body': body[2:]})
+
+
+class TestAsyncTestApp(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.app = AsyncTestApp(asgi_app)
+
+    def test_pytest_collection_disabled(self):
+        self.assertFalse(AsyncTestApp.__test__)
+
+    def test_config_uri_is_refused(self):
+        self.assertRaises(TypeError, AsyncTestApp, 'config:deploy.ini')
+
+    async def test_get(self):
+        res = await self.app.get('/path', params={'a': 'b'})
+        self.assertIsInstance(res, webtest.TestResponse)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res.text.split('\n')[:3], ['GET', '/path', 'a=b'])
+
+    async def test_post(self):
+        res = await self.app.post('/path', {'name': 'value'})
+        self.assertEqual(res.body.split(b'\n')[-1], b'name=value')
+        res = await self.app.post_json('/path', {'name': 'value'})
+        self.assertEqual(res.body.split(b'\n')[-1], b'{"name": "value"}')
+
+    async def test_status(self):
+        with self.assertRaises(webtest.AppError):
+            await self.app.get('/missing')
+        res = await self.app.get('/missing', status=404)
+        self.assertEqual(res.text, 'not found')
+
+    async def test_cookies(self):
+        await self.app.get('/login')
+        self.assertEqual(self.app.cookies, {'session': 'abc'})
+        res = await self.app.get('/path')
+        self.assertEqual(res.text.split('\n')[3], 'session=abc')
+
+    async def test_json_and_follow(self):
+        res = await self.app.get('/redirect')
+        self.assertEqual(res.status_int, 302)
+        res = await res.follow()
+        self.assertEqual(res.json, {'path': '/json'})
+        res = await self.app.get('/redirect')
+        res = await res.maybe_follow()
+        self.assertEqual(res.json, {'path': '/json'})
+
+    async def test_forms_and_click(self):
+        res = await self.app.get('/form')
+        form = res.form
+        form['name'] = 'Bob'
+        res2 = await form.submit('go')
+        self.assertEqual(res2.text.split('\n')[:2], ['POST', '/submit'])
+        self.assertIn('name=Bob', res2.text)
+        res3 = await res.click('json')
+        self.assertEqual(res3.json, {'path': '/json'})
+
+    async def test_concurrent_requests(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        responses = await asyncio.gather(
+            *[self.app.get('/sleep') for i in range(50)])
+        self.assertLess(loop.time() - start, 1)
+        self.assertEqual({res.text for res in responses}, {'awake'})
+
+    async def test_app_must_respond(self):
+        async def silent_app(scope, receive, send):
+            pass
+        app = AsyncTestApp(silent_app)
+        with self.assertRaises(AssertionError):
+            await app.get('/')
+
+    async def test_stream_is_refused(self):
+        with self.assertRaises(ValueError):
+            await self.app.get('/', stream=True)
+
+    def test_target_url_is_refused(self):
+        with mock.patch.dict(os.environ,
+                             {'WEBTEST_TARGET_URL': 'http://localhost:1'}):
+            with self.assertRaises(ValueError) as cm:
+                AsyncTestApp(asgi_app)
+        self.assertIn('WEBTEST_TARGET_URL', str(cm.exception))
+
+    def test_unsupported_options(self):
+        from webtest.response import LiteTestResponse
+        for name, value in [('response_class', LiteTestResponse),
+                            ('http_cache', True), ('profile', True),
+                            ('trace_memory', True), ('timings', True),
+                            ('decode_content', 'lazy'),
+                            ('decode_content', 'stream')]:
+            with self.assertRaises(ValueError) as cm:
+                AsyncTestApp(asgi_app, **{name: value})
+            self.assertIn(name, str(cm.exception))
+
+    def test_unsupported_methods(self):
+        self.assertRaises(NotImplementedError, self.app.batch, ['/'])
+        self.assertRaises(NotImplementedError, self.app.map, ['/'])
+        self.assertRaises(NotImplementedError, self.app.profiling)
+
+    async def test_prepare(self):
+        get_item = self.app.prepare('GET', '/items/{id}')
+        res = await get_item(id=3)
+        self.assertIn(b'/items/3', res.body)
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+
+from tests.compat import unittest
+from webtest import bench
+
+
+class TestBench(unittest.TestCase):
+
+    def test_run(self):
+        results = bench.run('*:get:nolint:*', number=2, repeat=1)
+        names = [result['name'] for result in results['results']]
+        self.assertEqual(names, [
+            'trivial:get:nolint:nocookies', 'trivial:get:nolint:cookies',
+            'trivial:get:nolint:fastcookies',
+            'debugapp:get:nolint:nocookies', 'debugapp:get:nolint:cookies',
+            'debugapp:get:nolint:fastcookies'])
+        for result in results['results']:
+            self.assertGreater(result['us_per_request'], 0)
+            self.assertIs(result['lint'], False)
+
+    def test_prepare(self):
+        results = bench.run('trivial:prepare:lint:*', number=2, repeat=1)
+        self.assertEqual([r['scenario'] for r in results['results']],
+                         ['prepare'] * 3)
+
+    def test_benchmarks(self):
+        names = [name for name, params, setup in bench.benchmarks()]
+        self.assertEqual(len(names), 2 * (1 + 5 * 2 * 3))
+        self.assertEqual(len(set(names)), len(names))
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            bench.main(['--filter', '*:wsgi', '--number', '2',
+                        '--repeat', '1', '--output', path])
+            with open(path) as fd:
+                data = json.load(fd)
+        finally:
+            os.remove(path)
+        self.assertEqual([r['name'] for r in data['results']],
+                         ['trivial:wsgi', 'debugapp:wsgi'])
+        self.assertIn('python', data)
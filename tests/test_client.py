@@ -0,0 +1,155 @@
+import socket
+from io import BytesIO
+from http import client as http_client
+
+from tests.compat import unittest
+from webtest.client import PooledClient
+from webtest.debugapp import debug_app
+from webtest import http
+import webtest
+
+
+class TestPooledClient(unittest.TestCase):
+
+    def setUp(self):
+        self.s = http.StopableWSGIServer.create(debug_app)
+        self.s.wait()
+
+    def tearDown(self):
+        self.s.shutdown()
+
+    def test_pooled_suffix(self):
+        app = webtest.TestApp(self.s.application_url + '#pooled')
+        client = app.app.http
+        self.assertIsInstance(client, PooledClient)
+        for i in range(3):
+            resp = app.get('/', params={'i': i})
+            self.assertEqual(resp.status_int, 200)
+            self.assertIn('i=%d' % i, resp)
+        resp = app.post('/', {'name': 'value'})
+        self.assertIn('name=value', resp)
+        self.assertEqual(client.stats(), {
+            'opened': 1, 'requests': 4, 'reused': 3, 'idle': 1,
+            'per_connection': {1: 4}})
+        client.close()
+        self.assertEqual(client.stats()['idle'], 0)
+
+    def test_proxy_client(self):
+        client = PooledClient(pool_size=1, timeout=10)
+        app = webtest.TestApp(self.s.application_url + '#httplib',
+                              proxy_client=client)
+        self.assertIs(app.app.http, client)
+        app.get('/')
+        app.get('/')
+        self.assertEqual(client.opened, 1)
+        self.assertEqual(client.reused, 1)
+        self.assertEqual(repr(client),
+                         '<PooledClient 2 requests on 1 connections>')
+
+    def test_proxy_client_name(self):
+        app = webtest.TestApp(self.s.application_url, proxy_client='pooled')
+        self.assertIsInstance(app.app.http, PooledClient)
+
+    def test_pool_size(self):
+        client = PooledClient(pool_size=1)
+        key = ('http', '%s:%s' % (self.s.adj.host, self.s.adj.port))
+        conns = [client._acquire(key)[0] for i in range(2)]
+        for conn in conns:
+            client._release(key, conn)
+        self.assertEqual(client._idle[key], [conns[0]])
+        self.assertIsNone(conns[1].sock)
+
+    def test_stale_connection(self):
+        client = PooledClient()
+        app = webtest.TestApp(self.s.application_url, proxy_client=client)
+        app.get('/')
+        conn = client._idle[('http', app.app.net_loc)][0]
+        conn.sock.shutdown(socket.SHUT_RDWR)
+        resp = app.get('/', params={'again': 1})
+        self.assertIn('again=1', resp)
+        self.assertEqual(client.opened, 2)
+        self.assertEqual(client.stats()['per_connection'], {1: 2, 2: 1})
+
+
+class FakeResponse:
+    status = 200
+    reason = 'OK'
+    will_close = False
+
+    def getheaders(self):
+        return []
+
+    def getheader(self, name, default=None):
+        return default
+
+    def read(self):
+        return b'ok'
+
+
+class FakeConnection:
+    # errors raised by the next requests or responses, by connection
+    errors = []
+
+    def __init__(self, host, **options):
+        self.error = self.errors.pop(0) if self.errors else None
+
+    def request(self, method, path, body, headers):
+        # a broken pipe happens while sending, the others while reading
+        if isinstance(self.error, BrokenPipeError):
+            raise self.error
+
+    def getresponse(self):
+        if self.error is not None:
+            raise self.error
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+class FakeClient(PooledClient):
+    HTTPConnection = FakeConnection
+
+
+class TestRetries(unittest.TestCase):
+
+    def call(self, client, method):
+        return client('http://example.com/', method, BytesIO(b'x'),
+                      {'Content-Length': '1'})
+
+    def client_with_stale_connection(self, error):
+        client = FakeClient()
+        key = ('http', 'example.com:80')
+        FakeConnection.errors[:] = [error]
+        conn = client._acquire(key)[0]
+        client._release(key, conn)
+        return client
+
+    def test_timeout_is_not_retried(self):
+        for method in ('GET', 'POST'):
+            client = self.client_with_stale_connection(TimeoutError())
+            self.assertRaises(TimeoutError, self.call, client, method)
+            self.assertEqual(client.requests, 1)
+
+    def test_idempotent_method_is_retried(self):
+        client = self.client_with_stale_connection(ConnectionResetError())
+        self.assertEqual(self.call(client, 'PUT')[3], [b'ok'])
+        self.assertEqual(client.requests, 2)
+
+    def test_post_after_response_started_is_not_retried(self):
+        client = self.client_with_stale_connection(ConnectionResetError())
+        self.assertRaises(ConnectionResetError, self.call, client, 'POST')
+        self.assertEqual(client.requests, 1)
+
+    def test_post_without_response_is_retried(self):
+        for error in (http_client.RemoteDisconnected(), BrokenPipeError()):
+            client = self.client_with_stale_connection(error)
+            self.assertEqual(self.call(client, 'POST')[3], [b'ok'])
+            self.assertEqual(client.requests, 2)
+
+    def test_new_connection_is_not_retried(self):
+        client = FakeClient()
+        FakeConnection.errors[:] = [http_client.RemoteDisconnected()]
+        self.assertRaises(http_client.RemoteDisconnected,
+                          self.call, client, 'GET')
+        self.assertEqual(client.requests, 1)
@@ -0,0 +1,110 @@
+from http import cookiejar as http_cookiejar
+from unittest import mock
+
+from webob import Request
+from tests.compat import unittest
+from webtest.cookiejar import FastCookieJar
+from webtest import utils
+import webtest
+
+
+def cookie_app(environ, start_response):
+    req = Request(environ)
+    headers = [('Content-Type', 'text/plain')]
+    for value in req.GET.getall('set'):
+        headers.append(('Set-Cookie', value))
+    start_response('200 OK', headers)
+    return [environ.get('HTTP_COOKIE', '').encode('latin-1')]
+
+
+SET_COOKIES = [
+    'root=1; Path=/',
+    'admin=2; Path=/admin',
+    'secure=3; Path=/; Secure',
+    'local=4; Domain=localhost; Path=/',
+    'short=5; Path=/; Max-Age=60',
+]
+
+URLS = [
+    '/', '/admin', '/admin/users', '/administrator', 'https://localhost/',
+    'https://localhost/admin/', 'http://other.example.com/',
+    'http://localhost:8080/',
+]
+
+
+class TestFastCookieJar(unittest.TestCase):
+
+    def make_app(self, cookiejar=None):
+        if cookiejar is None:
+            cookiejar = FastCookieJar()
+        return webtest.TestApp(cookie_app, cookiejar=cookiejar)
+
+    def test_same_cookies_as_cookiejar(self):
+        fast = self.make_app()
+        slow = self.make_app(
+            http_cookiejar.CookieJar(policy=webtest.app.CookiePolicy()))
+        for app in (fast, slow):
+            app.get('/admin/', params=[('set', c) for c in SET_COOKIES])
+            app.set_cookie('manual', 'value')
+        self.assertEqual(fast.cookies, slow.cookies)
+        for url in URLS:
+            for i in range(2):  # the second time is cached
+                self.assertEqual(fast.get(url).text, slow.get(url).text, url)
+
+    def test_cache_invalidation(self):
+        app = self.make_app()
+        app.get('/', params={'set': 'a=1; Path=/'})
+        self.assertEqual(app.get('/').text, 'a=1')
+        self.assertTrue(app.cookiejar._headers)
+        app.get('/', params={'set': 'a=1; Path=/'})
+        self.assertTrue(app.cookiejar._headers)
+        app.get('/', params={'set': 'a=2; Path=/'})
+        self.assertEqual(app.get('/').text, 'a=2')
+        app.set_cookie('b', '3')
+        self.assertEqual(app.get('/').text, 'a=2; b="3"')
+        app.cookiejar.clear('.localhost', '/', 'b')
+        self.assertEqual(app.get('/').text, 'a=2')
+        app.reset()
+        self.assertEqual(app.get('/').text, '')
+
+    @mock.patch('http.cookiejar.time.time')
+    def test_expires(self, mock_time):
+        app = self.make_app()
+        mock_time.return_value = 1000000000.0
+        app.get('/', params=[('set', 'short=1; Path=/; Max-Age=60'),
+                             ('set', 'long=2; Path=/')])
+        self.assertEqual(app.get('/').text, 'short=1; long=2')
+        mock_time.return_value += 120
+        self.assertEqual(app.get('/').text, 'long=2')
+        self.assertEqual(app.cookies, {'long': '2'})
+
+    def test_explicit_cookie_header(self):
+        app = self.make_app()
+        app.set_cookie('a', '1')
+        res = app.get('/', headers={'Cookie': 'b=2'})
+        self.assertEqual(res.text, 'b=2')
+
+    def test_copies_are_independent(self):
+        app = self.make_app()
+        app.set_cookie('a', '1')
+        self.assertEqual(app.get('/').text, 'a="1"')
+        fork = app.fork()
+        self.assertIsInstance(fork.cookiejar, FastCookieJar)
+        fork.set_cookie('b', '2')
+        self.assertEqual(fork.get('/').text, 'a="1"; b="2"')
+        self.assertEqual(app.get('/').text, 'a="1"')
+
+        snapshot = app.snapshot()
+        app.set_cookie('c', '3')
+        self.assertEqual(app.get('/').text, 'a="1"; c="3"')
+        app.restore(snapshot)
+        self.assertEqual(app.get('/').text, 'a="1"')
+        self.assertEqual(
+            utils.copy_cookiejar(app.cookiejar)._headers, {})
+
+    def test_max_cached(self):
+        app = self.make_app(FastCookieJar(max_cached=2))
+        app.set_cookie('a', '1')
+        for i in range(5):
+            self.assertEqual(app.get('/%s' % i).text, 'a="1"')
+            self.assertLessEqual(len(app.cookiejar._headers), 2)
@@ -0,0 +1,114 @@
+import json
+
+from webob import Request
+from tests.compat import unittest
+from webtest.expect import Expect
+from webtest.expect import compile_pattern
+import webtest
+
+
+def api_app(environ, start_response):
+    req = Request(environ)
+    status = req.GET.get('status', '200 OK')
+    headers = [('Content-Type', 'application/json; charset=utf-8'),
+               ('X-Request-Id', '42')]
+    if req.GET.get('debug'):
+        headers.append(('X-Debug', 'on'))
+    body = json.dumps({'id': 1, 'owner': {'name': 'bob'},
+                       'tags': ['a', 'b']}).encode('utf8')
+    start_response(status, headers)
+    return [body]
+
+
+class TestExpect(unittest.TestCase):
+
+    def setUp(self):
+        self.app = webtest.TestApp(api_app)
+
+    def test_success(self):
+        expect = Expect(status=200, headers={'X-Request-Id': '4*'},
+                        no_headers=['X-Debug'],
+                        content_type='application/*',
+                        json_keys=['id', 'owner.name', 'tags.1'],
+                        contains='bob', no=['alice'])
+        res = self.app.get('/', expect=expect)
+        self.assertEqual(res.json['id'], 1)
+        self.assertEqual(expect.failures(res), [])
+
+    def test_failures_are_reported_together(self):
+        expect = Expect(status='2*', headers=['Location'],
+                        no_headers=['X-Debug'], content_type='text/*',
+                        json_keys=['owner.email', 'tags.5'],
+                        contains=['alice'], no=['bob'])
+        with self.assertRaises(webtest.AppError) as cm:
+            self.app.get('/', params={'status': '404 Not Found',
+                                      'debug': 1}, expect=expect)
+        message = str(cm.exception)
+        self.assertTrue(message.startswith('Bad response: 404 Not Found ('))
+        for failure in ("status 404 Not Found does not match '2*'",
+                        'missing header Location',
+                        "unexpected header X-Debug: 'on'",
+                        "content type 'application/json' does not match",
+                        'missing JSON key owner.email',
+                        'missing JSON key tags.5',
+                        "body does not contain 'alice'",
+                        "body contains 'bob'"):
+            self.assertIn(failure, message)
+
+    def test_status(self):
+        self.app.get('/', params={'status': '404 Not Found'},
+                     expect=Expect(status=[404, 410]))
+        self.app.get('/', params={'status': '500 Error'},
+                     expect=Expect(status='*'))
+        with self.assertRaises(webtest.AppError) as cm:
+            self.app.get('/', params={'status': '500 Error'},
+                         expect=Expect())
+        self.assertEqual(cm.exception.response.status_int, 500)
+
+    def test_status_arguments_take_precedence(self):
+        expect = Expect(status=200, json_keys=['id'])
+        self.app.get('/', params={'status': '404 Not Found'}, status=404,
+                     expect=expect)
+        self.app.get('/', params={'status': '404 Not Found'},
+                     expect_errors=True, expect=expect)
+        with self.assertRaises(webtest.AppError):
+            self.app.get('/', status=404,
+                         expect=Expect(json_keys=['missing']))
+
+    def test_default_expect(self):
+        app = webtest.TestApp(api_app,
+                              expect=Expect(no_headers=['X-Debug']))
+        app.post('/', {'a': 'b'})
+        with self.assertRaises(webtest.AppError):
+            app.get('/', params={'debug': 1})
+        # replaced by the expectation of a request
+        app.get('/', params={'debug': 1}, expect=Expect())
+        get = app.prepare('GET', '/')
+        self.assertRaises(webtest.AppError, get, params={'debug': 1})
+
+    def test_stream(self):
+        expect = Expect(headers=['X-Other'], contains='nothing')
+        res = self.app.get('/', stream=True, expect=expect)
+        with self.assertRaises(webtest.AppError) as cm:
+            res.close()
+        self.assertIn('missing header X-Other', str(cm.exception))
+        self.assertNotIn('nothing', str(cm.exception).split('\n')[0])
+
+    def test_json_keys_not_json(self):
+        def text_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'text']
+        app = webtest.TestApp(text_app)
+        with self.assertRaises(webtest.AppError) as cm:
+            app.get('/', expect=Expect(json_keys=['id']))
+        self.assertIn('body is not JSON', str(cm.exception))
+
+    def test_compile_pattern_is_cached(self):
+        self.assertIs(compile_pattern('2*'), compile_pattern('2*'))
+        self.assertTrue(compile_pattern('2*').match('200 OK'))
+        self.assertTrue(compile_pattern('404 not found').match(
+            '404 Not Found'))
+
+    def test_repr(self):
+        self.assertEqual(repr(Expect(status=201, json_keys=['id'])),
+                         "<Expect status=201 json_keys=('id',)>")
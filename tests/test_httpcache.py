@@ -0,0 +1,148 @@
+from unittest import mock
+
+from webob import Request
+from webob import Response
+from tests.compat import unittest
+from webtest.httpcache import HTTPCache
+import webtest
+
+
+class CacheApp:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        req = Request(environ)
+        res = Response(content_type='text/plain')
+        res.text = '%s %d %s' % (req.path_info, self.calls,
+                                 req.accept.header_value or '')
+        if req.path_info == '/fresh':
+            res.cache_control = 'max-age=60'
+        elif req.path_info == '/expires':
+            res.headers['Date'] = 'Sun, 06 Nov 1994 08:49:37 GMT'
+            res.headers['Expires'] = 'Sun, 06 Nov 1994 08:50:37 GMT'
+        elif req.path_info == '/etag':
+            res.cache_control = 'max-age=10'
+            res.etag = 'v1'
+            if 'v1' in req.if_none_match:
+                res = Response(status=304, cache_control='max-age=20')
+                res.etag = 'v1'
+        elif req.path_info == '/lastmod':
+            res.last_modified = 784111777
+            if req.if_modified_since:
+                res = Response(status=304)
+                del res.content_type
+        elif req.path_info == '/nostore':
+            res.cache_control = 'no-store'
+        elif req.path_info == '/vary':
+            res.cache_control = 'max-age=60'
+            res.vary = ('Accept',)
+        return res(environ, start_response)
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.wsgi_app = CacheApp()
+        self.app = webtest.TestApp(self.wsgi_app, http_cache=True)
+
+    def outcome(self, res):
+        return res.request.environ['webtest.http_cache']
+
+    @mock.patch('time.time')
+    def test_fresh(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.assertEqual(self.app.get('/fresh').text, '/fresh 1 ')
+        mock_time.return_value = 1030.0
+        res = self.app.get('/fresh')
+        self.assertEqual(res.text, '/fresh 1 ')
+        self.assertEqual(res.headers['Age'], '30')
+        self.assertEqual(self.outcome(res), 'hit')
+        mock_time.return_value = 1100.0
+        self.assertEqual(self.app.get('/fresh').text, '/fresh 2 ')
+        self.assertEqual(self.app.http_cache.stats['http://localhost/fresh'],
+                         {'hits': 1, 'misses': 2})
+
+    def test_expires(self):
+        self.app.get('/expires')
+        res = self.app.get('/expires')
+        self.assertEqual(self.outcome(res), 'hit')
+
+    @mock.patch('time.time')
+    def test_revalidate_etag(self, mock_time):
+        mock_time.return_value = 1000.0
+        self.app.get('/etag')
+        mock_time.return_value = 1015.0
+        res = self.app.get('/etag')
+        self.assertEqual(self.outcome(res), 'revalidated')
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res.text, '/etag 1 ')
+        self.assertEqual(res.headers['Cache-Control'], 'max-age=20')
+        mock_time.return_value = 1030.0
+        self.assertEqual(self.outcome(self.app.get('/etag')), 'hit')
+        self.assertEqual(self.wsgi_app.calls, 2)
+
+    def test_revalidate_last_modified(self):
+        self.app.get('/lastmod')
+        res = self.app.get('/lastmod')
+        self.assertEqual(self.outcome(res), 'revalidated')
+        self.assertEqual(res.text, '/lastmod 1 ')
+        self.assertEqual(res.content_type, 'text/plain')
+
+    def test_request_no_cache(self):
+        self.app.get('/fresh')
+        res = self.app.get('/fresh', headers={'Cache-Control': 'no-cache'})
+        self.assertEqual(self.outcome(res), 'miss')
+        self.assertEqual(res.text, '/fresh 2 ')
+        self.app.get('/etag')
+        res = self.app.get('/etag', headers={'Pragma': 'no-cache'})
+        self.assertEqual(self.outcome(res), 'revalidated')
+
+    def test_not_stored(self):
+        self.app.get('/nostore')
+        self.assertEqual(self.app.get('/nostore').text, '/nostore 2 ')
+        self.app.get('/other')
+        self.assertEqual(self.app.get('/other').text, '/other 4 ')
+        self.assertEqual(self.app.http_cache.entries, {})
+
+    def test_vary(self):
+        self.app.get('/vary', headers={'Accept': 'text/html'})
+        res = self.app.get('/vary', headers={'Accept': 'text/plain'})
+        self.assertEqual(self.outcome(res), 'miss')
+        res = self.app.get('/vary', headers={'Accept': 'text/plain'})
+        self.assertEqual(self.outcome(res), 'hit')
+
+    def test_unsafe_methods_invalidate(self):
+        self.app.get('/fresh')
+        res = self.app.post('/fresh')
+        self.assertEqual(self.outcome(res), 'bypass')
+        self.assertEqual(self.outcome(self.app.get('/fresh')), 'miss')
+        self.assertEqual(self.outcome(self.app.head('/fresh')), 'bypass')
+        self.assertEqual(self.outcome(self.app.get('/fresh')), 'hit')
+
+    def test_shared_cache(self):
+        cache = HTTPCache()
+        webtest.TestApp(self.wsgi_app, http_cache=cache).get('/fresh')
+        webtest.TestApp(self.wsgi_app, http_cache=cache).get('/fresh')
+        self.assertEqual(cache.totals(), {'hits': 1, 'misses': 1})
+        self.assertIn('1 hits', repr(cache))
+        cache.clear()
+        self.assertEqual(cache.totals(), {})
+
+    def test_lint_checks_the_application(self):
+        def bytes_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return b'ok'
+        app = webtest.TestApp(bytes_app, http_cache=True)
+        with self.assertRaises(AssertionError) as cm:
+            app.get('/')
+        self.assertIn('application iterator', str(cm.exception))
+        # lint wraps the application, not the cache in front of it
+        with mock.patch('webtest.lint.middleware') as middleware:
+            middleware.side_effect = lambda app: app
+            self.assertEqual(self.outcome(self.app.get('/fresh')), 'miss')
+            self.assertEqual(self.outcome(self.app.get('/fresh')), 'hit')
+        self.assertEqual(middleware.call_args_list,
+                         [mock.call(self.wsgi_app)] * 2)
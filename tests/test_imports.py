@@ -0,0 +1,63 @@
+import subprocess
+import sys
+
+import webtest
+from tests.compat import unittest
+
+
+def loaded_modules(code):
+    """Run ``code`` in a new interpreter and return the modules it loaded"""
+    code += '\nimport sys\nprint(" ".join(sorted(sys.modules)))'
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return set(output.decode('ascii').split())
+
+
+class TestImports(unittest.TestCase):
+
+    def test_import_webtest(self):
+        modules = loaded_modules('import webtest')
+        for name in ('webtest.app', 'webtest.forms', 'webtest.response',
+                     'webob', 'bs4', 'http.cookiejar'):
+            self.assertNotIn(name, modules)
+
+    def test_testapp_without_html(self):
+        modules = loaded_modules(
+            'import webtest\n'
+            'from webtest.debugapp import debug_app\n'
+            'webtest.TestApp(debug_app).get("/")')
+        self.assertIn('webob', modules)
+        self.assertNotIn('bs4', modules)
+
+    def test_html_loads_bs4(self):
+        modules = loaded_modules(
+            'import webtest\n'
+            'from webob import Response\n'
+            'app = webtest.TestApp(Response("<form></form>"))\n'
+            'app.get("/").forms')
+        self.assertIn('bs4', modules)
+
+    def test_submodules(self):
+        modules = loaded_modules(
+            'import webtest\n'
+            'for name in ("app", "forms", "response", "utils", "lint",\n'
+            '             "compat"):\n'
+            '    getattr(webtest, name)\n'
+            'assert webtest.app.TestApp is webtest.TestApp\n'
+            'assert webtest.forms.Form is webtest.Form\n'
+            'try:\n'
+            '    webtest.no_such_module\n'
+            'except AttributeError:\n'
+            '    pass\n'
+            'else:\n'
+            '    raise AssertionError("no AttributeError")')
+        self.assertIn('webtest.lint', modules)
+
+    def test_attributes(self):
+        from webtest import Upload
+        from webtest.forms import Upload as FormsUpload
+        self.assertIs(Upload, FormsUpload)
+        self.assertIs(webtest.TestApp, webtest.app.TestApp)
+        self.assertEqual(sorted(webtest.__all__),
+                         sorted(set(webtest.__all__) & set(dir(webtest))))
+        with self.assertRaises(AttributeError):
+            webtest.NoSuchThing
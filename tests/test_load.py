@@ -0,0 +1,73 @@
+import os
+
+from tests.compat import unittest
+from webtest.debugapp import DebugApp
+from webtest import load
+from webtest.expect import Expect
+
+
+def make_app():
+    return DebugApp()
+
+
+def scenario(app):
+    app.get('/')
+    app.get('/', params={'status': '404'}, status=404)
+
+
+def failing_scenario(app):
+    app.get('/', params={'status': '500'})
+
+
+def expect_scenario(app):
+    app.get('/', params={'status': '404'}, expect=Expect(status=404))
+
+
+def failing_expect_scenario(app):
+    app.get('/', expect=Expect(status=404))
+
+
+class TestLoad(unittest.TestCase):
+
+    def test_run_with_factory(self):
+        result = load.run(scenario, make_app, workers=2, iterations=5)
+        self.assertEqual(result.requests, 20)
+        self.assertEqual(result.statuses, {200: 10, 404: 10})
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(result.latencies, sorted(result.latencies))
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+        summary = result.summary()
+        self.assertEqual(summary['workers'], 2)
+        self.assertEqual(summary['requests'], 20)
+        self.assertGreater(summary['requests_per_second'], 0)
+
+    def test_run_with_config(self):
+        config = 'config:%s' % os.path.join(os.path.dirname(__file__),
+                                            'deploy.ini')
+        result = load.run(scenario, config, workers=1, duration=.2,
+                          batch_size=1)
+        self.assertGreater(result.requests, 0)
+        self.assertEqual(result.statuses[200], result.statuses[404])
+
+    def test_errors_are_counted(self):
+        result = load.run(failing_scenario, make_app, workers=2,
+                          iterations=3)
+        self.assertEqual(result.requests, 6)
+        self.assertEqual(result.statuses, {500: 6})
+        self.assertEqual(result.errors, 6)
+        self.assertIn('AppError', result.error_samples[0])
+
+    def test_expect(self):
+        result = load.run(expect_scenario, make_app, workers=1,
+                          iterations=3)
+        self.assertEqual(result.statuses, {404: 3})
+        self.assertEqual(result.errors, 0)
+        result = load.run(failing_expect_scenario, make_app, workers=1,
+                          iterations=3)
+        self.assertEqual(result.statuses, {200: 3})
+        self.assertEqual(result.errors, 3)
+        self.assertIn('AppError', result.error_samples[0])
+
+    def test_iterations_or_duration_required(self):
+        self.assertRaises(ValueError, load.run, scenario, make_app)
+        self.assertIsNone(load.LoadResult(1).percentile(50))
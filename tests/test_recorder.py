@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+
+from tests.compat import unittest
+from webtest.debugapp import debug_app
+from webtest.recorder import MissingRecording
+from webtest.recorder import Recorder
+from webtest import http
+import webtest
+
+
+class CountingApp:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        body = ('%s %s call %d' % (environ['REQUEST_METHOD'],
+                                   environ['PATH_INFO'], self.calls))
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Set-Cookie', 'seen=yes; Path=/')])
+        return [body.encode('ascii')]
+
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_replay(self):
+        counting = CountingApp()
+        recorder = Recorder(counting, self.directory, mode='record')
+        app = webtest.TestApp(recorder)
+        self.assertEqual(app.get('/a').text, 'GET /a call 1')
+        self.assertEqual(app.get('/a').text, 'GET /a call 2')
+        self.assertEqual(app.post('/a', {'x': '1'}).text, 'POST /a call 3')
+        self.assertEqual(recorder.recorded, 3)
+
+        counting = CountingApp()
+        recorder = Recorder(counting, self.directory, mode='replay')
+        app = webtest.TestApp(recorder)
+        self.assertEqual(app.get('/a').text, 'GET /a call 1')
+        self.assertEqual(app.get('/a').text, 'GET /a call 2')
+        # more identical requests than recorded replay the last one
+        self.assertEqual(app.get('/a').text, 'GET /a call 2')
+        self.assertEqual(app.post('/a', {'x': '1'}).text, 'POST /a call 3')
+        self.assertEqual(app.cookies, {'seen': 'yes'})
+        self.assertRaises(MissingRecording, app.post, '/a', {'x': '2'})
+        self.assertEqual(counting.calls, 0)
+        self.assertEqual(recorder.replayed, 4)
+
+    def test_auto(self):
+        counting = CountingApp()
+        app = webtest.TestApp(Recorder(counting, self.directory))
+        app.get('/a')
+        app = webtest.TestApp(Recorder(counting, self.directory))
+        self.assertEqual(app.get('/a').text, 'GET /a call 1')
+        self.assertEqual(app.get('/b').text, 'GET /b call 2')
+        self.assertEqual(counting.calls, 2)
+
+    def test_bodies_are_shared(self):
+        def static_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'always the same']
+        app = webtest.TestApp(Recorder(static_app, self.directory))
+        app.get('/', headers={'Accept': 'text/plain'})
+        app.get('/', headers={'Accept': 'text/html'})
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.directory, 'requests'))), 2)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.directory, 'bodies'))), 1)
+
+    def test_bad_mode(self):
+        self.assertRaises(ValueError, Recorder, debug_app, self.directory,
+                          mode='replya')
+
+
+class TestRecordProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.s = http.StopableWSGIServer.create(debug_app)
+        self.s.wait()
+
+    def tearDown(self):
+        self.s.shutdown()
+        shutil.rmtree(self.directory)
+        for name in ('WEBTEST_RECORD', 'WEBTEST_RECORDINGS'):
+            os.environ.pop(name, None)
+
+    def test_proxy(self):
+        os.environ['WEBTEST_RECORD'] = 'record'
+        os.environ['WEBTEST_RECORDINGS'] = self.directory
+        app = webtest.TestApp(self.s.application_url)
+        self.assertIsInstance(app.app, Recorder)
+        body = app.get('/?status=201+Created', status=201).body
+        self.s.shutdown()
+
+        os.environ['WEBTEST_RECORD'] = 'replay'
+        app = webtest.TestApp(self.s.application_url)
+        res = app.get('/?status=201+Created', status=201)
+        self.assertEqual(res.body, body)
@@ -1,11 +1,13 @@
 import webtest
 from webtest.debugapp import debug_app
+from webtest.response import LiteTestResponse
 from webob import Request
 from webob.response import gzip_app_iter
 
 from tests.compat import unittest
 
 import webbrowser
+import zlib
 
 
 def links_app(environ, start_response):
@@ -415,6 +417,67 @@ class TestResponse(unittest.TestCase):
         app = webtest.TestApp(gzipped_app)
         resp = app.get('/')
         self.assertEqual(resp.body, b'test')
+        self.assertEqual(resp.compressed_size, 24)
+        self.assertEqual(resp.decompressed_size, 4)
+
+    def test_decode_content_lazy(self):
+        app = webtest.TestApp(gzipped_app, decode_content='lazy',
+                              timings=True)
+        resp = app.get('/')
+        self.assertEqual(resp.content_encoding, 'gzip')
+        self.assertIsNone(resp.compressed_size)
+        self.assertIsNone(resp.timings.decode)
+        self.assertEqual(resp.text, 'test')
+        self.assertIsNone(resp.content_encoding)
+        self.assertEqual(resp.content_length, 4)
+        self.assertEqual(resp.compressed_size, 24)
+        self.assertEqual(resp.decompressed_size, 4)
+
+    def test_decode_content_lazy_error(self):
+        app = webtest.TestApp(gzipped_app, decode_content='lazy')
+        with self.assertRaises(webtest.AppError) as cm:
+            app.get('/', status=404)
+        self.assertIn('test', str(cm.exception))
+
+    def test_decode_content_stream(self):
+        body = b'webtest ' * 10000
+
+        def app(environ, start_response):
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+            chunks = [compressor.compress(body[i:i + 1000])
+                      for i in range(0, len(body), 1000)]
+            chunks.append(compressor.flush())
+            chunks = [chunk for chunk in chunks if chunk]
+            start_response('200 OK', [
+                ('Content-Type', 'text/plain'),
+                ('Content-Encoding', 'gzip'),
+                ('Content-Length', str(sum(map(len, chunks))))])
+            return chunks
+
+        resp = webtest.TestApp(app, decode_content='stream').get('/')
+        self.assertEqual(resp.body, body)
+        self.assertIsNone(resp.content_encoding)
+        self.assertEqual(resp.content_length, len(body))
+        self.assertEqual(resp.decompressed_size, len(body))
+        self.assertLess(resp.compressed_size, len(body) / 100)
+
+    def test_decode_content_stream_deflate(self):
+        for wbits in (zlib.MAX_WBITS, -zlib.MAX_WBITS):
+            compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+            encoded = compressor.compress(b'test') + compressor.flush()
+
+            def app(environ, start_response):
+                start_response('200 OK', [('Content-Type', 'text/plain'),
+                                          ('Content-Encoding', 'deflate')])
+                return [encoded[:1], encoded[1:]]
+
+            resp = webtest.TestApp(app, decode_content='stream').get('/')
+            self.assertEqual(resp.body, b'test')
+            self.assertEqual(resp.compressed_size, len(encoded))
+
+    def test_decode_content_invalid(self):
+        self.assertRaises(ValueError, webtest.TestApp, gzipped_app,
+                          decode_content='eager')
 
 
 class TestFollow(unittest.TestCase):
@@ -504,3 +567,105 @@ class TestFollow(unittest.TestCase):
 
     def test_pytest_collection_disabled(self):
         self.assertFalse(webtest.TestResponse.__test__)
+
+
+def lite_app(environ, start_response):
+    req = Request(environ)
+    if req.path_info == '/redirect':
+        start_response('302 Found', [('Location', '/form'),
+                                     ('Content-Type', 'text/plain')])
+        return [b'']
+    if req.path_info == '/json':
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{"id": 1}']
+    if req.method == 'POST':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [('got %s' % req.POST['name']).encode('utf8')]
+    environ['paste.testing_variables']['template'] = 'form.html'
+    start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'),
+                              ('Set-Cookie', 'lite=yes; Path=/')])
+    return [b'<html><body><form method="POST" action="/submit">'
+            b'<input name="name" value="bob"></form>'
+            b'<p>Caf\xc3\xa9   au lait</p></body></html>']
+
+
+class TestLiteTestResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.app = webtest.TestApp(lite_app,
+                                   response_class=LiteTestResponse)
+
+    def test_slots(self):
+        res = self.app.get('/form')
+        self.assertIsInstance(res, LiteTestResponse)
+        self.assertFalse(hasattr(res, '__dict__'))
+        self.assertEqual(res.status, '200 OK')
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res.content_type, 'text/html')
+        self.assertEqual(res.charset, 'utf-8')
+        self.assertEqual(res.headers['Set-Cookie'], 'lite=yes; Path=/')
+        self.assertIs(res.test_app, self.app)
+        self.assertEqual(res.request.path_info, '/form')
+        self.assertEqual(res.template, 'form.html')
+        self.assertIsNone(res.timings)
+        self.assertEqual(self.app.cookies, {'lite': 'yes'})
+        self.assertIsNone(res._response)
+
+    def test_helpers(self):
+        res = self.app.get('/form')
+        self.assertIn('Café au lait', res)
+        res.mustcontain('Café', no='Thé')
+        self.assertIn('Café', res.text)
+        self.assertIn('Café', str(res))
+        self.assertTrue(repr(res).startswith('<200 OK text/html body='))
+        self.assertEqual(self.app.get('/json').json, {'id': 1})
+        self.assertEqual(res.html.p.text, 'Café   au lait')
+        form = res.form
+        self.assertEqual(form['name'].value, 'bob')
+        self.assertEqual(form.submit().text, 'got bob')
+        self.assertIsNone(res._response)
+
+    def test_follow(self):
+        res = self.app.get('/redirect')
+        self.assertEqual(res.location, '/form')
+        self.assertEqual(res.follow().status_int, 200)
+        self.assertEqual(res.maybe_follow().request.path_info, '/form')
+
+    def test_full_response(self):
+        res = self.app.get('/form')
+        self.assertEqual(res.content_length, len(res.body))
+        full = res._response
+        self.assertIsInstance(full, webtest.TestResponse)
+        self.assertIs(res.response(), full)
+        self.assertEqual(full.template, 'form.html')
+        self.assertRaises(AttributeError, getattr, res, 'missing')
+
+    def test_request_is_rebuilt(self):
+        res = self.app.get('/form')
+        self.assertEqual((res.method, res.url),
+                         ('GET', 'http://localhost/form'))
+        self.assertIsNone(res._request)
+        self.assertIsNone(res.timings)
+        self.assertEqual(res.request.method, 'GET')
+        self.assertEqual(res.request.url, 'http://localhost/form')
+        self.assertIs(res.request, res._request)
+        self.assertEqual(res.response().request.url, res.url)
+
+    def test_gzip(self):
+        app = webtest.TestApp(gzipped_app, response_class=LiteTestResponse)
+        res = app.get('/')
+        self.assertEqual(res.body, b'test')
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertEqual(res.headers['Content-Length'], '4')
+
+    def test_errors(self):
+        with self.assertRaises(webtest.AppError) as cm:
+            self.app.get('/json', status=404)
+        self.assertIn('{"id": 1}', str(cm.exception))
+        self.assertRaises(TypeError, webtest.TestApp, lite_app,
+                          response_class=webtest.TestResponse)
+
+    def test_stream(self):
+        res = self.app.get('/form', stream=True)
+        self.assertIsInstance(res, webtest.TestResponse)
+        res.close()
@@ -1,6 +1,8 @@
 import re
 import json
+import os
 import sys
+import tracemalloc
 
 from .compat import unittest
 from webtest import utils
@@ -117,3 +119,168 @@ class json_methodTest(unittest.TestCase):
 
     def test_json_method_name(self):
         self.assertEqual(self.mock.foo_json.__name__, 'foo_json')
+
+
+class copy_cookiejarTest(unittest.TestCase):
+
+    def test_copy_cookiejar(self):
+        from http import cookiejar
+        from webtest.app import CookiePolicy
+        jar = cookiejar.CookieJar(policy=CookiePolicy())
+        cookie = cookiejar.Cookie(
+            0, 'name', 'value', None, False, 'localhost.local', True,
+            False, '/', True, False, None, False, None, None, {})
+        jar.set_cookie(cookie)
+        new = utils.copy_cookiejar(jar)
+        self.assertEqual([c.name for c in new], ['name'])
+        self.assertIs(new._policy, jar._policy)
+        new.clear()
+        self.assertEqual(len(jar), 1)
+        self.assertEqual(len(new), 0)
+
+    def test_copy_other_cookiejar(self):
+        jar = {'name': ['value']}
+        new = utils.copy_cookiejar(jar)
+        self.assertEqual(new, jar)
+        self.assertIsNot(new['name'], jar['name'])
+
+
+class IterableInputTest(unittest.TestCase):
+
+    def test_read(self):
+        wsgi_input = utils.IterableInput([b'ab', b'cde', b'', b'f'])
+        self.assertEqual(wsgi_input.read(1), b'a')
+        self.assertEqual(wsgi_input.read(3), b'bcd')
+        self.assertEqual(wsgi_input.read(), b'ef')
+        self.assertEqual(wsgi_input.read(), b'')
+
+    def test_readline(self):
+        wsgi_input = utils.IterableInput([b'a\nb', b'c\n', b'd'])
+        self.assertEqual(wsgi_input.readline(), b'a\n')
+        self.assertEqual(wsgi_input.readline(1), b'b')
+        self.assertEqual(list(wsgi_input), [b'c\n', b'd'])
+
+    def test_memoryview_chunks(self):
+        wsgi_input = utils.IterableInput(
+            [memoryview(b'ab\ncd'), bytearray(b'ef\n'), memoryview(b'gh')])
+        self.assertEqual(wsgi_input.read(1), b'a')
+        self.assertEqual(wsgi_input.readline(), b'b\n')
+        self.assertEqual(wsgi_input.readline(3), b'cde')
+        self.assertEqual(wsgi_input.read(), b'f\ngh')
+
+    def test_read_does_not_copy_chunks(self):
+        chunk = b'x' * 1024
+        wsgi_input = utils.IterableInput([chunk, b'y'])
+        self.assertIs(wsgi_input.read(1024), chunk)
+        self.assertEqual(wsgi_input.read(), b'y')
+
+    def test_read_memory(self):
+        # chunks of a file mapped in memory, like an uploaded file
+        size = 1024 * 1024
+        content = memoryview(b'x' * size)
+        wsgi_input = utils.IterableInput(
+            [content[i:i + 65536] for i in range(0, size, 65536)])
+        tracemalloc.start()
+        try:
+            data = wsgi_input.read(size)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(data), size)
+        self.assertLess(peak, size * 1.5)
+
+    def test_str_chunks(self):
+        wsgi_input = utils.IterableInput(['text'])
+        self.assertRaises(TypeError, wsgi_input.read)
+
+    def test_body_stream(self):
+        self.assertIsNone(utils.body_stream(b'data'))
+        self.assertIsNone(utils.body_stream([('a', 'b')]))
+        self.assertIsNone(utils.body_stream({'a': 'b'}))
+        self.assertIsNone(utils.body_stream(None))
+        wsgi_input, length = utils.body_stream(iter([b'a']))
+        self.assertIsNone(length)
+        self.assertEqual(wsgi_input.read(), b'a')
+
+
+class map_fileTest(unittest.TestCase):
+
+    def tearDown(self):
+        utils.clear_mapped_files()
+
+    def test_map_file(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile() as fd:
+            fd.write(b'data')
+            fd.flush()
+            view = utils.map_file(fd.name)
+            self.assertEqual(view, b'data')
+            self.assertIs(utils.map_file(fd.name), view)
+            fd.write(b' and more')
+            fd.flush()
+            self.assertEqual(utils.map_file(fd.name), b'data and more')
+            self.assertEqual(len(utils._mapped_files), 1)
+
+    def test_empty_file(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile() as fd:
+            self.assertEqual(utils.map_file(fd.name), b'')
+
+    def test_bounded(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(utils.mapped_files_max + 2):
+                paths.append(os.path.join(tmp, '%d.txt' % i))
+                with open(paths[-1], 'wb') as fd:
+                    fd.write(b'data')
+                utils.map_file(paths[-1])
+            self.assertEqual(len(utils._mapped_files),
+                             utils.mapped_files_max)
+            self.assertNotIn(os.path.realpath(paths[0]),
+                             [key[0] for key in utils._mapped_files])
+            os.remove(paths[-1])
+            # forgotten when another file is mapped
+            utils.map_file(paths[0])
+            self.assertNotIn(os.path.realpath(paths[-1]),
+                             [key[0] for key in utils._mapped_files])
+
+
+class MultipartBodyTest(unittest.TestCase):
+
+    def test_parts(self):
+        content = b'x' * 5000
+        body = utils.MultipartBody([b'--b', b'', content, b'--b--', b''])
+        self.assertEqual(len(body.parts), 3)
+        self.assertIs(body.parts[1], content)
+        expected = b'\r\n'.join([b'--b', b'', content, b'--b--', b''])
+        self.assertEqual(len(body), len(expected))
+        self.assertEqual(body.getvalue(), expected)
+        self.assertTrue(all(isinstance(c, memoryview) for c in body))
+        wsgi_input = utils.IterableInput(body)
+        self.assertEqual(wsgi_input.readline(), b'--b\r\n')
+        self.assertEqual(wsgi_input.read(), expected[5:])
+
+    def test_file_part(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile() as fd:
+            fd.write(b'0123456789')
+            fd.flush()
+            for shared in (False, True):
+                part = utils.FilePart(fd.name, shared=shared)
+                part.chunk_size = 4
+                self.assertEqual(len(part), 10)
+                self.assertEqual(list(part), [b'0123', b'4567', b'89'])
+                body = utils.MultipartBody([b'a', part, b'b'])
+                self.assertEqual(len(body), 16)
+                self.assertEqual(body.getvalue(),
+                                 b'a\r\n0123456789\r\nb')
+            self.assertEqual(len(utils._mapped_files), 1)
+            utils.clear_mapped_files()
+            parts = [utils.FilePart(fd.name, shared=shared)
+                     for shared in (False, True)]
+            fd.truncate(5)
+            fd.flush()
+            for part in parts:
+                self.assertRaises(ValueError, list, part)
+            utils.clear_mapped_files()
@@ -6,17 +6,47 @@
 Routines for testing WSGI applications.
 """
 
-from webtest.app import TestApp
-from webtest.app import TestRequest
-from webtest.app import TestResponse
-from webtest.app import AppError
-from webtest.forms import Form
-from webtest.forms import Field
-from webtest.forms import Select
-from webtest.forms import Radio
-from webtest.forms import Checkbox
-from webtest.forms import Text
-from webtest.forms import Textarea
-from webtest.forms import Hidden
-from webtest.forms import Submit
-from webtest.forms import Upload
+
+# The names are imported on first use (PEP 562), so ``import webtest`` does
+# not load webob, BeautifulSoup and the rest before they are needed.
+_exports = {
+    'TestApp': 'webtest.app',
+    'TestRequest': 'webtest.app',
+    'TestResponse': 'webtest.app',
+    'AppError': 'webtest.app',
+    'AsyncTestApp': 'webtest.asgi',
+    'Form': 'webtest.forms',
+    'Field': 'webtest.forms',
+    'Select': 'webtest.forms',
+    'Radio': 'webtest.forms',
+    'Checkbox': 'webtest.forms',
+    'Text': 'webtest.forms',
+    'Textarea': 'webtest.forms',
+    'Hidden': 'webtest.forms',
+    'Submit': 'webtest.forms',
+    'Upload': 'webtest.forms',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    import importlib
+    module = _exports.get(name)
+    if module is None:
+        # submodules were imported as a side effect before, keep
+        # ``webtest.app`` and friends working after a bare ``import webtest``
+        try:
+            return importlib.import_module(f'{__name__}.{name}')
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+            raise AttributeError(
+                f'module {__name__!r} has no attribute {name!r}') from None
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
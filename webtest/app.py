@@ -9,22 +9,34 @@ Most interesting is TestApp
 """
 
 import os
-import re
 import json
+import time
+import copy
 import random
-import fnmatch
+import contextlib
+import threading
 import mimetypes
+import string
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
 
 from base64 import b64encode
 from http import cookiejar as http_cookiejar
 from io import BytesIO, StringIO
 
 from webtest.compat import urlparse
+from webtest.compat import urlencode
 from webtest.compat import to_bytes
 from webtest.compat import escape_cookie_value
 from webtest.response import TestResponse
+from webtest.response import StreamState
+from webtest.response import Timings
+from webtest.response import LiteTestResponse
+from webtest.expect import compile_pattern
 from webtest import forms
 from webtest import lint
+from webtest.lint import middleware as lint_middleware
 from webtest import utils
 
 import webob
@@ -32,18 +44,66 @@ import webob
 
 __all__ = ['TestApp', 'TestRequest']
 
+_nothing = contextlib.nullcontext()
+
 
 class AppError(Exception):
+    """
+    Raised when a response has an unexpected status or the application
+    logged errors.
+
+    The message is only formatted when it is used. Response bodies longer
+    than :attr:`body_head` + :attr:`body_tail` bytes are cut: the message
+    shows their head and tail and a summary of the headers, and the whole
+    body is written to a temporary file whose path is in the message and in
+    :attr:`body_path`.
+    """
+
+    #: Bytes of a long body shown before the cut.
+    body_head = 4096
+
+    #: Bytes of a long body shown after the cut.
+    body_tail = 1024
+
+    #: Maximum length of the header values of the summary.
+    header_width = 80
+
+    #: The file holding the body of a cut response, once the message is
+    #: formatted.
+    body_path = None
+
+    #: The response which failed the checks of a request, if any.
+    response = None
 
     def __init__(self, message, *args):
+        Exception.__init__(self)
+        self._message = message
+        self._format_args = args
+        self._formatted = None
+
+    @property
+    def args(self):
+        return (self._format(),)
+
+    @args.setter
+    def args(self, value):
+        value = tuple(value)
+        self._formatted = str(value[0]) if len(value) == 1 else str(value)
+
+    def _format(self):
+        if self._formatted is not None:
+            return self._formatted
+        message = self._message
         if isinstance(message, bytes):
             message = message.decode('utf8')
         str_args = ()
-        for arg in args:
-            if isinstance(arg, webob.Response):
+        for arg in self._format_args:
+            if isinstance(arg, (webob.Response, LiteTestResponse)):
                 body = arg.body
                 if isinstance(body, bytes):
-                    if arg.charset:
+                    if len(body) > self.body_head + self.body_tail:
+                        arg = self._format_long_body(arg, body)
+                    elif arg.charset:
                         arg = body.decode(arg.charset)
                     else:
                         arg = repr(body)
@@ -53,8 +113,44 @@ class AppError(Exception):
                 except UnicodeDecodeError:
                     arg = repr(arg)
             str_args += (arg,)
-        message = message % str_args
-        Exception.__init__(self, message)
+        self._formatted = message % str_args
+        # the response is not needed anymore
+        self._format_args = ()
+        return self._formatted
+
+    def _format_long_body(self, res, body):
+        suffix = mimetypes.guess_extension(res.content_type or '') or '.txt'
+        fd, self.body_path = tempfile.mkstemp(prefix='webtest-',
+                                              suffix=suffix)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        head = body[:self.body_head]
+        tail = body[len(body) - self.body_tail:]
+        omitted = len(body) - len(head) - len(tail)
+        if res.charset:
+            head = head.decode(res.charset, 'replace')
+            tail = tail.decode(res.charset, 'replace')
+        else:
+            head, tail = repr(head), repr(tail)
+        width = self.header_width
+        headers = []
+        for name, value in res.headerlist:
+            if len(value) > width:
+                value = value[:width - 3] + '...'
+            headers.append(f'  {name}: {value}')
+        return (
+            f'{head}\n[... {omitted} bytes omitted, full body of '
+            f'{len(body)} bytes in {self.body_path} ...]\n{tail}\n'
+            'Headers:\n' + '\n'.join(headers))
+
+    def __str__(self):
+        return self._format()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._format()!r})'
+
+    def __reduce__(self):
+        return self.__class__, ('%s', self._format())
 
 
 class CookiePolicy(http_cookiejar.DefaultCookiePolicy):
@@ -83,6 +179,269 @@ class TestRequest(webob.BaseRequest):
     ResponseClass = TestResponse
 
 
+_formatter = string.Formatter()
+
+
+def _compile_template(template):
+    # the literal text and the replacement fields of a str.format template
+    return list(_formatter.parse(template))
+
+
+def _fill_template(pieces, values, quote):
+    # like str.format, quoting the formatted values
+    result = []
+    for literal, field, spec, conversion in pieces:
+        result.append(literal)
+        if field is None:
+            continue
+        if field in values:
+            value = values[field]
+        else:
+            value = _formatter.get_field(field, (), values)[0]
+        if conversion:
+            value = _formatter.convert_field(value, conversion)
+        result.append(quote(format(value, spec), safe=''))
+    return ''.join(result)
+
+
+class PreparedRequest:
+    """A precompiled request template returned by
+    :meth:`~webtest.app.TestApp.prepare`.
+
+    The base environ is built once. Each call only shallow-copies it and
+    fills in ``PATH_INFO``, ``QUERY_STRING`` and the body before handing
+    the request to :meth:`~webtest.app.TestApp.do_request`. Keyword
+    arguments are substituted into the url template like with
+    :meth:`str.format`, quoted so they can contain any character::
+
+        get_user = app.prepare('GET', '/users/{id}')
+        resp = get_user(id=1)
+        search = app.prepare('GET', '/search?q={q}')
+        resp = search(q='a&b')
+
+    Changes made to :attr:`~webtest.app.TestApp.extra_environ` after the
+    template is prepared are not seen by it. Cookies are still sent on
+    every call.
+    """
+
+    def __init__(self, test_app, method, url_template, headers=None,
+                 content_type=None, extra_environ=None):
+        self.test_app = test_app
+        self.method = str(method)
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(
+            str(url_template))
+        self.path_template = path or '/'
+        self.query_template = query
+        self._path_pieces = self._query_pieces = None
+        if '{' in path:
+            self._path_pieces = _compile_template(self.path_template)
+        if '{' in query:
+            self._query_pieces = _compile_template(query)
+
+        environ = test_app._make_environ(extra_environ)
+        environ['REQUEST_METHOD'] = self.method
+        if content_type is not None:
+            environ['CONTENT_TYPE'] = content_type
+        base_url = urlparse.urlunsplit((scheme, netloc, '/', '', ''))
+        req = test_app.RequestClass.blank(base_url, environ)
+        if headers:
+            req.headers.update(headers)
+        self.environ = req.environ
+
+    def __call__(self, params=None, body=None, headers=None, status=None,
+                 expect_errors=False, expect=None, **url_params):
+        """Build and execute a request from the template.
+
+        :param params:
+            A query string, or a dictionary that will be encoded into a
+            query string and appended to the one of the template.
+        :param body:
+            The request body. Bytes and strings are used as is,
+            dictionaries are form-encoded. File objects and iterables of
+            bytes are streamed like in :meth:`~webtest.app.TestApp.post`.
+        :param headers:
+            Extra headers to send with this request only.
+        :param expect:
+            See :meth:`~webtest.app.TestApp.get`.
+
+        :returns: :class:`webtest.TestResponse` instance.
+        """
+        path = self.path_template
+        query = self.query_template
+        if self._path_pieces is not None:
+            path = _fill_template(self._path_pieces, url_params,
+                                  urlparse.quote)
+        if self._query_pieces is not None:
+            query = _fill_template(self._query_pieces, url_params,
+                                   urlparse.quote_plus)
+        if params:
+            if not isinstance(params, str):
+                params = urlencode(params, doseq=True)
+            query = query + '&' + params if query else params
+
+        environ = self.environ.copy()
+        if self.test_app.timings:
+            environ['webtest.started'] = (time.perf_counter(),
+                                          time.thread_time())
+        if '%' in path:
+            path = urlparse.unquote(path, encoding='latin-1')
+        environ['PATH_INFO'] = path
+        environ['QUERY_STRING'] = query
+        body_stream = utils.body_stream(body) if body is not None else None
+        if body is None or body_stream is not None:
+            body = b''
+        else:
+            body = utils.encode_params(body, environ.get('CONTENT_TYPE'))
+            if isinstance(body, str):
+                body = body.encode('utf8')
+            if body:
+                environ.setdefault('CONTENT_TYPE',
+                                   'application/x-www-form-urlencoded')
+        environ['wsgi.input'] = BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+
+        req = self.test_app.RequestClass(environ)
+        if body_stream is not None:
+            environ.setdefault('CONTENT_TYPE', 'application/octet-stream')
+            utils.set_body_stream(req, *body_stream)
+        if headers:
+            req.headers.update(headers)
+        return self.test_app.do_request(req, status=status,
+                                        expect_errors=expect_errors,
+                                        expect=expect)
+
+    def __repr__(self):
+        return '<{} {} {}>'.format(
+            self.__class__.__name__, self.method, self.path_template)
+
+
+class MapResult(list):
+    """The responses returned by :meth:`~webtest.app.TestApp.map`, in
+    the same order as the requests.
+
+    .. attribute:: elapsed
+
+        Wall clock time of the whole run, in seconds.
+
+    .. attribute:: durations
+
+        Time spent on each request, in seconds, in the same order as the
+        responses.
+    """
+
+    def __init__(self, responses, durations, elapsed):
+        super().__init__(responses)
+        self.durations = durations
+        self.elapsed = elapsed
+
+    @property
+    def busy(self):
+        """Sum of all the request durations. Compare it to
+        :attr:`elapsed` to see how much work overlapped."""
+        return sum(self.durations)
+
+
+class BatchResult:
+    """The outcome of a request run by :meth:`~webtest.app.TestApp.batch`.
+
+    .. attribute:: status
+
+        The status line, like ``'200 OK'``.
+
+    .. attribute:: headers
+
+        A tuple of ``(name, value)`` pairs.
+
+    .. attribute:: body
+
+        The body as sent by the application, without decoding
+        ``Content-Encoding``.
+
+    .. attribute:: elapsed
+
+        Time spent in the application, in seconds.
+    """
+
+    __slots__ = ('status', 'headers', 'body', 'elapsed', '_request',
+                 '_test_app', '_errors', '_response')
+
+    def __init__(self, status, headers, body, elapsed, request, test_app,
+                 errors=''):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+        self._request = request
+        self._test_app = test_app
+        self._errors = errors
+        self._response = None
+
+    @property
+    def status_int(self):
+        return int(self.status.split(' ', 1)[0])
+
+    def header(self, name, default=None):
+        """Return the first value of the header ``name``."""
+        values = self.getall(name)
+        return values[0] if values else default
+
+    def getall(self, name):
+        """Return all the values of the header ``name``."""
+        name = name.lower()
+        return [value for key, value in self.headers if key.lower() == name]
+
+    @property
+    def json(self):
+        """The body decoded as JSON, decompressed first when the response
+        has a ``Content-Encoding``."""
+        body = self.body
+        encoding = self.header('Content-Encoding')
+        if encoding and encoding != 'identity':
+            body = b''.join(utils.DecodingAppIter([body], encoding))
+        return json.loads(body.decode('utf8'))
+
+    def response(self):
+        """Build, once, the :class:`~webtest.response.TestResponse` a
+        regular request would have returned."""
+        if self._response is not None:
+            return self._response
+        test_app = self._test_app
+        req = self._request
+        res = test_app.RequestClass.ResponseClass(
+            status=self.status, headerlist=list(self.headers),
+            app_iter=[self.body])
+        res.decode_content()
+        res._use_unicode = test_app.use_unicode
+        res.parser_features = test_app.parser_features
+        res.request = req
+        res.app = test_app.app
+        res.test_app = test_app
+        res.errors = self._errors
+        for name, value in req.environ.get('paste.testing_variables',
+                                           {}).items():
+            if not hasattr(res, name):
+                setattr(res, name, value)
+        self._response = res
+        return res
+
+    def __repr__(self):
+        return '<{} {} {} bytes in {:.3f}ms>'.format(
+            self.__class__.__name__, self.status, len(self.body),
+            self.elapsed * 1000)
+
+
+class Snapshot:
+    """The cookies and the ``extra_environ`` of a
+    :class:`~webtest.app.TestApp`, saved by
+    :meth:`~webtest.app.TestApp.snapshot`."""
+
+    __slots__ = ('cookiejar', 'extra_environ')
+
+    def __init__(self, cookiejar, extra_environ):
+        self.cookiejar = cookiejar
+        self.extra_environ = extra_environ
+
+
 class TestApp:
     """
     Wraps a WSGI application in a more convenient interface for
@@ -97,7 +456,8 @@ class TestApp:
 
         It can also be an actual full URL to an http server and webtest
         will proxy requests with `WSGIProxy2
-        <https://pypi.org/project/WSGIProxy2/>`_.
+        <https://pypi.org/project/WSGIProxy2/>`_. The responses can be
+        recorded and replayed offline, see :mod:`webtest.recorder`.
     :type app:
         WSGI application
     :param extra_environ:
@@ -124,7 +484,7 @@ class TestApp:
         ``cookiejar``.
 
     :param parser_features:
-        Passed to BeautifulSoup when parsing responses.
+        Passed to BeautifulSoup when parsing the responses of this app.
     :type parser_features:
         string or list
     :param json_encoder:
@@ -135,6 +495,76 @@ class TestApp:
         If True (default) then check that the application is WSGI compliant
     :type lint:
         A boolean
+    :param profile:
+        If True, profile the application per route with a new
+        :class:`~webtest.profiling.Profiler`. A profiler can also be given
+        to aggregate the requests of several :class:`TestApp`. It is
+        available as :attr:`profiler`. See also :meth:`profiling`.
+    :type profile:
+        A boolean or a :class:`~webtest.profiling.Profiler`
+    :param trace_memory:
+        If True, trace the memory allocated by the application with
+        :mod:`tracemalloc` and set the ``memory`` of the responses to a
+        :class:`~webtest.memory.MemoryUsage`. An integer sets the number of
+        allocation sites to keep, 10 by default.
+    :type trace_memory:
+        A boolean or an integer
+    :param http_cache:
+        If True, ``GET`` responses are cached like a browser would do by a
+        new :class:`~webtest.httpcache.HTTPCache`, available as
+        :attr:`http_cache`. A cache can also be given to share it between
+        several :class:`TestApp`.
+    :type http_cache:
+        A boolean or a :class:`~webtest.httpcache.HTTPCache`
+    :param proxy_client:
+        The WSGIProxy2 client used when ``app`` is a url, instead of the
+        one after the ``#`` of the url. ``'pooled'``, or the ``#pooled``
+        suffix, keeps the connections alive with a new
+        :class:`~webtest.client.PooledClient`.
+    :type proxy_client:
+        A string or a callable like :class:`~webtest.client.PooledClient`
+    :param decode_content:
+        When ``gzip`` and ``deflate`` bodies are decoded. True (default)
+        decodes them once read. ``'lazy'`` keeps the compressed body until
+        :attr:`~webtest.response.TestResponse.body` or anything built on
+        it is used: until then the ``Content-Encoding`` and
+        ``Content-Length`` headers are the ones of the compressed body.
+        ``'stream'`` decompresses the chunks while the application produces
+        them so the compressed body is never held in memory. Both sizes are
+        recorded in the
+        :attr:`~webtest.response.TestResponse.compressed_size` and
+        :attr:`~webtest.response.TestResponse.decompressed_size` of the
+        responses. Responses requested with ``stream=True`` are never
+        decoded.
+    :type decode_content:
+        True, ``'lazy'`` or ``'stream'``
+    :param expect:
+        The default :class:`~webtest.expect.Expect` of the requests, used
+        when they are not given one with ``expect=``.
+    :type expect:
+        :class:`~webtest.expect.Expect`
+    :param response_class:
+        :class:`~webtest.response.LiteTestResponse`, or a subclass, to
+        return compact responses which build a
+        :class:`~webtest.response.TestResponse` only when needed. This saves
+        time and memory in runs doing and keeping many responses.
+    :type response_class:
+        A subclass of :class:`~webtest.response.LiteTestResponse`
+    :param timings:
+        If True, the time spent in each phase of the requests is recorded
+        in the :attr:`~webtest.response.TestResponse.timings` of the
+        responses.
+    :type timings:
+        A boolean
+    :param app_cache:
+        If True, an ``app`` loaded from a config file with
+        :mod:`paste.deploy` is kept in the process wide
+        :data:`webtest.appcache.cache` and reused by the next
+        :class:`TestApp` using the same config file, until the file is
+        modified. Setting ``WEBTEST_APP_CACHE=1`` in the environment does
+        the same for all the :class:`TestApp`. A cache can also be given.
+    :type app_cache:
+        A boolean or a :class:`~webtest.appcache.AppCache`
     """
 
     RequestClass = TestRequest
@@ -144,8 +574,77 @@ class TestApp:
 
     def __init__(self, app, extra_environ=None, relative_to=None,
                  use_unicode=True, cookiejar=None, parser_features=None,
-                 json_encoder=None, lint=True):
+                 json_encoder=None, lint=True, profile=False,
+                 trace_memory=False, http_cache=False, proxy_client=None,
+                 decode_content=True, expect=None, response_class=None,
+                 app_cache=False, timings=False):
+
+        self.proxy_client = proxy_client
+        self.app_cache = app_cache
+        self.app = self._load_app(app, relative_to)
+        self.timings = timings
+        self.lint = lint
+        if profile is True:
+            from webtest.profiling import Profiler
+            profile = Profiler()
+        self.profiler = profile or None
+        if trace_memory is True:
+            trace_memory = 10
+        self.trace_memory = trace_memory
+        if http_cache is True:
+            from webtest.httpcache import HTTPCache
+            http_cache = HTTPCache()
+        self.http_cache = http_cache or None
+        if decode_content not in (True, 'lazy', 'stream'):
+            raise ValueError(
+                "decode_content must be True, 'lazy' or 'stream', not %r"
+                % (decode_content,))
+        self.decode_content = decode_content
+        self.expect = expect
+        if response_class is not None and \
+                not issubclass(response_class, LiteTestResponse):
+            raise TypeError(
+                'response_class must be a subclass of LiteTestResponse, '
+                'not %r' % (response_class,))
+        self.response_class = response_class
+        self.relative_to = relative_to
+        if extra_environ is None:
+            extra_environ = {}
+        self.extra_environ = extra_environ
+        # guards extra_environ changes against requests in other threads
+        self._lock = threading.RLock()
+        self.use_unicode = use_unicode
+        if cookiejar is None:
+            cookiejar = http_cookiejar.CookieJar(policy=CookiePolicy())
+        self.cookiejar = cookiejar
+        if parser_features is None:
+            parser_features = 'html.parser'
+        self.parser_features = parser_features
+        if json_encoder is None:
+            json_encoder = json.JSONEncoder
+        self.JSONEncoder = json_encoder
+
+    @contextlib.contextmanager
+    def profiling(self, profiler=None):
+        """
+        Profile the requests done in the ``with`` block with ``profiler``,
+        or a new :class:`~webtest.profiling.Profiler`, and return it::
 
+            with app.profiling() as profiler:
+                app.get('/users/1')
+            print(profiler.report())
+        """
+        if profiler is None:
+            from webtest.profiling import Profiler
+            profiler = Profiler()
+        previous = self.profiler
+        self.profiler = profiler
+        try:
+            yield profiler
+        finally:
+            self.profiler = previous
+
+    def _load_app(self, app, relative_to):
         if 'WEBTEST_TARGET_URL' in os.environ:
             app = os.environ['WEBTEST_TARGET_URL']
         if isinstance(app, str):
@@ -160,28 +659,34 @@ class TestApp:
                 if '#' not in app:
                     app += '#httplib'
                 url, client = app.split('#', 1)
+                client = getattr(self, 'proxy_client', None) or client
+                if client == 'pooled':
+                    from webtest.client import PooledClient
+                    client = PooledClient()
                 app = HostProxy(url, client=client)
+                if os.environ.get('WEBTEST_RECORD'):
+                    from webtest.recorder import Recorder
+                    app = Recorder(
+                        app,
+                        os.environ.get('WEBTEST_RECORDINGS',
+                                       'webtest-recordings'),
+                        mode=os.environ['WEBTEST_RECORD'])
             else:
                 from paste.deploy import loadapp
                 # @@: Should pick up relative_to from calling module's
                 # __file__
-                app = loadapp(app, relative_to=relative_to)
-        self.app = app
-        self.lint = lint
-        self.relative_to = relative_to
-        if extra_environ is None:
-            extra_environ = {}
-        self.extra_environ = extra_environ
-        self.use_unicode = use_unicode
-        if cookiejar is None:
-            cookiejar = http_cookiejar.CookieJar(policy=CookiePolicy())
-        self.cookiejar = cookiejar
-        if parser_features is None:
-            parser_features = 'html.parser'
-        self.RequestClass.ResponseClass.parser_features = parser_features
-        if json_encoder is None:
-            json_encoder = json.JSONEncoder
-        self.JSONEncoder = json_encoder
+                cache = getattr(self, 'app_cache', False)
+                if not cache and os.environ.get('WEBTEST_APP_CACHE') not in (
+                        None, '', '0'):
+                    cache = True
+                if cache is True:
+                    from webtest.appcache import cache
+                if cache:
+                    app = cache.load(app, relative_to=relative_to,
+                                     loader=loadapp)
+                else:
+                    app = loadapp(app, relative_to=relative_to)
+        return app
 
     def get_authorization(self):
         """Allow to set the HTTP_AUTHORIZATION environ key. Value should look
@@ -196,7 +701,7 @@ class TestApp:
         return self.authorization_value
 
     def set_authorization(self, value):
-        self.authorization_value = value
+        header = None
         if value is not None:
             invalid_value = (
                 "You should use a value like ('Basic', ('user', 'password'))"
@@ -214,15 +719,15 @@ class TestApp:
                     val = val.strip()
                 else:
                     raise ValueError(invalid_value)
-                value = str(f'{authtype} {val}')
+                header = str(f'{authtype} {val}')
             else:
                 raise ValueError(invalid_value)
-            self.extra_environ.update({
-                'HTTP_AUTHORIZATION': value,
-            })
-        else:
-            if 'HTTP_AUTHORIZATION' in self.extra_environ:
-                del self.extra_environ['HTTP_AUTHORIZATION']
+        with self._lock:
+            self.authorization_value = value
+            if header is not None:
+                self.extra_environ['HTTP_AUTHORIZATION'] = header
+            else:
+                self.extra_environ.pop('HTTP_AUTHORIZATION', None)
 
     authorization = property(get_authorization, set_authorization)
 
@@ -267,15 +772,73 @@ class TestApp:
         """
         self.cookiejar.clear()
 
+    def fork(self):
+        """
+        Return a new :class:`TestApp` starting with the cookies and the
+        ``extra_environ`` of this one, then living its own life. The
+        application is shared, so branching a logged in session is much
+        cheaper than logging in again::
+
+            app.post('/login', {'user': 'bob', 'password': 'secret'})
+            admin = app.fork()
+            admin.get('/admin')
+
+        Cookies and ``extra_environ`` values are not copied themselves,
+        only the containers holding them are.
+        """
+        new = copy.copy(self)
+        new._lock = threading.RLock()
+        new.cookiejar = utils.copy_cookiejar(self.cookiejar)
+        new.extra_environ = self._extra_environ_copy()
+        return new
+
+    def snapshot(self):
+        """
+        Save the cookies and the ``extra_environ`` of this app in a
+        :class:`Snapshot` which can be given to :meth:`restore` any number
+        of times later.
+        """
+        return Snapshot(utils.copy_cookiejar(self.cookiejar),
+                        self._extra_environ_copy())
+
+    def restore(self, snapshot):
+        """
+        Restore the cookies and the ``extra_environ`` saved by
+        :meth:`snapshot`::
+
+            app.post('/login', {'user': 'bob', 'password': 'secret'})
+            logged_in = app.snapshot()
+            for flow in flows:
+                flow(app)
+                app.restore(logged_in)
+
+        :attr:`cookiejar` and :attr:`extra_environ` are modified in place.
+        """
+        saved = utils.copy_cookiejar(snapshot.cookiejar)
+        if isinstance(self.cookiejar, http_cookiejar.CookieJar) and \
+                isinstance(saved, http_cookiejar.CookieJar):
+            with self.cookiejar._cookies_lock:
+                self.cookiejar._cookies = saved._cookies
+        else:
+            self.cookiejar = saved
+        with self._lock:
+            self.extra_environ.clear()
+            self.extra_environ.update(snapshot.extra_environ)
+
+    def _extra_environ_copy(self):
+        with self._lock:
+            return dict(self.extra_environ)
+
     def set_parser_features(self, parser_features):
         """
-        Changes the parser used by BeautifulSoup. See its documentation to
-        know the supported parsers.
+        Changes the parser used by BeautifulSoup for the next responses of
+        this app. See its documentation to know the supported parsers.
         """
-        self.RequestClass.ResponseClass.parser_features = parser_features
+        self.parser_features = parser_features
 
     def get(self, url, params=None, headers=None, extra_environ=None,
-            status=None, expect_errors=False, xhr=False):
+            status=None, expect_errors=False, xhr=False, stream=False,
+            expect=None):
         """
         Do a GET request given the url path.
 
@@ -307,6 +870,18 @@ class TestApp:
             headers={'X-REQUESTED-WITH': 'XMLHttpRequest', }
         :type xhr:
             boolean
+        :param stream:
+            If this is true, the body is not read. Use
+            :meth:`~webtest.response.TestResponse.iter_chunks` to consume
+            it lazily, then :meth:`~webtest.response.TestResponse.close`
+            to check the status and the errors.
+        :type stream:
+            boolean
+        :param expect:
+            Checked on the response instead of the default expectation of
+            the app.
+        :type expect:
+            :class:`~webtest.expect.Expect`
 
         :returns: :class:`webtest.TestResponse` instance.
 
@@ -326,18 +901,26 @@ class TestApp:
         if headers:
             req.headers.update(headers)
         return self.do_request(req, status=status,
-                               expect_errors=expect_errors)
+                               expect_errors=expect_errors, stream=stream,
+                               expect=expect)
 
     def post(self, url, params='', headers=None, extra_environ=None,
              status=None, upload_files=None, expect_errors=False,
-             content_type=None, xhr=False):
+             content_type=None, xhr=False, stream=False, expect=None):
         """
         Do a POST request. Similar to :meth:`~webtest.TestApp.get`.
 
         :param params:
-            Are put in the body of the request. If params is an
-            iterator, it will be urlencoded. If it is a string, it will not
-            be encoded, but placed in the body directly.
+            Are put in the body of the request. If params is a
+            dictionary or a list of pairs, it will be urlencoded. If it is a
+            string, it will not be encoded, but placed in the body directly.
+
+            A file object, a generator or any other iterable of bytes
+            chunks (except lists and tuples) is streamed to the application
+            as ``wsgi.input`` without being read in memory. The
+            ``Content-Length`` is set when the size of a file is known,
+            otherwise the request is sent like a chunked one, with
+            ``wsgi.input_terminated`` set.
 
             Can be a :class:`python:collections.OrderedDict` with
             :class:`webtest.forms.Upload` fields included::
@@ -350,7 +933,11 @@ class TestApp:
         :param upload_files:
             It should be a list of ``(fieldname, filename, file_content)``.
             You can also use just ``(fieldname, filename)`` and the file
-            contents will be read from disk.
+            contents will be read from disk, by chunks, while the request
+            body is consumed. Nothing is kept between requests: to upload
+            the same file many times, put a :class:`webtest.forms.Upload`
+            built with ``path=...`` in ``params`` instead. Its file is
+            mmap'd once and shared by all the requests.
         :type upload_files:
             list
         :param content_type:
@@ -363,6 +950,14 @@ class TestApp:
             headers={'X-REQUESTED-WITH': 'XMLHttpRequest', }
         :type xhr:
             boolean
+        :param stream:
+            See :meth:`~webtest.TestApp.get`.
+        :type stream:
+            boolean
+        :param expect:
+            See :meth:`~webtest.TestApp.get`.
+        :type expect:
+            :class:`~webtest.expect.Expect`
 
         :returns: :class:`webtest.TestResponse` instance.
 
@@ -373,11 +968,12 @@ class TestApp:
                                  extra_environ=extra_environ, status=status,
                                  upload_files=upload_files,
                                  expect_errors=expect_errors,
-                                 content_type=content_type)
+                                 content_type=content_type, stream=stream,
+                                 expect=expect)
 
     def put(self, url, params='', headers=None, extra_environ=None,
             status=None, upload_files=None, expect_errors=False,
-            content_type=None, xhr=False):
+            content_type=None, xhr=False, expect=None):
         """
         Do a PUT request. Similar to :meth:`~webtest.TestApp.post`.
 
@@ -390,12 +986,11 @@ class TestApp:
                                  extra_environ=extra_environ, status=status,
                                  upload_files=upload_files,
                                  expect_errors=expect_errors,
-                                 content_type=content_type,
-                                 )
+                                 content_type=content_type, expect=expect)
 
     def patch(self, url, params='', headers=None, extra_environ=None,
               status=None, upload_files=None, expect_errors=False,
-              content_type=None, xhr=False):
+              content_type=None, xhr=False, expect=None):
         """
         Do a PATCH request. Similar to :meth:`~webtest.TestApp.post`.
 
@@ -408,11 +1003,11 @@ class TestApp:
                                  extra_environ=extra_environ, status=status,
                                  upload_files=upload_files,
                                  expect_errors=expect_errors,
-                                 content_type=content_type)
+                                 content_type=content_type, expect=expect)
 
     def delete(self, url, params='', headers=None,
                extra_environ=None, status=None, expect_errors=False,
-               content_type=None, xhr=False):
+               content_type=None, xhr=False, expect=None):
         """
         Do a DELETE request. Similar to :meth:`~webtest.TestApp.get`.
 
@@ -425,10 +1020,10 @@ class TestApp:
                                  extra_environ=extra_environ, status=status,
                                  upload_files=None,
                                  expect_errors=expect_errors,
-                                 content_type=content_type)
+                                 content_type=content_type, expect=expect)
 
     def options(self, url, headers=None, extra_environ=None,
-                status=None, expect_errors=False, xhr=False):
+                status=None, expect_errors=False, xhr=False, expect=None):
         """
         Do a OPTIONS request. Similar to :meth:`~webtest.TestApp.get`.
 
@@ -440,10 +1035,10 @@ class TestApp:
         return self._gen_request('OPTIONS', url, headers=headers,
                                  extra_environ=extra_environ, status=status,
                                  upload_files=None,
-                                 expect_errors=expect_errors)
+                                 expect_errors=expect_errors, expect=expect)
 
     def head(self, url, params=None, headers=None, extra_environ=None,
-             status=None, expect_errors=False, xhr=False):
+             status=None, expect_errors=False, xhr=False, expect=None):
         """
         Do a HEAD request. Similar to :meth:`~webtest.TestApp.get`.
 
@@ -457,7 +1052,7 @@ class TestApp:
         return self._gen_request('HEAD', url, headers=headers,
                                  extra_environ=extra_environ, status=status,
                                  upload_files=None,
-                                 expect_errors=expect_errors)
+                                 expect_errors=expect_errors, expect=expect)
 
     post_json = utils.json_method('POST')
     put_json = utils.json_method('PUT')
@@ -471,6 +1066,33 @@ class TestApp:
         typical POST body, returning the (content_type, body).
 
         """
+        content_type, body = self._encode_multipart(params, files)
+        return content_type, body.getvalue()
+
+    def encode_multipart_stream(self, params, files):
+        """
+        Like :meth:`encode_multipart` but the body is a
+        :class:`~webtest.utils.MultipartBody`. It has a known length but
+        it is never joined in a single bytes object: contents are served
+        as :class:`memoryview` slices and files given by name are only
+        read from disk when the body is consumed. This is what
+        :meth:`post` and friends send as ``wsgi.input``, unless a subclass
+        overrides :meth:`encode_multipart`.
+
+        """
+        return self._encode_multipart(params, files)
+
+    def _multipart_stream(self, params, files):
+        # the content type and the (wsgi_input, content_length) of a
+        # multipart body
+        if type(self).encode_multipart is not TestApp.encode_multipart:
+            # keep the subclasses overriding encode_multipart() working
+            content_type, body = self.encode_multipart(params, files)
+            return content_type, (BytesIO(body), len(body))
+        content_type, body = self.encode_multipart_stream(params, files)
+        return content_type, (utils.IterableInput(body), len(body))
+
+    def _encode_multipart(self, params, files):
         boundary = to_bytes(str(random.random()))[2:]
         boundary = b'----------a_BoUnDaRy' + boundary + b'$'
         lines = []
@@ -519,6 +1141,10 @@ class TestApp:
                     file_info.append(value.content)
                     if value.content_type is not None:
                         file_info.append(value.content_type)
+                elif value.path is not None:
+                    file_info.append(
+                        utils.FilePart(value.path, shared=True))
+                    file_info.append(value.content_type)
                 _append_file(file_info)
             else:
                 if isinstance(value, int):
@@ -539,13 +1165,13 @@ class TestApp:
             _append_file(file_info)
 
         lines.extend([b'--' + boundary + b'--', b''])
-        body = b'\r\n'.join(lines)
+        body = utils.MultipartBody(lines)
         boundary = boundary.decode('ascii')
         content_type = 'multipart/form-data; boundary=%s' % boundary
         return content_type, body
 
     def request(self, url_or_req, status=None, expect_errors=False,
-                **req_params):
+                stream=False, expect=None, **req_params):
         """
         Creates and executes a request. You may either pass in an
         instantiated :class:`TestRequest` object, or you may pass in a
@@ -569,26 +1195,297 @@ class TestApp:
             resp = app.do_request(req)
 
         """
+        if self.timings:
+            started = (time.perf_counter(), time.thread_time())
         if isinstance(url_or_req, str):
             url_or_req = str(url_or_req)
         for (k, v) in req_params.items():
             if isinstance(v, str):
                 req_params[k] = str(v)
+        body_stream = utils.body_stream(req_params.get('body'))
+        if body_stream is not None:
+            del req_params['body']
         if isinstance(url_or_req, str):
             req = self.RequestClass.blank(url_or_req, **req_params)
         else:
             req = url_or_req.copy()
             for name, value in req_params.items():
                 setattr(req, name, value)
+        if body_stream is not None:
+            utils.set_body_stream(req, *body_stream)
         req.environ['paste.throw_errors'] = True
-        for name, value in self.extra_environ.items():
+        if self.timings:
+            req.environ['webtest.started'] = started
+        for name, value in self._extra_environ_copy().items():
             req.environ.setdefault(name, value)
         return self.do_request(req,
                                status=status,
                                expect_errors=expect_errors,
+                               stream=stream,
+                               expect=expect,
                                )
 
-    def do_request(self, req, status=None, expect_errors=None):
+    def prepare(self, method, url_template, headers=None, content_type=None,
+                extra_environ=None):
+        """
+        Precompile a request template for routes hit many times in a
+        row. The environ is built once and every call of the returned
+        :class:`~webtest.app.PreparedRequest` only copies it::
+
+            get_item = app.prepare('GET', '/items/{id}')
+            for i in range(10000):
+                get_item(id=i)
+
+            create = app.prepare('POST', '/items/',
+                                 content_type='application/json')
+            create(body='{"name": "foo"}', status=201)
+
+        :param url_template:
+            A url path, with an optional query string, where
+            ``{placeholders}`` are replaced by the keyword arguments given
+            to each call.
+        :param headers:
+            Headers sent with every request.
+        :type headers:
+            dictionary
+        :param content_type:
+            HTTP content type of the request bodies.
+        :type content_type:
+            string
+
+        :returns: :class:`webtest.app.PreparedRequest` instance.
+
+        """
+        return PreparedRequest(self, method, url_template, headers=headers,
+                               content_type=content_type,
+                               extra_environ=extra_environ)
+
+    def map(self, requests, workers=4, session='shared', status=None,
+            expect_errors=False, expect=None):
+        """
+        Runs independent requests on a pool of ``workers`` threads. This
+        lets applications releasing the GIL (database calls, sleeps...)
+        process several requests at once::
+
+            res = app.map(['/page/%s' % i for i in range(500)], workers=8)
+            assert all(r.status_int == 200 for r in res)
+            print(res.elapsed, max(res.durations))
+
+        :param requests:
+            An iterable of urls, requested with
+            :meth:`~webtest.app.TestApp.get`, or of
+            :class:`~webtest.app.TestRequest` instances, executed with
+            :meth:`~webtest.app.TestApp.request`.
+        :param workers:
+            Number of threads.
+        :type workers:
+            integer
+        :param session:
+            With ``'shared'`` every request uses the cookies and
+            ``extra_environ`` of this app, and cookies set by responses
+            are stored in it. With ``'per-worker'`` each thread starts
+            with a copy of them and keeps its own cookies afterwards.
+        :type session:
+            string
+        :param status:
+            Passed to each request, see :meth:`~webtest.app.TestApp.get`.
+        :param expect_errors:
+            Passed to each request, see :meth:`~webtest.app.TestApp.get`.
+        :param expect:
+            Passed to each request, see :meth:`~webtest.app.TestApp.get`.
+
+        :returns: :class:`webtest.app.MapResult` instance.
+
+        """
+        if session not in ('shared', 'per-worker'):
+            raise ValueError(
+                "session must be 'shared' or 'per-worker', not %r" % session)
+        local = threading.local()
+
+        def worker_app():
+            if session == 'shared':
+                return self
+            app = getattr(local, 'app', None)
+            if app is None:
+                app = local.app = self.fork()
+            return app
+
+        def run(item):
+            app = worker_app()
+            start = time.perf_counter()
+            if isinstance(item, str):
+                res = app.get(item, status=status,
+                              expect_errors=expect_errors, expect=expect)
+            else:
+                res = app.request(item, status=status,
+                                  expect_errors=expect_errors, expect=expect)
+            return res, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, requests))
+        elapsed = time.perf_counter() - start
+        return MapResult([res for res, duration in results],
+                         [duration for res, duration in results],
+                         elapsed)
+
+    def batch(self, specs, status=None, expect_errors=False, lint=None):
+        """
+        Run requests one after the other and return a list of
+        :class:`~webtest.app.BatchResult`. They hold the status, the
+        headers, the body and the duration of the responses, and only build
+        a :class:`~webtest.response.TestResponse` when
+        :meth:`~webtest.app.BatchResult.response` is called. This makes
+        seeding data or smoke testing many urls much cheaper::
+
+            results = app.batch(
+                {'method': 'POST', 'url': '/items', 'json': {'name': name}}
+                for name in names)
+            ids = [r.json['id'] for r in results]
+
+        :param specs:
+            An iterable of urls, requested with ``GET``, of
+            ``(method, url)`` or ``(method, url, params)`` tuples, of
+            :class:`~webtest.app.TestRequest` instances or of dicts with the
+            ``method``, ``url``, ``params``, ``json``, ``headers``,
+            ``content_type``, ``extra_environ``, ``status`` and
+            ``expect_errors`` keys. ``params`` are encoded in the query
+            string of ``GET``, ``HEAD`` and ``DELETE`` requests and in the
+            body of the others. ``json`` is sent as a JSON body.
+        :param status:
+            The default status of the requests, see
+            :meth:`~webtest.app.TestApp.get`.
+        :param expect_errors:
+            The default ``expect_errors`` of the requests.
+        :param lint:
+            Overrides the ``lint`` option of the app. Checking the
+            application takes a large part of the time of small requests.
+
+        The environ is built once, like for :meth:`prepare`, and copied for
+        each request. Cookies are sent and stored as usual. Other options of
+        the app, like the HTTP cache, the profiler or the default
+        ``expect``, are not used.
+        """
+        app = self.app
+        if self.lint if lint is None else lint:
+            app = lint_middleware(app)
+        # base environs by scheme and host
+        bases = {}
+        results = []
+        for spec in specs:
+            req, req_status, req_expect_errors = self._batch_request(
+                bases, spec, status, expect_errors)
+            results.append(self._batch_run(app, req, req_status,
+                                           req_expect_errors))
+        return results
+
+    def _batch_request(self, bases, spec, status, expect_errors):
+        if isinstance(spec, webob.BaseRequest):
+            req = spec.copy()
+            for name, value in self._extra_environ_copy().items():
+                req.environ.setdefault(name, value)
+            req.environ['paste.throw_errors'] = True
+            return req, status, expect_errors
+        if isinstance(spec, str):
+            spec = {'url': spec}
+        elif isinstance(spec, (list, tuple)):
+            spec = dict(zip(('method', 'url', 'params'), spec))
+        method = spec.get('method', 'GET').upper()
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(
+            str(spec['url']))
+        params = spec.get('params')
+        content_type = spec.get('content_type')
+        body = b''
+        if 'json' in spec:
+            body = json.dumps(spec['json'], cls=self.JSONEncoder)
+            content_type = content_type or 'application/json'
+        elif params and method in ('GET', 'HEAD', 'DELETE'):
+            if not isinstance(params, str):
+                params = urlencode(params, doseq=True)
+            query = query + '&' + params if query else params
+        elif params:
+            body = utils.encode_params(params, content_type)
+            content_type = content_type or \
+                'application/x-www-form-urlencoded'
+        if isinstance(body, str):
+            body = body.encode('utf8')
+
+        base = bases.get((scheme, netloc))
+        if base is None:
+            base = self.RequestClass.blank(
+                urlparse.urlunsplit((scheme, netloc, '/', '', '')),
+                self._make_environ()).environ
+            base.pop('webtest.started', None)
+            bases[scheme, netloc] = base
+        environ = base.copy()
+        environ['REQUEST_METHOD'] = method
+        if '%' in path:
+            path = urlparse.unquote(path, encoding='latin-1')
+        environ['PATH_INFO'] = path or '/'
+        environ['QUERY_STRING'] = query
+        environ['wsgi.input'] = BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        if content_type is not None:
+            environ['CONTENT_TYPE'] = content_type
+        if spec.get('extra_environ'):
+            environ.update(spec['extra_environ'])
+        req = self.RequestClass(environ)
+        headers = spec.get('headers')
+        if headers:
+            req.headers.update(headers)
+        return (req, spec.get('status', status),
+                spec.get('expect_errors', expect_errors))
+
+    def _batch_run(self, app, req, status, expect_errors):
+        environ = req.environ
+        errors = StringIO()
+        environ['wsgi.errors'] = errors
+        environ['paste.testing'] = True
+        environ['paste.testing_variables'] = {}
+        self._add_cookie_header(req)
+
+        start = time.perf_counter()
+        res_status, headers, body = self._call_app(app, req)
+        elapsed = time.perf_counter() - start
+        result = BatchResult(res_status, tuple(headers), body, elapsed, req,
+                             self, errors.getvalue())
+
+        self._extract_cookies(result, result.headers, req)
+        if not expect_errors and (
+                result._errors or status is not None or
+                not 200 <= result.status_int < 400):
+            res = result.response()
+            self._check_status(status, res)
+            self._check_errors(res)
+        return result
+
+    @staticmethod
+    def _call_app(app, req):
+        # Like req.call_application() with catch_exc_info, returning the
+        # joined body
+        captured = []
+        output = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and output:
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured[:] = [status, headers]
+            return output.append
+
+        app_iter = app(req.environ, start_response)
+        try:
+            output.extend(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        if not captured:
+            raise AssertionError(
+                'The application never called start_response for %s'
+                % req.url)
+        return captured[0], list(captured[1]), b''.join(output)
+
+    def do_request(self, req, status=None, expect_errors=None, stream=False,
+                   expect=None):
         """
         Executes the given webob Request (``req``), with the expected
         ``status``.  Generally :meth:`~webtest.TestApp.get` and
@@ -605,7 +1502,25 @@ class TestApp:
             ``TestRequest.blank()``, which will be set on the request.
             These can be arguments like ``content_type``, ``accept``, etc.
 
+        With ``stream=True`` the body is left unread and the status and
+        errors are only checked by
+        :meth:`~webtest.response.TestResponse.close`.
+
+        With ``TestApp(timings=True)`` the time spent in each phase of the
+        request is recorded in the
+        :attr:`~webtest.response.TestResponse.timings` of the response.
+
+        ``expect``, or the default :class:`~webtest.expect.Expect` of the
+        app, is checked after the status. For streamed responses only its
+        status and headers are checked, by
+        :meth:`~webtest.response.TestResponse.close`.
+
         """
+        started = req.environ.pop('webtest.started', None)
+        if self.timings:
+            timings = Timings(*(started or (None, None)))
+        else:
+            timings = None
 
         errors = StringIO()
         req.environ['wsgi.errors'] = errors
@@ -616,55 +1531,221 @@ class TestApp:
         # set framework hooks
         req.environ['paste.testing'] = True
         req.environ['paste.testing_variables'] = {}
+        if timings is not None:
+            timings.mark('environ')
 
         # set request cookies
-        self.cookiejar.add_cookie_header(utils._RequestCookieAdapter(req))
+        self._add_cookie_header(req)
+        if timings is not None:
+            timings.mark('cookie_header')
 
         # verify wsgi compatibility
         app = lint.middleware(self.app) if self.lint else self.app
-
-        # FIXME: should it be an option to not catch exc_info?
-        res = req.get_response(app, catch_exc_info=True)
-
-        # be sure to decode the content
-        res.decode_content()
+        if self.http_cache is not None:
+            # the cache plays the client, so lint sits between it and the
+            # application
+            app = self.http_cache.wrap(app)
+        called_app = app
+        if timings is not None:
+            called_app = self._timed_app(app, timings)
+
+        memory_usage = None
+        if self.profiler or self.trace_memory:
+            profiler = self.profiler
+            profiling = profiler.profile(req) if profiler else _nothing
+            if self.trace_memory:
+                from webtest.memory import trace
+                tracing = trace(top=self.trace_memory)
+            else:
+                tracing = _nothing
+            with profiling, tracing as memory_usage:
+                res = self._get_response(req, called_app, stream)
+        else:
+            res = self._get_response(req, called_app, stream)
 
         # set a few handy attributes
         res._use_unicode = self.use_unicode
+        res.parser_features = self.parser_features
         res.request = req
         res.app = app
         res.test_app = self
+        res.timings = timings
+        res.memory = memory_usage
+
+        if stream:
+            # the body, the errors and the status are handled by close()
+            res._stream = StreamState(res.app_iter, status, expect_errors,
+                                      errors, expect)
+        elif self.response_class is not None:
+            res.errors = errors.getvalue()
+        else:
+            if self.decode_content == 'lazy' and \
+                    res.content_encoding in ('gzip', 'deflate'):
+                # decoded by the first access to res.body
+                res._decode_pending = True
+            else:
+                # be sure to decode the content
+                res.decode_content()
+                if timings is not None:
+                    timings.mark('decode')
+            res.errors = errors.getvalue()
+
+        variables = req.environ['paste.testing_variables']
+        if isinstance(res, LiteTestResponse):
+            res._set_testing_variables(variables)
+        else:
+            for name, value in variables.items():
+                if hasattr(res, name):
+                    raise ValueError(
+                        "paste.testing_variables contains the variable %r, "
+                        "but the response object already has an attribute "
+                        "by that name" % name)
+                setattr(res, name, value)
+        if not stream and self._check(res, status, expect_errors, expect) \
+                and timings is not None:
+            timings.mark('checks')
+
+        # merge cookies back in
+        self._extract_cookies(res, res.headerlist, req)
+        if timings is not None:
+            timings.mark('cookie_extraction')
+            timings.stop()
+
+        return res
+
+    def _get_response(self, req, app, stream):
+        if stream:
+            return self._stream_response(req, app)
+        if self.response_class is not None:
+            return self._lite_response(req, app)
+        # FIXME: should it be an option to not catch exc_info?
+        res = req.get_response(app, catch_exc_info=True)
+        decoder = None
+        if self.decode_content == 'stream' and \
+                res.content_encoding in ('gzip', 'deflate'):
+            decoder = utils.DecodingAppIter(
+                res.app_iter, res.content_encoding, res.content_length)
+            res.app_iter = decoder
+            del res.content_length
 
         # We do this to make sure the app_iter is exhausted:
         try:
             res.body
         except TypeError:  # pragma: no cover
             pass
-        res.errors = errors.getvalue()
+        if decoder is not None:
+            res.content_encoding = None
+            res.compressed_size = decoder.compressed_size
+            res.decompressed_size = decoder.decompressed_size
+        return res
 
-        for name, value in req.environ['paste.testing_variables'].items():
-            if hasattr(res, name):
-                raise ValueError(
-                    "paste.testing_variables contains the variable %r, but "
-                    "the response object already has an attribute by that "
-                    "name" % name)
-            setattr(res, name, value)
-        if not expect_errors:
-            self._check_status(status, res)
-            self._check_errors(res)
+    def _add_cookie_header(self, req):
+        jar = self.cookiejar
+        # nothing to add from an empty jar
+        if not isinstance(jar, http_cookiejar.CookieJar) or jar._cookies:
+            jar.add_cookie_header(utils._RequestCookieAdapter(req))
+
+    def _extract_cookies(self, res, headerlist, req):
+        # only responses setting cookies change the jar
+        for name, value in headerlist:
+            if name.lower() in ('set-cookie', 'set-cookie2'):
+                self.cookiejar.extract_cookies(
+                    utils._ResponseCookieAdapter(res),
+                    utils._RequestCookieAdapter(req))
+                return
 
-        # merge cookies back in
-        self.cookiejar.extract_cookies(utils._ResponseCookieAdapter(res),
-                                       utils._RequestCookieAdapter(req))
+    def _lite_response(self, req, app):
+        status, headerlist, body = self._call_app(app, req)
+        encoding = None
+        for name, value in headerlist:
+            if name.lower() == 'content-encoding':
+                encoding = value.strip().lower()
+        if encoding in ('gzip', 'deflate'):
+            body = b''.join(utils.DecodingAppIter([body], encoding))
+            headerlist = [(name, value) for name, value in headerlist
+                          if name.lower() not in ('content-encoding',
+                                                  'content-length')]
+            headerlist.append(('Content-Length', str(len(body))))
+        return self.response_class(status, headerlist, body, req, self)
 
-        return res
+    @staticmethod
+    def _timed_app(app, timings):
+        def timed_app(environ, start_response):
+            def timed_start_response(status, headers, exc_info=None):
+                timings.mark('start_response')
+                return start_response(status, headers, exc_info)
+            return utils.TimedAppIter(app(environ, timed_start_response),
+                                      timings)
+        return timed_app
+
+    def _stream_response(self, req, app):
+        # Like req.get_response() but never drains the app_iter, even when
+        # start_response is only called once the iteration started.
+        started = time.perf_counter()
+        captured = []
+        buffered = []
+        # when the first non empty chunk was produced
+        first_chunk = []
+
+        def write(chunk):
+            if chunk and not first_chunk:
+                first_chunk.append(time.perf_counter())
+            buffered.append(chunk)
+
+        def start_response(status, headers, exc_info=None):
+            captured[:] = [status, headers]
+            return write
+
+        app_iter = app(req.environ, start_response)
+        iterator = iter(app_iter)
+        while not captured:
+            try:
+                write(next(iterator))
+            except StopIteration:
+                break
+        if not captured:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            raise AssertionError(
+                'The application never called start_response for %s'
+                % req.url)
+        streaming = utils.StreamingAppIter(app_iter, iterator, buffered)
+        if first_chunk:
+            streaming.time_to_first_byte = first_chunk[0] - started
+        else:
+            streaming.app_time = time.perf_counter() - started
+        return self.RequestClass.ResponseClass(
+            status=captured[0], headerlist=list(captured[1]),
+            app_iter=streaming)
+
+    def _check(self, res, status, expect_errors, expect, body=True):
+        # returns False when there was nothing to check
+        if expect is None:
+            expect = self.expect
+        if expect is None and expect_errors:
+            return False
+        try:
+            if expect is None:
+                self._check_status(status, res)
+                self._check_errors(res)
+                return True
+            if not expect_errors:
+                if status is not None:
+                    self._check_status(status, res)
+                self._check_errors(res)
+            expect.check(res, status=status is None and not expect_errors,
+                         body=body)
+        except AppError as e:
+            e.response = res
+            raise
+        return True
 
     def _check_status(self, status, res):
         if status == '*':
             return
         res_status = res.status
         if (isinstance(status, str) and '*' in status):
-            if re.match(fnmatch.translate(status), res_status, re.I):
+            if compile_pattern(status).match(res_status):
                 return
         if isinstance(status, str):
             if status == res_status:
@@ -694,8 +1775,12 @@ class TestApp:
                 "Application had errors logged:\n%s", errors)
 
     def _make_environ(self, extra_environ=None):
-        environ = self.extra_environ.copy()
+        environ = self._extra_environ_copy()
         environ['paste.throw_errors'] = True
+        if self.timings:
+            # used by do_request() to time the construction of the request
+            environ['webtest.started'] = (time.perf_counter(),
+                                          time.thread_time())
         if extra_environ:
             environ.update(extra_environ)
         return environ
@@ -707,7 +1792,7 @@ class TestApp:
     def _gen_request(self, method, url, params=utils.NoDefault,
                      headers=None, extra_environ=None, status=None,
                      upload_files=None, expect_errors=False,
-                     content_type=None):
+                     content_type=None, stream=False, expect=None):
         """
         Do a generic request.
         """
@@ -716,6 +1801,9 @@ class TestApp:
 
         inline_uploads = []
 
+        # file objects and iterables of chunks are not read in memory
+        body_stream = utils.body_stream(params)
+
         # this supports OrderedDict
         if isinstance(params, dict) or hasattr(params, 'items'):
             params = list(params.items())
@@ -724,8 +1812,13 @@ class TestApp:
             inline_uploads = [v for (k, v) in params
                               if isinstance(v, (forms.File, forms.Upload))]
 
-        if len(inline_uploads) > 0:
-            content_type, params = self.encode_multipart(
+        if body_stream is not None:
+            if upload_files:
+                raise ValueError(
+                    'upload_files can not be used with a streamed body')
+            environ.setdefault('CONTENT_TYPE', 'application/octet-stream')
+        elif len(inline_uploads) > 0:
+            content_type, body_stream = self._multipart_stream(
                 params, upload_files or ())
             environ['CONTENT_TYPE'] = content_type
         else:
@@ -734,7 +1827,7 @@ class TestApp:
                 (content_type and
                  to_bytes(content_type).startswith(b'multipart')):
                 params = urlparse.parse_qsl(params, keep_blank_values=True)
-                content_type, params = self.encode_multipart(
+                content_type, body_stream = self._multipart_stream(
                     params, upload_files or ())
                 environ['CONTENT_TYPE'] = content_type
             elif params:
@@ -747,14 +1840,18 @@ class TestApp:
         url = str(url)
         url = self._remove_fragment(url)
         req = self.RequestClass.blank(url, environ)
-        if isinstance(params, str):
-            params = params.encode(req.charset or 'utf8')
-        req.environ['wsgi.input'] = BytesIO(params)
-        req.content_length = len(params)
+        if body_stream is not None:
+            utils.set_body_stream(req, *body_stream)
+        else:
+            if isinstance(params, str):
+                params = params.encode(req.charset or 'utf8')
+            req.environ['wsgi.input'] = BytesIO(params)
+            req.content_length = len(params)
         if headers:
             req.headers.update(headers)
         return self.do_request(req, status=status,
-                               expect_errors=expect_errors)
+                               expect_errors=expect_errors, stream=stream,
+                               expect=expect)
 
     def _get_file_info(self, file_info):
         if len(file_info) == 2:
@@ -762,13 +1859,10 @@ class TestApp:
             filename = file_info[1]
             if self.relative_to:
                 filename = os.path.join(self.relative_to, filename)
-            f = open(filename, 'rb')
-            content = f.read()
-            f.close()
-            return (file_info[0], filename, content, None)
+            return (file_info[0], filename, utils.FilePart(filename), None)
         elif 3 <= len(file_info) <= 4:
             content = file_info[2]
-            if not isinstance(content, bytes):
+            if not isinstance(content, (bytes, utils.FilePart)):
                 raise ValueError('File content must be %s not %s'
                                  % (bytes, type(content)))
             if len(file_info) == 3:
@@ -0,0 +1,129 @@
+"""
+A process wide cache of the applications loaded by ``paste.deploy``, for
+suites creating a :class:`~webtest.app.TestApp` from the same config file
+in each test::
+
+    app = TestApp('config:test.ini', relative_to=HERE, app_cache=True)
+
+Setting ``WEBTEST_APP_CACHE=1`` in the environment enables it for all the
+:class:`~webtest.app.TestApp`. The applications are shared: state they keep
+between requests is shared too.
+"""
+
+import os
+import threading
+import time
+
+
+__all__ = ['AppCache', 'cache']
+
+
+class AppCache:
+    """
+    Keep the applications returned by :func:`paste.deploy.loadapp` by
+    config uri, ``relative_to`` and modification time of the config file.
+    Editing the file loads the application again. Files included by the
+    config file are not watched: use :meth:`invalidate` after changing
+    them.
+
+    .. attribute:: hits
+
+        Number of applications returned from the cache.
+
+    .. attribute:: misses
+
+        Number of applications loaded.
+
+    .. attribute:: load_time
+
+        Seconds spent loading applications.
+
+    .. attribute:: saved
+
+        Seconds the hits would have spent loading their application again.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+        self.saved = 0.0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def config_path(uri, relative_to=None):
+        """Return the path of the file of a ``config:`` uri, or None."""
+        if not uri.startswith('config:'):
+            return None
+        path = uri[len('config:'):].split('#', 1)[0]
+        if not os.path.isabs(path) and relative_to:
+            path = os.path.join(relative_to, path)
+        return os.path.normpath(path)
+
+    def _mtime(self, uri, relative_to):
+        path = self.config_path(uri, relative_to)
+        if path is None:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, uri, relative_to=None, loader=None):
+        """Return the application of ``uri``, loading it with ``loader``,
+        by default :func:`paste.deploy.loadapp`, when it is not cached."""
+        mtime = self._mtime(uri, relative_to)
+        key = (uri, relative_to)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self.hits += 1
+                self.saved += entry[2]
+                return entry[1]
+            if loader is None:
+                from paste.deploy import loadapp as loader
+            start = time.perf_counter()
+            app = loader(uri, relative_to=relative_to)
+            duration = time.perf_counter() - start
+            self.entries[key] = (mtime, app, duration)
+            self.misses += 1
+            self.load_time += duration
+            return app
+
+    def invalidate(self, uri=None, relative_to=None):
+        """Forget the applications of ``uri``, for any ``relative_to``
+        unless one is given, or all the applications when ``uri`` is None.
+        Return the number of applications forgotten."""
+        with self._lock:
+            keys = [key for key in self.entries
+                    if uri is None or (
+                        key[0] == uri and
+                        (relative_to is None or key[1] == relative_to))]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+    def clear(self):
+        """Forget all the applications and reset the stats."""
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+            self.load_time = self.saved = 0.0
+
+    def stats(self):
+        """Return the stats as a dict."""
+        with self._lock:
+            return {'apps': len(self.entries), 'hits': self.hits,
+                    'misses': self.misses, 'load_time': self.load_time,
+                    'saved': self.saved}
+
+    def __repr__(self):
+        return '<{} {} apps, {} hits, {:.3f}s saved>'.format(
+            self.__class__.__name__, len(self.entries), self.hits,
+            self.saved)
+
+
+#: The cache used by ``TestApp(app_cache=True)`` and
+#: ``WEBTEST_APP_CACHE=1``.
+cache = AppCache()
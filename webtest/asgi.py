@@ -0,0 +1,224 @@
+"""
+Routines for testing ASGI applications.
+
+Most interesting is AsyncTestApp
+"""
+
+import asyncio
+import os
+
+from webtest.app import TestApp
+from webtest.app import TestRequest
+from webtest.compat import urlparse
+from webtest.response import TestResponse
+
+
+__all__ = ['AsyncTestApp']
+
+
+class AsyncTestResponse(TestResponse):
+    """A :class:`~webtest.response.TestResponse` returned by
+    :class:`~webtest.asgi.AsyncTestApp`. Methods doing new requests, like
+    :meth:`follow`, :meth:`click` or :meth:`~webtest.forms.Form.submit`,
+    return coroutines."""
+
+    # Tell pytest not to collect this class as tests
+    __test__ = False
+
+    async def maybe_follow(self, **kw):
+        """
+        Follow all redirects. If this response is not a redirect, do nothing.
+        Any keyword arguments are passed to
+        :meth:`webtest.asgi.AsyncTestApp.get`.
+        """
+        remaining_redirects = 100  # infinite loops protection
+        response = self
+
+        while 300 <= response.status_int < 400 and remaining_redirects:
+            response = await response._follow(**kw)
+            remaining_redirects -= 1
+
+        if remaining_redirects <= 0:
+            raise AssertionError("redirects chain looks infinite")
+
+        return response
+
+
+class AsyncTestRequest(TestRequest):
+    """A :class:`~webtest.app.TestRequest` producing
+    :class:`AsyncTestResponse`"""
+
+    # Tell pytest not to collect this class as tests
+    __test__ = False
+
+    ResponseClass = AsyncTestResponse
+
+
+class AsyncTestApp(TestApp):
+    """
+    Wraps an `ASGI <https://asgi.readthedocs.io/>`_ application. It takes
+    the same arguments as :class:`~webtest.app.TestApp` but all the request
+    methods are coroutines::
+
+        app = AsyncTestApp(asgi_app)
+        res = await app.get('/')
+        res = await res.follow()
+        res = await res.form.submit()
+
+    The application is called directly on the running event loop, so many
+    requests can be awaited concurrently with :func:`asyncio.gather`.
+
+    ``lint`` is ignored since it only checks WSGI compliance, and nothing
+    is written to ``wsgi.errors`` so ``res.errors`` is always empty.
+
+    ``WEBTEST_TARGET_URL``, Paste Deploy URIs, ``stream=True``,
+    :meth:`~webtest.app.TestApp.batch`, :meth:`~webtest.app.TestApp.map`,
+    :meth:`~webtest.app.TestApp.profiling`, the ``response_class``,
+    ``http_cache``, ``profile``, ``trace_memory`` and ``timings`` options
+    and ``decode_content`` other than ``True`` are not supported and raise
+    an error.
+    """
+
+    RequestClass = AsyncTestRequest
+
+    # Tell pytest not to collect this class as tests
+    __test__ = False
+
+    def __init__(self, app, *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        options = [('response_class', self.response_class),
+                   ('http_cache', self.http_cache),
+                   ('profile', self.profiler),
+                   ('trace_memory', self.trace_memory),
+                   ('timings', self.timings),
+                   ('decode_content', self.decode_content is not True)]
+        unsupported = [name for name, value in options if value]
+        if unsupported:
+            raise ValueError('AsyncTestApp does not support %s'
+                             % ', '.join(unsupported))
+
+    def _load_app(self, app, relative_to):
+        if 'WEBTEST_TARGET_URL' in os.environ:
+            raise ValueError(
+                'AsyncTestApp does not support WEBTEST_TARGET_URL; unset it '
+                'or use TestApp to test a real server')
+        if isinstance(app, str):
+            raise TypeError(
+                'AsyncTestApp needs an ASGI application, not %r' % app)
+        return app
+
+    def batch(self, *args, **kwargs):
+        """Not supported: await the requests, or run them concurrently
+        with :func:`asyncio.gather`."""
+        raise NotImplementedError(
+            'AsyncTestApp does not support batch(), use asyncio.gather()')
+
+    def map(self, *args, **kwargs):
+        """Not supported: await the requests, or run them concurrently
+        with :func:`asyncio.gather`."""
+        raise NotImplementedError(
+            'AsyncTestApp does not support map(), use asyncio.gather()')
+
+    def profiling(self, profiler=None):
+        """Not supported: the application runs on the event loop, outside
+        of the profiler."""
+        raise NotImplementedError('AsyncTestApp does not support profiling()')
+
+    async def do_request(self, req, status=None, expect_errors=None,
+                         stream=False, expect=None):
+        """
+        Executes the given webob Request (``req``) against the ASGI
+        application, with the expected ``status``. See
+        :meth:`webtest.app.TestApp.do_request`. ``stream`` is not
+        supported.
+        """
+        if stream:
+            raise ValueError('AsyncTestApp does not support stream=True')
+        script_name = req.environ.get('SCRIPT_NAME', '')
+        if script_name and req.path_info.startswith(script_name):
+            req.path_info = req.path_info[len(script_name):]
+
+        # set request cookies
+        self._add_cookie_header(req)
+
+        scope = self._make_scope(req)
+        messages = [{'type': 'http.request', 'body': req.body,
+                     'more_body': False}]
+        disconnected = asyncio.Event()
+        started = {}
+        chunks = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                if started:
+                    raise AssertionError(
+                        'http.response.start sent twice for %s' % req.url)
+                started.update(message)
+            elif message['type'] == 'http.response.body':
+                if not started:
+                    raise AssertionError(
+                        'http.response.body sent before '
+                        'http.response.start for %s' % req.url)
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    disconnected.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            disconnected.set()
+
+        if not started:
+            raise AssertionError(
+                'The application did not send a response for %s' % req.url)
+
+        headerlist = [(name.decode('latin-1'), value.decode('latin-1'))
+                      for name, value in started.get('headers', [])]
+        res = self.RequestClass.ResponseClass(
+            status=started['status'], headerlist=headerlist, app_iter=chunks)
+
+        # be sure to decode the content
+        res.decode_content()
+
+        # set a few handy attributes
+        res._use_unicode = self.use_unicode
+        res.parser_features = self.parser_features
+        res.request = req
+        res.app = self.app
+        res.test_app = self
+        res.errors = ''
+
+        self._check(res, status, expect_errors, expect)
+
+        # merge cookies back in
+        self._extract_cookies(res, res.headerlist, req)
+
+        return res
+
+    def _make_scope(self, req):
+        environ = req.environ
+        path = req.script_name + req.path_info
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in req.headers.items()]
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0', 'spec_version': '2.3'},
+            'http_version': environ.get(
+                'SERVER_PROTOCOL', 'HTTP/1.1').split('/')[-1],
+            'method': req.method,
+            'scheme': req.scheme,
+            'path': path,
+            'raw_path': urlparse.quote(path).encode('latin-1'),
+            'query_string': req.query_string.encode('latin-1'),
+            'root_path': req.script_name,
+            'headers': headers,
+            'client': (environ.get('REMOTE_ADDR', '127.0.0.1'), 0),
+            'server': (req.server_name, int(req.server_port)),
+            'extensions': {},
+        }
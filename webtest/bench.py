@@ -0,0 +1,232 @@
+"""
+Measure the per request overhead of :class:`~webtest.app.TestApp`.
+
+Each benchmark does a request with :meth:`~webtest.app.TestApp.get`,
+:meth:`~webtest.app.TestApp.post`, :meth:`~webtest.app.TestApp.post_json`,
+a multipart upload or a template built by
+:meth:`~webtest.app.TestApp.prepare`, with and without ``lint``, without cookies, with
+the default cookie jar and with :class:`~webtest.cookiejar.FastCookieJar`,
+against a trivial application and against
+:class:`~webtest.debugapp.DebugApp`. Calling the applications directly
+gives the baseline. Results are written as JSON::
+
+    $ python -m webtest.bench --output results.json
+    $ python -m webtest.bench --filter 'post*' --number 500
+"""
+
+import argparse
+import fnmatch
+import json
+import platform
+import sys
+import timeit
+from io import BytesIO
+
+from webtest.app import TestApp
+from webtest.cookiejar import FastCookieJar
+from webtest.debugapp import DebugApp
+
+
+__all__ = ['run', 'main']
+
+
+def trivial_app(environ, start_response):
+    wsgi_input = environ['wsgi.input']
+    length = environ.get('CONTENT_LENGTH')
+    if length:
+        wsgi_input.read(int(length))
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', '2')])
+    return [b'ok']
+
+
+def set_cookie(app):
+    """Add a ``Set-Cookie`` header to the responses of ``app``."""
+    def application(environ, start_response):
+        def cookie_start_response(status, headers, exc_info=None):
+            headers = list(headers)
+            headers.append(('Set-Cookie', 'session=abcdef; Path=/'))
+            return start_response(status, headers, exc_info)
+        return app(environ, cookie_start_response)
+    return application
+
+
+APPS = {
+    'trivial': lambda: trivial_app,
+    'debugapp': lambda: DebugApp(),
+}
+
+
+def _get(app):
+    return lambda: app.get('/items/1', params={'q': 'webtest'})
+
+
+def _prepare(app):
+    get_item = app.prepare('GET', '/items/{id}?q={q}')
+    return lambda: get_item(id=1, q='webtest')
+
+
+def _post(app):
+    return lambda: app.post('/items', {'name': 'webtest', 'size': '3'})
+
+
+def _post_json(app):
+    return lambda: app.post_json('/items', {'name': 'webtest', 'size': 3})
+
+
+def _multipart(app):
+    content = b'x' * 16 * 1024
+    return lambda: app.post('/items', {'name': 'webtest'},
+                            upload_files=[('file', 'data.bin', content)])
+
+
+COOKIE_MODES = {
+    None: 'nocookies',
+    'cookiejar': 'cookies',
+    'fast': 'fastcookies',
+}
+
+SCENARIOS = {
+    'get': _get,
+    'prepare': _prepare,
+    'post': _post,
+    'post_json': _post_json,
+    'multipart': _multipart,
+}
+
+
+def _direct(app):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': '/items/1',
+        'QUERY_STRING': 'q=webtest', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.0',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+    def start_response(status, headers, exc_info=None):
+        return None
+
+    def request():
+        env = dict(environ, **{'wsgi.input': BytesIO()})
+        app_iter = app(env, start_response)
+        try:
+            b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+    return request
+
+
+def benchmarks():
+    """Yield ``(name, params, setup)`` for all the benchmarks. ``setup``
+    returns the function to time."""
+    for app_name, make_app in APPS.items():
+        yield ('%s:wsgi' % app_name,
+               {'app': app_name, 'scenario': 'wsgi', 'lint': None,
+                'cookies': None},
+               lambda make_app=make_app: _direct(make_app()))
+        for scenario, make_scenario in SCENARIOS.items():
+            for lint in (True, False):
+                for cookies in (None, 'cookiejar', 'fast'):
+                    name = '{}:{}:{}:{}'.format(
+                        app_name, scenario,
+                        'lint' if lint else 'nolint',
+                        COOKIE_MODES[cookies])
+                    params = {'app': app_name, 'scenario': scenario,
+                              'lint': lint, 'cookies': cookies}
+
+                    def setup(make_app=make_app, lint=lint,
+                              cookies=cookies,
+                              make_scenario=make_scenario):
+                        app = make_app()
+                        cookiejar = None
+                        if cookies:
+                            app = set_cookie(app)
+                        if cookies == 'fast':
+                            cookiejar = FastCookieJar()
+                        test_app = TestApp(app, lint=lint,
+                                           cookiejar=cookiejar)
+                        if cookies:
+                            for i in range(3):
+                                test_app.set_cookie('cookie%d' % i, 'value')
+                        return make_scenario(test_app)
+                    yield name, params, setup
+
+
+def run(pattern='*', number=1000, repeat=3, out=None):
+    """Run the benchmarks whose name matches ``pattern`` and return the
+    results as a dict. Times are the best of ``repeat`` runs of ``number``
+    requests, in microseconds per request. If ``out`` is a file, a line is
+    written to it after each benchmark."""
+    results = []
+    for name, params, setup in benchmarks():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        func = setup()
+        func()  # warm up
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        result = dict(params, name=name, us_per_request=best / number * 1e6)
+        results.append(result)
+        if out is not None:
+            out.write('%-40s %10.2f us/request\n' % (
+                name, result['us_per_request']))
+            out.flush()
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'webtest': _version(),
+        'number': number,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version('webtest')
+    except Exception:  # pragma: no cover
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m webtest.bench',
+        description='Measure the per request overhead of webtest.TestApp.')
+    parser.add_argument('--filter', default='*',
+                        help='only run the benchmarks matching this glob, '
+                             'like "debugapp:post*" (default: all)')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='requests per run (default: 1000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per benchmark, the best one is kept '
+                             '(default: 3)')
+    parser.add_argument('--output', default='-',
+                        help='file to write the JSON results to '
+                             '(default: stdout)')
+    parser.add_argument('--list', action='store_true',
+                        help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, params, setup in benchmarks():
+            if fnmatch.fnmatch(name, args.filter):
+                print(name)
+        return 0
+
+    results = run(args.filter, number=args.number, repeat=args.repeat,
+                  out=sys.stderr)
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(data)
+    else:
+        with open(args.output, 'w') as fd:
+            fd.write(data + '\n')
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+A keep-alive HTTP client for `WSGIProxy2
+<https://pypi.org/project/WSGIProxy2/>`_, used when
+:class:`~webtest.app.TestApp` tests a real server::
+
+    app = TestApp('http://staging.example.com#pooled')
+    app = TestApp('http://staging.example.com',
+                  proxy_client=PooledClient(pool_size=4))
+"""
+
+import collections
+import itertools
+import threading
+from http import client as http_client
+
+
+__all__ = ['PooledClient']
+
+
+class PooledClient:
+    """
+    Send requests over persistent connections instead of opening a new
+    one for each request like the default ``httplib`` client of
+    WSGIProxy2.
+
+    :param pool_size:
+        Maximum number of idle connections kept per host. More connections
+        are opened when more requests run at once, but they are closed
+        after use.
+
+    Other keyword arguments, like ``timeout`` or ``context``, are passed
+    to :class:`http.client.HTTPConnection` or
+    :class:`http.client.HTTPSConnection`.
+
+    A request failing on a reused connection because the server closed it
+    in the meantime is sent again on a new connection. That only happens
+    for errors meaning the connection was stale, and only when the method
+    is idempotent or the server cannot have started to answer. Other
+    errors, like timeouts, are raised.
+
+    .. attribute:: opened
+
+        Number of connections opened.
+
+    .. attribute:: requests
+
+        Number of requests sent.
+
+    .. attribute:: per_connection
+
+        A :class:`collections.Counter` of the requests sent by connection.
+    """
+
+    HTTPConnection = http_client.HTTPConnection
+    HTTPSConnection = http_client.HTTPSConnection
+
+    #: Methods sent again after any stale connection error.
+    idempotent_methods = frozenset(
+        ['GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'])
+
+    #: Errors of a connection closed by the server while it was idle.
+    stale_errors = (http_client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError)
+
+    def __init__(self, pool_size=10, **connection_options):
+        self.pool_size = pool_size
+        self.options = connection_options
+        self.opened = 0
+        self.requests = 0
+        self.per_connection = collections.Counter()
+        self._idle = collections.defaultdict(list)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def reused(self):
+        """Number of requests sent over an already used connection."""
+        return self.requests - len(self.per_connection)
+
+    def stats(self):
+        """Return the statistics as a dict."""
+        with self._lock:
+            return {
+                'opened': self.opened,
+                'requests': self.requests,
+                'reused': self.reused,
+                'idle': sum(len(conns) for conns in self._idle.values()),
+                'per_connection': dict(self.per_connection),
+            }
+
+    def __call__(self, uri, method, body, headers):
+        # same arguments and result as wsgiproxy.proxies.HttpClient
+        scheme, rest = uri.split('://', 1)
+        if '/' in rest:
+            host, path = rest.split('/', 1)
+        else:
+            host, path = rest, ''
+        path = '/' + path
+        if ':' not in host:
+            host += ':443' if scheme == 'https' else ':80'
+        key = (scheme, host)
+
+        if 'Transfer-Encoding' in headers:
+            del headers['Transfer-Encoding']
+        if headers.get('Content-Length'):
+            body = body.read(int(headers['Content-Length']))
+        else:
+            body = None
+
+        conn, reused = self._acquire(key)
+        sent = False
+        try:
+            self._send(conn, method, path, body, headers)
+            sent = True
+            response = conn.getresponse()
+        except self.stale_errors as e:
+            conn.close()
+            if not reused or not self._can_retry(method, sent, e):
+                raise
+            # the server closed an idle connection
+            conn, reused = self._acquire(key, new=True)
+            try:
+                self._send(conn, method, path, body, headers)
+                response = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        status = '%s %s' % (response.status, response.reason)
+        resp_headers = [(k, v) for (k, v) in response.getheaders()
+                        if k.lower() != 'transfer-encoding']
+        try:
+            resp_body = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return (status, response.getheader('location', None), resp_headers,
+                [resp_body])
+
+    def _send(self, conn, method, path, body, headers):
+        with self._lock:
+            self.requests += 1
+            self.per_connection[conn.webtest_id] += 1
+        conn.request(method, path, body, headers)
+
+    def _can_retry(self, method, sent, error):
+        if method.upper() in self.idempotent_methods:
+            return True
+        # the server did not receive the whole request, or closed the
+        # connection without sending a byte of the response
+        return not sent or \
+            isinstance(error, http_client.RemoteDisconnected)
+
+    def _acquire(self, key, new=False):
+        with self._lock:
+            idle = self._idle[key]
+            if idle and not new:
+                return idle.pop(), True
+            self.opened += 1
+            conn_id = next(self._ids)
+        scheme, host = key
+        if scheme == 'https':
+            conn = self.HTTPSConnection(host, **self.options)
+        else:
+            conn = self.HTTPConnection(host, **self.options)
+        conn.webtest_id = conn_id
+        return conn, False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def __repr__(self):
+        return '<{} {} requests on {} connections>'.format(
+            self.__class__.__name__, self.requests, self.opened)
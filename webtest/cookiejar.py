@@ -0,0 +1,111 @@
+"""
+A cookie jar caching the ``Cookie`` header of the requests.
+"""
+
+import time
+from http import cookiejar as http_cookiejar
+
+from webtest.app import CookiePolicy
+from webtest.compat import urlparse
+
+
+__all__ = ['FastCookieJar']
+
+_missing = object()
+
+
+class FastCookieJar(http_cookiejar.CookieJar):
+    """
+    A :class:`http.cookiejar.CookieJar` which only looks for the cookies
+    of a request when the cookies changed since the last request to the
+    same scheme, host and path. Otherwise the ``Cookie`` header is reused
+    as is, and responses without ``Set-Cookie`` headers are not parsed at
+    all::
+
+        app = TestApp(wsgi_app, cookiejar=FastCookieJar())
+
+    It uses the :class:`~webtest.app.CookiePolicy` of
+    :class:`~webtest.app.TestApp` by default and chooses cookies exactly
+    like :class:`~http.cookiejar.CookieJar` does, as long as the policy is
+    not changed after the jar is created. Cached headers are also dropped
+    when a cookie of the jar expires.
+
+    :param max_cached:
+        Number of ``Cookie`` headers to keep. The cache is emptied when it
+        is full.
+    """
+
+    def __init__(self, policy=None, max_cached=1024):
+        if policy is None:
+            policy = CookiePolicy()
+        self.max_cached = max_cached
+        self._headers = {}
+        self._next_expiry = None
+        super().__init__(policy)
+
+    @property
+    def _cookies(self):
+        return self._cookie_dict
+
+    @_cookies.setter
+    def _cookies(self, cookies):
+        # assigned by CookieJar.__init__, utils.copy_cookiejar and
+        # TestApp.restore()
+        self._cookie_dict = cookies
+        self._invalidate()
+
+    def _invalidate(self):
+        # a new dict, not clear(): copies made with copy.copy() share it
+        self._headers = {}
+        self._next_expiry = None
+
+    def set_cookie(self, cookie):
+        with self._cookies_lock:
+            previous = self._cookies.get(cookie.domain, {}).get(
+                cookie.path, {}).get(cookie.name)
+            super().set_cookie(cookie)
+            # applications often send the same cookies again and again
+            if previous is None or vars(previous) != vars(cookie):
+                self._invalidate()
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            try:
+                super().clear(domain, path, name)
+            finally:
+                self._invalidate()
+
+    def add_cookie_header(self, request):
+        if self._policy.rfc2965:
+            # Cookie2 headers depend on more than the request url
+            super().add_cookie_header(request)
+            return
+        now = int(time.time())
+        scheme, netloc, path = urlparse.urlsplit(request.get_full_url())[:3]
+        key = (scheme, netloc.lower(), path)
+        with self._cookies_lock:
+            if self._next_expiry is None:
+                self._next_expiry = min(
+                    (cookie.expires for cookie in self
+                     if cookie.expires is not None),
+                    default=float('inf'))
+            if now >= self._next_expiry:
+                # let CookieJar remove the expired cookies
+                super().add_cookie_header(request)
+                return
+            header = self._headers.get(key, _missing)
+            if header is _missing:
+                self._policy._now = self._now = now
+                attrs = self._cookie_attrs(self._cookies_for_request(request))
+                header = '; '.join(attrs) if attrs else None
+                if len(self._headers) >= self.max_cached:
+                    self._headers = {}
+                self._headers[key] = header
+        if header is not None and not request.has_header('Cookie'):
+            request.add_unredirected_header('Cookie', header)
+
+    def extract_cookies(self, response, request):
+        headers = response.info()
+        if headers.get_all('Set-Cookie', None) or \
+                headers.get_all('Set-Cookie2', None):
+            super().extract_cookies(response, request)
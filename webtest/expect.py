@@ -0,0 +1,196 @@
+"""
+Declarative expectations checked by :class:`~webtest.app.TestApp` on the
+responses::
+
+    from webtest.expect import Expect
+
+    created = Expect(status=201, content_type='application/json',
+                     headers={'Location': '*/items/*'},
+                     json_keys=['id', 'owner.name'])
+    app.post_json('/items', {'name': 'foo'}, expect=created)
+
+    app = TestApp(wsgi_app, expect=Expect(no_headers=['X-Debug']))
+
+An :class:`Expect` is compiled once and checks a response in a single
+pass, reporting all its failures in one :class:`~webtest.app.AppError`.
+"""
+
+import fnmatch
+import functools
+import re
+
+
+__all__ = ['Expect', 'compile_pattern']
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    """Return a case insensitive regex matching the glob ``pattern``, like
+    ``'3*'`` or ``'text/*'``. Compiled patterns are cached."""
+    return re.compile(fnmatch.translate(pattern), re.I)
+
+
+_missing = object()
+
+
+class Expect:
+    """
+    What a response must look like.
+
+    :param status:
+        An integer, a status string, a glob like ``'2*'`` or
+        ``'4?? *'``, a list of integers, or ``'*'`` for any status. None,
+        the default, accepts 2xx and 3xx statuses like
+        :meth:`~webtest.app.TestApp.get` does.
+    :param headers:
+        Headers the response must have. A dict maps the names to globs
+        their values must match, or to None to only require the header.
+        A list of names only requires them.
+    :param no_headers:
+        Names of headers the response must not have.
+    :param content_type:
+        A glob the content type, without its parameters, must match, like
+        ``'application/json'`` or ``'text/*'``.
+    :param json_keys:
+        Keys the JSON body must have. Dotted keys like ``'user.id'`` look
+        into nested objects.
+    :param contains:
+        Strings the body must contain, see
+        :meth:`~webtest.response.TestResponse.mustcontain`.
+    :param no:
+        Strings the body must not contain.
+
+    Expectations given with ``expect=`` to a request are used instead of
+    the default one of the :class:`~webtest.app.TestApp`. The ``status``
+    and ``expect_errors`` arguments of the request take precedence over
+    the status of the expectation.
+    """
+
+    def __init__(self, status=None, headers=None, no_headers=(),
+                 content_type=None, json_keys=(), contains=(), no=()):
+        self.status = status
+        if status is None or status == '*':
+            self._statuses = None
+            self._status_pattern = None
+        elif isinstance(status, int):
+            self._statuses = frozenset([status])
+            self._status_pattern = None
+        elif isinstance(status, (list, tuple, set, frozenset)):
+            self._statuses = frozenset(status)
+            self._status_pattern = None
+        else:
+            self._statuses = None
+            self._status_pattern = compile_pattern(status)
+
+        if headers is None:
+            headers = {}
+        elif not hasattr(headers, 'items'):
+            headers = dict.fromkeys(headers)
+        self.headers = headers
+        self._headers = [
+            (name, value, None if value is None else compile_pattern(value))
+            for name, value in headers.items()]
+        self.no_headers = tuple(no_headers)
+
+        self.content_type = content_type
+        self._content_type = (compile_pattern(content_type)
+                              if content_type is not None else None)
+        self.json_keys = tuple(json_keys)
+        self._json_keys = [(key, key.split('.')) for key in self.json_keys]
+        self.contains = (contains,) if isinstance(contains, str) \
+            else tuple(contains)
+        self.no = (no,) if isinstance(no, str) else tuple(no)
+
+    def failures(self, res, status=True, body=True):
+        """Return the list of the expectations ``res`` does not meet.
+        ``status=False`` skips the status and ``body=False`` the
+        expectations needing the body."""
+        failures = []
+        if status:
+            failure = self._check_status(res)
+            if failure:
+                failures.append(failure)
+
+        headers = res.headers
+        for name, value, pattern in self._headers:
+            actual = headers.get(name)
+            if actual is None:
+                failures.append('missing header %s' % name)
+            elif pattern is not None and not pattern.match(actual):
+                failures.append('header %s: %r does not match %r' % (
+                    name, actual, value))
+        for name in self.no_headers:
+            if name in headers:
+                failures.append('unexpected header %s: %r' % (
+                    name, headers[name]))
+        if self._content_type is not None:
+            content_type = res.content_type or ''
+            if not self._content_type.match(content_type):
+                failures.append('content type %r does not match %r' % (
+                    content_type, self.content_type))
+
+        if not body:
+            return failures
+        if self._json_keys:
+            try:
+                data = res.json
+            except (AttributeError, ValueError) as e:
+                failures.append('body is not JSON: %s' % e)
+            else:
+                for key, path in self._json_keys:
+                    if self._lookup(data, path) is _missing:
+                        failures.append('missing JSON key %s' % key)
+        for s in self.contains:
+            if s not in res:
+                failures.append('body does not contain %r' % s)
+        for s in self.no:
+            if s in res:
+                failures.append('body contains %r' % s)
+        return failures
+
+    def _check_status(self, res):
+        if self._statuses is not None:
+            if res.status_int not in self._statuses:
+                return 'status %s is not %s' % (
+                    res.status, ', '.join(map(str, sorted(self._statuses))))
+        elif self._status_pattern is not None:
+            if not self._status_pattern.match(res.status):
+                return 'status %s does not match %r' % (
+                    res.status, self.status)
+        elif self.status is None and not 200 <= res.status_int < 400:
+            return 'status %s is not 200 OK or a 3xx redirect' % res.status
+        return None
+
+    @staticmethod
+    def _lookup(data, path):
+        for key in path:
+            if isinstance(data, dict):
+                data = data.get(key, _missing)
+            elif isinstance(data, list) and key.isdigit() and \
+                    int(key) < len(data):
+                data = data[int(key)]
+            else:
+                return _missing
+            if data is _missing:
+                break
+        return data
+
+    def check(self, res, status=True, body=True):
+        """Raise an :class:`~webtest.app.AppError` listing the failures of
+        ``res``, if any."""
+        failures = self.failures(res, status=status, body=body)
+        if failures:
+            from webtest.app import AppError
+            url = res.request.url if res.request is not None else None
+            raise AppError(
+                "Bad response: %s (%s for %s)\n%s",
+                res.status, '; '.join(failures), url, res)
+
+    def __repr__(self):
+        params = []
+        for name in ('status', 'headers', 'no_headers', 'content_type',
+                     'json_keys', 'contains', 'no'):
+            value = getattr(self, name)
+            if value or (name == 'status' and value is not None):
+                params.append(f'{name}={value!r}')
+        return '<{} {}>'.format(self.__class__.__name__, ' '.join(params))
@@ -3,7 +3,6 @@
 import operator
 import re
 
-from bs4 import BeautifulSoup
 from collections import OrderedDict
 from webtest import utils
 
@@ -22,23 +21,32 @@ class Upload:
         <Upload "filename.txt">
         >>> Upload("README.txt")
         <Upload "README.txt">
+        >>> Upload("report.csv", path="tests/html/404.html")
+        <Upload "report.csv">
 
     :param filename: Name of the file to upload.
     :param content: Contents of the file.
     :param content_type: MIME type of the file.
+    :param path: Path of a file to send instead of ``content``. It is only
+                 read when the request body is consumed, and it is mmap'd
+                 once and shared when the same file is uploaded again.
 
     """
 
-    def __init__(self, filename, content=None, content_type=None):
+    def __init__(self, filename, content=None, content_type=None, path=None):
         self.filename = filename
         self.content = content
         self.content_type = content_type
+        self.path = path
 
     def __iter__(self):
         yield self.filename
         if self.content is not None:
             yield self.content
             yield self.content_type
+        elif self.path is not None:
+            yield utils.FilePart(self.path, shared=True)
+            yield self.content_type
         # TODO: do we handle the case when we need to get
         # contents ourselves?
 
@@ -417,6 +425,7 @@ class Form:
     def __init__(self, response, text, parser_features='html.parser'):
         self.response = response
         self.text = text
+        from bs4 import BeautifulSoup
         self.html = BeautifulSoup(self.text, parser_features)
 
         attrs = self.html('form')[0].attrs
@@ -0,0 +1,247 @@
+"""
+A private HTTP cache, like the one of a browser, for
+:class:`~webtest.app.TestApp`::
+
+    app = TestApp(wsgi_app, http_cache=True)
+    app.get('/static/app.js')
+    app.get('/static/app.js')  # served from the cache
+    print(app.http_cache.stats)
+
+It shows how much load the cache headers of an application save.
+"""
+
+import collections
+import functools
+import threading
+import time
+
+import webob
+
+from webtest.compat import urlparse
+
+
+__all__ = ['HTTPCache']
+
+# status codes a cache may store, see RFC 9110 section 15.1
+CACHEABLE_STATUSES = frozenset([200, 203, 204, 300, 301, 308, 404, 405,
+                                410, 414, 501])
+
+# headers of a 304 response which are not merged in the stored response
+NOT_MERGED = frozenset(['content-length', 'content-encoding',
+                        'transfer-encoding', 'content-range'])
+
+
+class _Entry:
+
+    __slots__ = ('status', 'headerlist', 'body', 'stored_at', 'age',
+                 'lifetime', 'vary')
+
+    def __init__(self, status, headerlist, body, vary):
+        self.status = status
+        self.headerlist = headerlist
+        self.body = body
+        self.vary = vary
+        self.update(headerlist)
+
+    def update(self, headerlist):
+        self.headerlist = headerlist
+        self.stored_at = time.time()
+        res = webob.Response(headerlist=list(headerlist))
+        try:
+            self.age = max(int(res.headers.get('Age', 0)), 0)
+        except ValueError:
+            self.age = 0
+        self.lifetime = _freshness_lifetime(res)
+
+    def current_age(self):
+        return self.age + max(time.time() - self.stored_at, 0)
+
+    def is_fresh(self):
+        return self.current_age() < self.lifetime
+
+    def header(self, name):
+        name = name.lower()
+        for key, value in self.headerlist:
+            if key.lower() == name:
+                return value
+        return None
+
+
+def _freshness_lifetime(res):
+    cc = res.cache_control
+    if cc.no_cache:
+        return 0
+    if cc.max_age is not None:
+        return cc.max_age
+    if res.expires is not None:
+        date = res.date
+        if date is None:
+            return res.expires.timestamp() - time.time()
+        return (res.expires - date).total_seconds()
+    return 0
+
+
+class HTTPCache:
+    """
+    Store ``GET`` responses according to their ``Cache-Control``,
+    ``Expires``, ``ETag`` and ``Last-Modified`` headers. Fresh responses
+    are served without calling the application, stale ones are revalidated
+    with ``If-None-Match`` and ``If-Modified-Since``. Other methods remove
+    the responses of their url from the cache.
+
+    There is no heuristic freshness: responses without explicit freshness
+    information are only stored when they can be revalidated.
+
+    The outcome of each request is set in the ``webtest.http_cache`` key
+    of its environ: ``'hit'``, ``'revalidated'``, ``'miss'`` or ``'bypass'``
+    for requests the cache does not handle.
+
+    .. attribute:: stats
+
+        A dict of :class:`collections.Counter` by url, counting ``hits``,
+        ``revalidations`` and ``misses``.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.stats = collections.defaultdict(collections.Counter)
+        self._lock = threading.RLock()
+
+    def wrap(self, app):
+        """Return a WSGI application serving ``app`` through the cache."""
+        return functools.partial(self.handle, app)
+
+    def totals(self):
+        """Return a :class:`collections.Counter` of all the urls."""
+        totals = collections.Counter()
+        with self._lock:
+            for counter in self.stats.values():
+                totals.update(counter)
+        return totals
+
+    def clear(self):
+        """Forget the stored responses and the stats."""
+        with self._lock:
+            self.entries.clear()
+            self.stats.clear()
+
+    def handle(self, app, environ, start_response):
+        req = webob.Request(environ)
+        method = req.method
+        if method != 'GET':
+            environ['webtest.http_cache'] = 'bypass'
+            if method == 'HEAD':
+                return app(environ, start_response)
+            return self._invalidating(app, req, environ, start_response)
+
+        cc = req.cache_control
+        if cc.no_store or req.if_none_match or req.if_modified_since:
+            environ['webtest.http_cache'] = 'bypass'
+            return app(environ, start_response)
+
+        url = req.url
+        with self._lock:
+            entry = self.entries.get(url)
+        if entry is not None and not self._vary_matches(entry, req):
+            entry = None
+        must_revalidate = (cc.no_cache or cc.max_age == 0 or
+                           req.pragma == 'no-cache')
+
+        if entry is not None and not must_revalidate and entry.is_fresh():
+            outcome = 'hit'
+        elif entry is not None and (entry.header('ETag') or
+                                    entry.header('Last-Modified')):
+            res = self._revalidate(app, req, entry)
+            if res.status_int == 304:
+                headers = {name.lower() for name, value in res.headerlist
+                           if name.lower() not in NOT_MERGED}
+                merged = [(name, value) for name, value in entry.headerlist
+                          if name.lower() not in headers]
+                merged.extend((name, value) for name, value in res.headerlist
+                              if name.lower() not in NOT_MERGED)
+                entry.update(merged)
+                outcome = 'revalidated'
+            else:
+                entry = self._store(url, req, res)
+                outcome = 'miss'
+                if entry is None:
+                    return self._send(res.status, res.headerlist, res.body,
+                                      url, outcome, environ, start_response)
+        else:
+            res = req.get_response(app)
+            entry = self._store(url, req, res)
+            outcome = 'miss'
+            if entry is None:
+                return self._send(res.status, res.headerlist, res.body,
+                                  url, outcome, environ, start_response)
+
+        headerlist = [(name, value) for name, value in entry.headerlist
+                      if name.lower() != 'age']
+        if outcome == 'hit':
+            headerlist.append(('Age', str(int(entry.current_age()))))
+        return self._send(entry.status, headerlist, entry.body, url, outcome,
+                          environ, start_response)
+
+    def _send(self, status, headerlist, body, url, outcome, environ,
+              start_response):
+        environ['webtest.http_cache'] = outcome
+        with self._lock:
+            self.stats[url][{'hit': 'hits', 'revalidated': 'revalidations',
+                             'miss': 'misses'}[outcome]] += 1
+        start_response(status, headerlist)
+        return [body]
+
+    def _vary_matches(self, entry, req):
+        for name, value in entry.vary:
+            if req.headers.get(name) != value:
+                return False
+        return True
+
+    def _revalidate(self, app, req, entry):
+        environ = req.environ.copy()
+        etag = entry.header('ETag')
+        if etag:
+            environ['HTTP_IF_NONE_MATCH'] = etag
+        last_modified = entry.header('Last-Modified')
+        if last_modified:
+            environ['HTTP_IF_MODIFIED_SINCE'] = last_modified
+        return webob.Request(environ).get_response(app)
+
+    def _store(self, url, req, res):
+        cc = res.cache_control
+        vary = res.vary or ()
+        if res.status_int not in CACHEABLE_STATUSES or cc.no_store or \
+                '*' in vary:
+            with self._lock:
+                self.entries.pop(url, None)
+            return None
+        entry = _Entry(res.status, list(res.headerlist), res.body,
+                       tuple((name, req.headers.get(name)) for name in vary))
+        if entry.lifetime <= 0 and not (res.etag or res.last_modified):
+            with self._lock:
+                self.entries.pop(url, None)
+            return None
+        with self._lock:
+            self.entries[url] = entry
+        return entry
+
+    def _invalidating(self, app, req, environ, start_response):
+        # unsafe methods invalidate the url and the Location of their
+        # successful responses, see RFC 9111 section 4.4
+        def invalidating_start_response(status, headers, exc_info=None):
+            if status[:1] in ('2', '3'):
+                urls = [req.url]
+                for name, value in headers:
+                    if name.lower() in ('location', 'content-location'):
+                        urls.append(urlparse.urljoin(req.url, value))
+                with self._lock:
+                    for url in urls:
+                        self.entries.pop(url, None)
+            return start_response(status, headers, exc_info)
+        return app(environ, invalidating_start_response)
+
+    def __repr__(self):
+        totals = self.totals()
+        return '<{} {} urls, {} hits, {} revalidations, {} misses>'.format(
+            self.__class__.__name__, len(self.entries), totals['hits'],
+            totals['revalidations'], totals['misses'])
@@ -0,0 +1,243 @@
+"""
+Generate load against a WSGI application from several processes, without
+any network stack.
+
+Each worker process builds its own :class:`~webtest.app.TestApp` and runs
+a scenario in a loop. The latency and status of every request is sent
+back to the parent process, which merges them::
+
+    from webtest import load
+
+    def scenario(app):
+        app.get('/')
+        app.post('/search', {'q': 'webtest'})
+
+    result = load.run(scenario, 'config:production.ini', workers=4,
+                      duration=30)
+    print(result.percentile(99), result.requests_per_second)
+"""
+
+import collections
+import multiprocessing
+import queue as queue_module
+import time
+
+from webtest.app import AppError
+from webtest.app import TestApp
+
+
+__all__ = ['run', 'LoadResult']
+
+
+class LoadResult:
+    """Merged results of a :func:`run`.
+
+    .. attribute:: latencies
+
+        Sorted latencies of all the requests, in seconds.
+
+    .. attribute:: statuses
+
+        A :class:`collections.Counter` of the response status codes.
+        Requests which raised before getting a response are counted as
+        ``None``.
+
+    .. attribute:: errors
+
+        Number of scenario runs which raised an exception, including
+        :class:`~webtest.app.AppError`.
+
+    .. attribute:: error_samples
+
+        A few representations of those exceptions.
+
+    .. attribute:: elapsed
+
+        Wall clock time of the run, in seconds.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.errors = 0
+        self.error_samples = []
+        self.elapsed = 0.0
+
+    def add(self, latency, status):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+
+    @property
+    def requests(self):
+        """Number of requests done."""
+        return len(self.latencies)
+
+    @property
+    def requests_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.requests / self.elapsed
+
+    def percentile(self, percent):
+        """Latency below which ``percent`` percent of the requests are,
+        using the nearest rank method."""
+        if not self.latencies:
+            return None
+        rank = int(round(percent / 100.0 * len(self.latencies)))
+        return self.latencies[min(max(rank, 1), len(self.latencies)) - 1]
+
+    def summary(self):
+        """Return a dict suitable for a json report."""
+        return {
+            'workers': self.workers,
+            'requests': self.requests,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+            'requests_per_second': self.requests_per_second,
+            'statuses': dict(self.statuses),
+            'latency': {
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.latencies[-1] if self.latencies else None,
+            },
+        }
+
+    def __repr__(self):
+        return '<{} {} requests, {} errors, p50={} p99={}>'.format(
+            self.__class__.__name__, self.requests, self.errors,
+            self.percentile(50), self.percentile(99))
+
+
+def _make_test_app(app, app_kwargs):
+    if isinstance(app, str):
+        return TestApp(app, **app_kwargs)
+    return TestApp(app(), **app_kwargs)
+
+
+def _worker(worker_id, app, app_kwargs, scenario, iterations, duration,
+            results, batch_size):
+    test_app = _make_test_app(app, app_kwargs)
+    records = []
+    do_request = test_app.do_request
+
+    def timed_request(req, *args, **kw):
+        start = time.perf_counter()
+        status = None
+        try:
+            res = do_request(req, *args, **kw)
+            status = res.status_int
+            return res
+        except AppError as e:
+            if e.response is not None:
+                status = e.response.status_int
+            raise
+        finally:
+            records.append((time.perf_counter() - start, status))
+            if len(records) >= batch_size:
+                results.put(('records', worker_id, records[:]))
+                del records[:]
+
+    test_app.do_request = timed_request
+
+    errors = 0
+    samples = []
+    deadline = None if duration is None else time.monotonic() + duration
+    done = 0
+    while True:
+        if iterations is not None and done >= iterations:
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        try:
+            scenario(test_app)
+        except Exception as e:
+            errors += 1
+            if len(samples) < 5:
+                samples.append(repr(e)[:500])
+        done += 1
+    if records:
+        results.put(('records', worker_id, records))
+    results.put(('done', worker_id, errors, samples))
+
+
+def run(scenario, app, workers=None, iterations=None, duration=None,
+        batch_size=100, context=None, **app_kwargs):
+    """
+    Run ``scenario`` in ``workers`` processes and return a
+    :class:`LoadResult`.
+
+    :param scenario:
+        A callable taking a :class:`~webtest.app.TestApp`. It is called in
+        a loop by each worker.
+    :param app:
+        A callable without arguments returning the WSGI application, or
+        any string accepted by :class:`~webtest.app.TestApp` like
+        ``'config:test.ini'``. The application is built in each worker.
+    :param workers:
+        Number of processes. Defaults to the number of CPUs.
+    :param iterations:
+        Number of scenario runs per worker.
+    :param duration:
+        Time limit in seconds per worker. At least one of ``iterations``
+        and ``duration`` is required.
+    :param batch_size:
+        Number of records a worker collects before sending them to the
+        parent process.
+    :param context:
+        The :mod:`multiprocessing` context. Defaults to ``fork`` where it
+        is available. Other start methods need a picklable ``scenario``
+        and ``app``.
+
+    Extra keyword arguments are passed to :class:`~webtest.app.TestApp`.
+    """
+    if iterations is None and duration is None:
+        raise ValueError('iterations or duration is required')
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if context is None:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:  # pragma: no cover
+            context = multiprocessing.get_context()
+
+    result = LoadResult(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_worker,
+            args=(i, app, app_kwargs, scenario, iterations, duration,
+                  results, batch_size))
+        for i in range(workers)]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    running = set(range(workers))
+    while running:
+        try:
+            message = results.get(timeout=1)
+        except queue_module.Empty:
+            dead = [i for i in running if not processes[i].is_alive()]
+            if dead and results.empty():
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError(
+                    'load worker(s) %s died unexpectedly' % dead)
+            continue
+        if message[0] == 'records':
+            for latency, status in message[2]:
+                result.add(latency, status)
+        else:
+            running.discard(message[1])
+            result.errors += message[2]
+            result.error_samples.extend(message[3])
+    result.elapsed = time.perf_counter() - start
+    result.latencies.sort()
+
+    for process in processes:
+        process.join()
+    return result
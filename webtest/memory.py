@@ -0,0 +1,97 @@
+"""
+Measure the memory allocated by a request with :mod:`tracemalloc`.
+
+This is used by :class:`~webtest.app.TestApp` when it is created with
+``trace_memory=True``. The result is available as ``res.memory``::
+
+    app = TestApp(wsgi_app, trace_memory=True)
+    res = app.get('/report')
+    assert res.memory.peak < 50 * 1024 * 1024
+    print(res.memory.format())
+"""
+
+import contextlib
+import threading
+import tracemalloc
+
+
+__all__ = ['MemoryUsage', 'trace']
+
+_lock = threading.Lock()
+_ignored = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+class MemoryUsage:
+    """Memory allocated during a request, in bytes.
+
+    .. attribute:: peak
+
+        The highest amount of memory allocated at once, above what was
+        allocated before the request.
+
+    .. attribute:: retained
+
+        Memory still allocated at the end, like the body of the response.
+
+    .. attribute:: top
+
+        The allocation sites which allocated the most memory still
+        allocated at the end, as a list of :class:`tracemalloc.StatisticDiff`.
+    """
+
+    __slots__ = ('peak', 'retained', 'top')
+
+    def __init__(self, peak=0, retained=0, top=()):
+        self.peak = peak
+        self.retained = retained
+        self.top = list(top)
+
+    def format(self, limit=None):
+        """Return a text report of the top allocation sites."""
+        lines = ['peak: {} bytes, retained: {} bytes'.format(
+            self.peak, self.retained)]
+        for stat in self.top[:limit]:
+            lines.append(str(stat))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<{} peak={} retained={}>'.format(
+            self.__class__.__name__, self.peak, self.retained)
+
+
+@contextlib.contextmanager
+def trace(top=10, frames=1):
+    """Yield a :class:`MemoryUsage` which is filled when the block ends,
+    with the ``top`` allocation sites grouped by ``frames`` lines of
+    traceback.
+
+    :mod:`tracemalloc` is started if needed, then stopped. Traced blocks
+    run one at a time since memory is traced for all the threads.
+    """
+    usage = MemoryUsage()
+    with _lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(frames)
+        try:
+            before = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                yield usage
+            finally:
+                end, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                usage.peak = max(peak - current, 0)
+                usage.retained = end - current
+                key = 'traceback' if frames > 1 else 'lineno'
+                diff = after.filter_traces(_ignored).compare_to(
+                    before.filter_traces(_ignored), key)
+                usage.top = [stat for stat in diff
+                             if stat.size_diff > 0][:top]
+        finally:
+            if started:
+                tracemalloc.stop()
@@ -0,0 +1,143 @@
+"""
+Profile the application per route with :mod:`cProfile`.
+
+A :class:`Profiler` collects the profile of every request done by the
+:class:`~webtest.app.TestApp` using it and aggregates them per route, the
+method and the path of the request where ids are replaced by
+placeholders::
+
+    profiler = Profiler()
+    app = TestApp(wsgi_app, profile=profiler)
+    app.get('/users/42')
+    app.get('/users/43')
+    print(profiler.report())
+    profiler.dump('profiles')  # GET_users_{id}.pstats
+"""
+
+import cProfile
+import collections
+import contextlib
+import io
+import os
+import pstats
+import re
+import threading
+
+
+__all__ = ['Profiler']
+
+
+_id_re = re.compile(r'^(\d+|[0-9a-fA-F]{16,})$')
+_uuid_re = re.compile(
+    r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+    r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+
+def default_route(req):
+    """Return the route of the :class:`~webtest.app.TestRequest` ``req``:
+    its method and its path, where numbers and long hexadecimal segments
+    become ``{id}`` and uuids become ``{uuid}``.
+
+        >>> from webtest import TestRequest
+        >>> default_route(TestRequest.blank('/users/42/avatar?size=2'))
+        'GET /users/{id}/avatar'
+    """
+    segments = []
+    for segment in req.path.split('/'):
+        if _id_re.match(segment):
+            segment = '{id}'
+        elif _uuid_re.match(segment):
+            segment = '{uuid}'
+        segments.append(segment)
+    return '{} {}'.format(req.method, '/'.join(segments))
+
+
+class Profiler:
+    """Aggregate :mod:`cProfile` statistics per route.
+
+    :param route:
+        A callable returning the route of a request. Defaults to
+        :func:`default_route`.
+
+    The application is profiled from its call until its body has been
+    read. Profiled requests run one at a time, even when they are done by
+    several threads like with :meth:`~webtest.app.TestApp.map`, because
+    a profiler sees all the threads of the interpreter.
+
+    .. attribute:: stats
+
+        A dict of :class:`pstats.Stats` by route.
+
+    .. attribute:: requests
+
+        A :class:`collections.Counter` of the requests by route.
+    """
+
+    def __init__(self, route=None):
+        self.route = route or default_route
+        self.stats = {}
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def profile(self, req):
+        """Profile the block as a request to the route of ``req``."""
+        route = self.route(req)
+        with self._lock:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                stats = self.stats.get(route)
+                if stats is None:
+                    self.stats[route] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+                self.requests[route] += 1
+
+    def total_time(self, route):
+        """Time spent in the application for ``route``, in seconds."""
+        return self.stats[route].total_tt
+
+    def routes(self):
+        """The profiled routes, the slowest first."""
+        return sorted(self.stats, key=self.total_time, reverse=True)
+
+    def report(self, sort='cumulative', limit=20):
+        """Return a text report of the routes, the slowest first, with
+        the ``limit`` first functions sorted by ``sort`` (any key accepted
+        by :meth:`pstats.Stats.sort_stats`) for each of them."""
+        out = io.StringIO()
+        for route in self.routes():
+            stats = self.stats[route]
+            out.write('{}: {} requests, {:.3f}s\n'.format(
+                route, self.requests[route], stats.total_tt))
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump(self, directory):
+        """Write a ``.pstats`` file per route in ``directory`` and return
+        their paths. They can be loaded with :class:`pstats.Stats` or
+        tools like snakeviz."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for route, stats in sorted(self.stats.items()):
+            name = re.sub(r'[^\w{}.-]+', '_', route).strip('_') or 'root'
+            path = os.path.join(directory, name + '.pstats')
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def clear(self):
+        """Forget all the statistics."""
+        with self._lock:
+            self.stats.clear()
+            self.requests.clear()
+
+    def __repr__(self):
+        return '<{} {} routes, {} requests>'.format(
+            self.__class__.__name__, len(self.stats),
+            sum(self.requests.values()))
@@ -0,0 +1,176 @@
+"""
+Record the responses of an application on disk and replay them later.
+
+This is mostly useful when :class:`~webtest.app.TestApp` proxies a real
+server (``WEBTEST_TARGET_URL`` or an ``http://`` url). Set
+``WEBTEST_RECORD`` to ``record``, ``replay`` or ``auto`` and optionally
+``WEBTEST_RECORDINGS`` to the directory of the recordings::
+
+    $ WEBTEST_TARGET_URL=https://staging.example.com \\
+      WEBTEST_RECORD=record pytest
+    $ WEBTEST_TARGET_URL=https://staging.example.com \\
+      WEBTEST_RECORD=replay pytest
+
+:class:`Recorder` can also wrap any WSGI application.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import webob
+
+
+__all__ = ['Recorder', 'MissingRecording']
+
+MODES = ('record', 'replay', 'auto')
+
+# only meaningful for the connection which received the response
+HOP_BY_HOP = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade',
+])
+
+
+class MissingRecording(LookupError):
+    """Raised in ``replay`` mode for a request which was never recorded."""
+
+
+class Recorder:
+    """
+    A WSGI middleware storing the responses of ``app`` in ``directory``.
+
+    :param mode:
+        ``'record'`` calls ``app`` and stores its responses, replacing
+        previous recordings. ``'replay'`` only serves recorded responses and
+        raises :class:`MissingRecording` for other requests. ``'auto'``
+        replays what was recorded and records the rest.
+    :param headers:
+        Request headers which are part of the fingerprint of a request,
+        along with its method, path, query string and body.
+
+    Each response is stored under the fingerprint of its request and the
+    number of times the same request was done before by this recorder, so
+    a page requested before and after a form submission can have two
+    different recordings. Replaying the n-th identical request falls back
+    to the last recording when there are less than n of them. Bodies are
+    stored once by their sha256.
+
+    .. attribute:: recorded
+
+        Number of responses recorded.
+
+    .. attribute:: replayed
+
+        Number of responses replayed.
+    """
+
+    def __init__(self, app, directory, mode='auto',
+                 headers=('Accept', 'Authorization', 'Content-Type',
+                          'Cookie')):
+        if mode not in MODES:
+            raise ValueError(
+                'mode must be one of %s, not %r' % (', '.join(MODES), mode))
+        self.app = app
+        self.directory = directory
+        self.mode = mode
+        self.headers = headers
+        self.recorded = 0
+        self.replayed = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, req):
+        """Return the fingerprint of the :class:`webob.Request` ``req``."""
+        digest = hashlib.sha256()
+        for value in (req.method, req.path_qs):
+            digest.update(value.encode('utf8') + b'\n')
+        for name in self.headers:
+            value = req.headers.get(name, '')
+            digest.update(f'{name.lower()}: {value}\n'.encode('utf8'))
+        digest.update(req.body)
+        return digest.hexdigest()
+
+    def __call__(self, environ, start_response):
+        req = webob.Request(environ)
+        fingerprint = self.fingerprint(req)
+        with self._lock:
+            index = self._seen.get(fingerprint, 0)
+            self._seen[fingerprint] = index + 1
+
+        if self.mode != 'record':
+            recording = self._load(fingerprint, index)
+            if recording is not None:
+                with self._lock:
+                    self.replayed += 1
+                status, headers, body = recording
+                start_response(status, headers)
+                return [body]
+            if self.mode == 'replay':
+                raise MissingRecording(
+                    'No recording for %s %s (%s) in %s' % (
+                        req.method, req.path_qs, fingerprint,
+                        self.directory))
+
+        res = req.get_response(self.app)
+        headers = [(name, value) for name, value in res.headerlist
+                   if name.lower() not in HOP_BY_HOP]
+        self._save(fingerprint, index, req, res.status, headers, res.body)
+        with self._lock:
+            self.recorded += 1
+        start_response(res.status, headers)
+        return [res.body]
+
+    def _request_path(self, fingerprint, index):
+        return os.path.join(self.directory, 'requests',
+                            '%s-%d.json' % (fingerprint, index))
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest)
+
+    def _load(self, fingerprint, index):
+        for i in range(index, -1, -1):
+            try:
+                with open(self._request_path(fingerprint, i)) as fd:
+                    data = json.load(fd)
+            except FileNotFoundError:
+                continue
+            with open(self._body_path(data['body']), 'rb') as fd:
+                body = fd.read()
+            headers = [(name, value) for name, value in data['headers']]
+            return data['status'], headers, body
+        return None
+
+    def _save(self, fingerprint, index, req, status, headers, body):
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            self._write(body_path, body)
+        data = {
+            'method': req.method,
+            'url': req.path_qs,
+            'status': status,
+            'headers': headers,
+            'body': digest,
+        }
+        self._write(self._request_path(fingerprint, index),
+                    json.dumps(data, indent=2).encode('utf8'))
+
+    def _write(self, path, content):
+        # write then rename so readers never see a partial file
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def __repr__(self):
+        return '<{} {} {}>'.format(
+            self.__class__.__name__, self.mode, self.directory)
@@ -1,5 +1,7 @@
 from functools import cached_property
+import json
 import re
+import time
 
 from webtest import forms
 from webtest import utils
@@ -7,11 +9,171 @@ from webtest.compat import print_stderr
 from webtest.compat import urlparse
 from webtest.compat import to_bytes
 
-from bs4 import BeautifulSoup
-
 import webob
 
 
+class StreamState:
+    """What a response requested with ``stream=True`` needs to finish
+    the request once its body has been consumed."""
+
+    __slots__ = ('app_iter', 'status', 'expect_errors', 'errors', 'expect')
+
+    def __init__(self, app_iter, status, expect_errors, errors, expect=None):
+        self.app_iter = app_iter
+        self.status = status
+        self.expect_errors = expect_errors
+        self.errors = errors
+        self.expect = expect
+
+
+class Timings:
+    """Where the time of a request was spent, in seconds. Available as
+    :attr:`TestResponse.timings` for the requests of a
+    ``TestApp(timings=True)``.
+
+    The phases follow each other so they add up to :attr:`wall`. A phase
+    is None when it did not happen, like ``first_chunk`` for an empty
+    body.
+
+    .. attribute:: environ
+
+        Building the request, from the call of
+        :meth:`~webtest.app.TestApp.get` and friends.
+
+    .. attribute:: cookie_header
+
+        Adding the ``Cookie`` header from the cookie jar.
+
+    .. attribute:: start_response
+
+        Calling the application (and the lint middleware) until it calls
+        ``start_response``.
+
+    .. attribute:: first_chunk
+
+        Waiting for the first chunk of the body.
+
+    .. attribute:: drain
+
+        Reading the remaining of the body.
+
+    .. attribute:: decode
+
+        :meth:`~webob.response.Response.decode_content`. None when it is
+        deferred by ``TestApp(decode_content='lazy')``.
+
+    .. attribute:: cookie_extraction
+
+        Storing the cookies of the response in the cookie jar.
+
+    .. attribute:: checks
+
+        Checking the status and the errors.
+
+    .. attribute:: wall
+
+        Total time.
+
+    .. attribute:: cpu
+
+        CPU time used by the thread running the request.
+
+    For responses requested with ``stream=True``, :attr:`wall` and
+    :attr:`cpu` stop when the response is returned. The body phases are
+    measured from the start of
+    :meth:`~TestResponse.iter_chunks` and ``checks`` by
+    :meth:`~TestResponse.close`.
+    """
+
+    phases = ('environ', 'cookie_header', 'start_response', 'first_chunk',
+              'drain', 'decode', 'cookie_extraction', 'checks')
+
+    __slots__ = ('_started', '_cpu_started', '_stamps', '_stopped',
+                 '_cpu_stopped')
+
+    def __init__(self, started=None, cpu_started=None):
+        if started is None:
+            started = time.perf_counter()
+        if cpu_started is None:
+            cpu_started = time.thread_time()
+        self._started = started
+        self._cpu_started = cpu_started
+        # (phase, perf_counter()) pairs, the phases are computed when read
+        self._stamps = []
+        self._stopped = self._cpu_stopped = None
+
+    def mark(self, phase):
+        """End ``phase`` now. It started when the previous one ended."""
+        self._stamps.append((phase, time.perf_counter()))
+
+    def restart(self):
+        """Start the next phase now."""
+        self._stamps.append((None, time.perf_counter()))
+
+    def stop(self):
+        self._stopped = time.perf_counter()
+        self._cpu_stopped = time.thread_time()
+
+    def _durations(self):
+        durations = {}
+        last = self._started
+        for phase, stamp in self._stamps:
+            if phase is not None:
+                durations[phase] = stamp - last
+            last = stamp
+        return durations
+
+    def __getattr__(self, name):
+        # only called for the phases, which are not slots
+        if name in Timings.phases:
+            return self._durations().get(name)
+        raise AttributeError(name)
+
+    @property
+    def wall(self):
+        if self._stopped is None:
+            return None
+        return self._stopped - self._started
+
+    @property
+    def cpu(self):
+        if self._cpu_stopped is None:
+            return None
+        return self._cpu_stopped - self._cpu_started
+
+    @property
+    def app(self):
+        """Time spent in the application: ``start_response``,
+        ``first_chunk`` and ``drain``."""
+        durations = self._durations()
+        return sum(durations.get(name) or 0.0 for name in
+                   ('start_response', 'first_chunk', 'drain'))
+
+    @property
+    def overhead(self):
+        """Time spent in webtest, outside of the application."""
+        return sum(self._durations().values()) - self.app
+
+    def as_dict(self):
+        """Return the phases, ``wall`` and ``cpu`` as a dict."""
+        durations = self._durations()
+        result = {name: durations.get(name) for name in self.phases}
+        result['wall'] = self.wall
+        result['cpu'] = self.cpu
+        return result
+
+    def __repr__(self):
+        return '<{} wall={} app={} overhead={}>'.format(
+            self.__class__.__name__, self._format(self.wall),
+            self._format(self.app), self._format(self.overhead))
+
+    @staticmethod
+    def _format(value):
+        if value is None:
+            return '?'
+        return '%.3fms' % (value * 1000)
+
+
 class TestResponse(webob.Response):
     """
     Instances of this class are returned by
@@ -20,8 +182,34 @@ class TestResponse(webob.Response):
 
     request = None
     _forms_indexed = None
+    _stream = None
     parser_features = 'html.parser'
 
+    #: A :class:`Timings` of the request, when the
+    #: :class:`~webtest.app.TestApp` records them.
+    timings = None
+
+    #: A :class:`~webtest.memory.MemoryUsage` of the request when the
+    #: :class:`~webtest.app.TestApp` traces memory.
+    memory = None
+
+    #: For responses requested with ``stream=True``, the time in seconds
+    #: the application took to produce the first non empty body chunk,
+    #: from its call, once :meth:`iter_chunks` has produced it. The time
+    #: spent by the caller between the chunks is not counted.
+    time_to_first_byte = None
+
+    #: Size of a ``gzip`` or ``deflate`` body before decoding, None for
+    #: other responses.
+    compressed_size = None
+
+    #: Size of a ``gzip`` or ``deflate`` body after decoding, None until
+    #: it is decoded.
+    decompressed_size = None
+
+    # set by TestApp(decode_content='lazy') until the body is decoded
+    _decode_pending = False
+
     # Tell pytest not to collect this class as tests
     __test__ = False
 
@@ -55,6 +243,89 @@ class TestResponse(webob.Response):
                 "You used response.form, but more than one form exists")
         return forms_[0]
 
+    def iter_chunks(self):
+        """
+        Iterate over the body of a response requested with ``stream=True``
+        as the application produces it. Chunks are not kept in memory so
+        the body can only be iterated once. :meth:`close` is called when
+        the iteration ends.
+
+        For other responses the whole body is yielded at once.
+        """
+        stream = self._stream
+        if stream is None:
+            yield self.body
+            return
+        app_iter = self.app_iter
+        self.app_iter = []
+        if self.timings is not None:
+            self.timings.restart()
+        try:
+            for chunk in app_iter:
+                if self.time_to_first_byte is None:
+                    self.time_to_first_byte = getattr(
+                        app_iter, 'time_to_first_byte', None)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Finish a response requested with ``stream=True``: close the
+        application iterator, then check the status and the errors logged
+        like :meth:`~webtest.app.TestApp.do_request` does for other
+        responses. What was not consumed from the body is discarded.
+
+        Streamed responses can also be used as context managers.
+        Nothing is done for other responses.
+        """
+        self._close_stream(check=True)
+
+    def _close_stream(self, check):
+        stream = self._stream
+        if stream is None:
+            return
+        self._stream = None
+        if self.app_iter is stream.app_iter:
+            self.app_iter = []
+        if hasattr(stream.app_iter, 'close'):
+            stream.app_iter.close()
+        self.errors = stream.errors.getvalue()
+        if check:
+            if self.timings is not None:
+                self.timings.restart()
+            checked = self.test_app._check(
+                self, stream.status, stream.expect_errors, stream.expect,
+                body=False)
+            if checked and self.timings is not None:
+                self.timings.mark('checks')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # don't hide the exception raised in the block with a check failure
+        self._close_stream(check=exc_type is None)
+
+    def _body__get(self):
+        if self._decode_pending:
+            self.decode_content()
+        return webob.Response.body.fget(self)
+
+    body = property(_body__get, webob.Response.body.fset,
+                    webob.Response.body.fdel,
+                    doc=webob.Response.body.__doc__)
+
+    def decode_content(self):
+        """Decode a ``gzip`` or ``deflate`` body and record its
+        :attr:`compressed_size` and :attr:`decompressed_size`."""
+        self._decode_pending = False
+        if self.content_encoding not in ('gzip', 'deflate'):
+            return super().decode_content()
+        self.compressed_size = len(self.body)
+        super().decode_content()
+        self.decompressed_size = len(self.body)
+
     @property
     def testbody(self):
         self.decode_content()
@@ -400,6 +671,7 @@ class TestResponse(webob.Response):
             raise AttributeError(
                 "Not an HTML response body (content-type: %s)"
                 % self.content_type)
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(self.testbody, self.parser_features)
         return soup
 
@@ -545,3 +817,206 @@ class TestResponse(webob.Response):
         else:
             url = 'file://' + name
         webbrowser.open_new(url)
+
+
+class LiteTestResponse:
+    """
+    A compact response for runs doing many requests, selected with
+    ``TestApp(app, response_class=LiteTestResponse)``. The status, the raw
+    header list and the body are kept in slots.
+
+    :attr:`json`, :meth:`~TestResponse.mustcontain`, ``in``,
+    :meth:`~TestResponse.follow`, :attr:`forms` and the other helpers
+    defined here work directly on them. Any other attribute of
+    :class:`TestResponse` is available too: the first access builds the
+    :class:`TestResponse` with :meth:`response`.
+
+    Only the ``method`` and the ``url`` of the request are kept: the
+    :attr:`request` is a new :class:`~webtest.app.TestRequest` built from
+    them when it is used, without the environ or the body of the original
+    one.
+
+    ``gzip`` and ``deflate`` bodies are always decoded. Requests done with
+    ``stream=True`` return a :class:`TestResponse`.
+    """
+
+    __slots__ = ('status', 'headerlist', 'body', 'method', 'url', 'app',
+                 'test_app', 'errors', 'timings', 'memory', 'variables',
+                 'parser_features', '_use_unicode', '_request', '_response',
+                 '_headers', '_html', '_forms_indexed', '_normal_body',
+                 '_unicode_normal_body')
+
+    # Tell pytest not to collect this class as tests
+    __test__ = False
+
+    def __init__(self, status, headerlist, body, request=None,
+                 test_app=None):
+        self.status = status
+        self.headerlist = headerlist
+        self.body = body
+        self.method = self.url = self._request = None
+        self.request = request
+        self.app = None
+        self.test_app = test_app
+        self.errors = ''
+        self.timings = None
+        self.memory = None
+        self.variables = None
+        self.parser_features = TestResponse.parser_features
+        self._use_unicode = True
+        self._response = None
+        self._headers = None
+        self._html = None
+        self._forms_indexed = None
+        self._normal_body = None
+        self._unicode_normal_body = None
+
+    @property
+    def status_int(self):
+        return int(self.status.split(' ', 1)[0])
+
+    status_code = status_int
+
+    def _request__get(self):
+        if self._request is None and self.url is not None:
+            test_app = self.test_app
+            if test_app is not None:
+                request_class = test_app.RequestClass
+            else:
+                from webtest.app import TestRequest as request_class
+            self._request = request_class.blank(self.url,
+                                                method=self.method)
+        return self._request
+
+    def _request__set(self, request):
+        # keep what the helpers need, not the environ
+        self._request = None
+        if request is None:
+            self.method = self.url = None
+        else:
+            self.method = request.method
+            self.url = request.url
+
+    request = property(_request__get, _request__set, doc="""
+        A :class:`~webtest.app.TestRequest` with the method and the url of
+        the request, built when first used.""")
+
+    @property
+    def headers(self):
+        """The headers as a :class:`webob.headers.ResponseHeaders`, sharing
+        :attr:`headerlist`."""
+        if self._headers is None:
+            self._headers = webob.headers.ResponseHeaders(self.headerlist)
+        return self._headers
+
+    def getall(self, name):
+        """Return all the values of the header ``name``."""
+        name = name.lower()
+        return [value for key, value in self.headerlist
+                if key.lower() == name]
+
+    @property
+    def content_type(self):
+        value = self.headers.get('Content-Type')
+        if value is None:
+            return None
+        return value.split(';', 1)[0].strip()
+
+    @property
+    def charset(self):
+        value = self.headers.get('Content-Type', '')
+        for param in value.split(';')[1:]:
+            name, _, charset = param.strip().partition('=')
+            if name.lower() == 'charset':
+                return charset.strip('"\'')
+        return None
+
+    @property
+    def location(self):
+        return self.headers.get('Location')
+
+    @property
+    def text(self):
+        return self.body.decode(self.charset or 'UTF-8')
+
+    @property
+    def json_body(self):
+        return json.loads(self.body.decode('UTF-8'))
+
+    @property
+    def html(self):
+        if self._html is None:
+            self._html = TestResponse.html.func(self)
+        return self._html
+
+    def decode_content(self):
+        # bodies are decoded by TestApp
+        pass
+
+    json = TestResponse.json
+    testbody = TestResponse.testbody
+    normal_body = TestResponse.normal_body
+    unicode_normal_body = TestResponse.unicode_normal_body
+    _normal_body_regex = TestResponse._normal_body_regex
+    _unicode_normal_body_regex = TestResponse._unicode_normal_body_regex
+    __contains__ = TestResponse.__contains__
+    mustcontain = TestResponse.mustcontain
+    forms = TestResponse.forms
+    form = TestResponse.form
+    _parse_forms = TestResponse._parse_forms
+    _follow = TestResponse._follow
+    follow = TestResponse.follow
+    maybe_follow = TestResponse.maybe_follow
+    goto = TestResponse.goto
+    __str__ = TestResponse.__str__
+    __repr__ = TestResponse.__repr__
+
+    def _set_testing_variables(self, variables):
+        for name in variables:
+            if name in LiteTestResponse.__slots__ or \
+                    hasattr(LiteTestResponse, name) or \
+                    hasattr(TestResponse, name):
+                raise ValueError(
+                    "paste.testing_variables contains the variable %r, but "
+                    "the response object already has an attribute by that "
+                    "name" % name)
+        if variables:
+            self.variables = dict(variables)
+
+    def response(self):
+        """Build, once, the :class:`TestResponse` a regular
+        :class:`~webtest.app.TestApp` would have returned."""
+        res = self._response
+        if res is not None:
+            return res
+        test_app = self.test_app
+        if test_app is not None:
+            response_class = test_app.RequestClass.ResponseClass
+        else:
+            response_class = TestResponse
+        res = response_class(status=self.status,
+                             headerlist=list(self.headerlist),
+                             app_iter=[self.body])
+        if self.body and res.content_length is None:
+            res.content_length = len(self.body)
+        res._use_unicode = self._use_unicode
+        res.parser_features = self.parser_features
+        res.request = self.request
+        res.app = self.app
+        res.test_app = test_app
+        res.errors = self.errors
+        res.timings = self.timings
+        res.memory = self.memory
+        for name, value in (self.variables or {}).items():
+            setattr(res, name, value)
+        self._response = res
+        return res
+
+    def __getattr__(self, name):
+        # only called for what is not defined here
+        variables = object.__getattribute__(self, 'variables')
+        if variables and name in variables:
+            return variables[name]
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.response(), name)
@@ -1,4 +1,13 @@
+import io
+import collections
+import os
 import re
+import copy
+import mmap
+import threading
+import time
+import zlib
+from http import cookiejar as http_cookiejar
 from json import dumps
 
 from webtest.compat import urlencode
@@ -105,12 +114,424 @@ def make_pattern(pat):
         "Cannot make callable pattern object out of %r" % pat)
 
 
+class IterableInput:
+    """A file-like ``wsgi.input`` reading lazily from an iterable of
+    bytes chunks. The chunks are kept as they are until read, so reading
+    copies each byte once at most."""
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.chunks = collections.deque()
+        # bytes of the first chunk already read
+        self.offset = 0
+        # bytes left to read in the chunks
+        self.length = 0
+        self.exhausted = False
+
+    def _next_chunk(self):
+        try:
+            chunk = next(self.iterator)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        if isinstance(chunk, str):
+            raise TypeError(
+                'Request body chunks must be bytes, not str')
+        if len(chunk):
+            self.chunks.append(chunk)
+            self.length += len(chunk)
+        return True
+
+    def _take(self, size):
+        if size < 0 or size > self.length:
+            size = self.length
+        if not size:
+            return b''
+        chunks = self.chunks
+        offset = self.offset
+        first = chunks[0]
+        if not offset and len(first) == size and isinstance(first, bytes):
+            chunks.popleft()
+            self.length -= size
+            return first
+        parts = []
+        remaining = size
+        while remaining:
+            chunk = chunks[0]
+            available = len(chunk) - offset
+            if available <= remaining:
+                parts.append(memoryview(chunk)[offset:] if offset else chunk)
+                chunks.popleft()
+                offset = 0
+                remaining -= available
+            else:
+                parts.append(memoryview(chunk)[offset:offset + remaining])
+                offset += remaining
+                remaining = 0
+        self.offset = offset
+        self.length -= size
+        return b''.join(parts)
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        while (size < 0 or self.length < size) and self._next_chunk():
+            pass
+        return self._take(size)
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+        chunks = self.chunks
+        index = 0
+        # bytes before the chunk being searched
+        scanned = 0
+        while True:
+            if index == len(chunks):
+                if not self._next_chunk():
+                    break
+                continue
+            chunk = chunks[index]
+            if isinstance(chunk, memoryview):
+                # memoryviews can not be searched
+                chunk = chunks[index] = chunk.tobytes()
+            start = self.offset if index == 0 else 0
+            end = chunk.find(b'\n', start)
+            if end != -1:
+                line = scanned + end - start + 1
+                if size < 0 or line < size:
+                    size = line
+                break
+            scanned += len(chunk) - start
+            if 0 <= size <= scanned:
+                break
+            index += 1
+        return self._take(size)
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+_mapped_files = collections.OrderedDict()
+_mapped_files_lock = threading.Lock()
+#: Number of files :func:`map_file` keeps mapped.
+mapped_files_max = 16
+
+
+def map_file(path):
+    """Return a read-only :class:`memoryview` of the content of the file at
+    ``path``. Each file is mmap'd once and the mapping is shared by all the
+    callers until the file changes on disk. Only the
+    :data:`mapped_files_max` files used last stay mapped, and files which
+    were removed are forgotten."""
+    stat = os.stat(path)
+    realpath = os.path.realpath(path)
+    key = (realpath, stat.st_size, stat.st_mtime_ns)
+    with _mapped_files_lock:
+        view = _mapped_files.get(key)
+        if view is not None:
+            _mapped_files.move_to_end(key)
+            return view
+        if stat.st_size:
+            with open(path, 'rb') as fd:
+                view = memoryview(mmap.mmap(fd.fileno(), 0,
+                                            access=mmap.ACCESS_READ))
+        else:
+            # empty files can not be mapped
+            view = memoryview(b'')
+        for old_key in [k for k in _mapped_files
+                        if k[0] == realpath or not os.path.exists(k[0])]:
+            del _mapped_files[old_key]
+        _mapped_files[key] = view
+        while len(_mapped_files) > mapped_files_max:
+            _mapped_files.popitem(last=False)
+    return view
+
+
+def clear_mapped_files():
+    """Forget the mappings done by :func:`map_file`."""
+    with _mapped_files_lock:
+        _mapped_files.clear()
+
+
+class FilePart:
+    """The content of the file at ``path``, only read when iterated.
+
+    With ``shared=True`` the file is shared with :func:`map_file` so
+    uploading the same file many times neither reads nor copies it again.
+    Otherwise it is read by chunks and closed once read."""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+        self.size = os.path.getsize(path)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        size = self.chunk_size
+        if not self.shared:
+            with open(self.path, 'rb') as fd:
+                if os.fstat(fd.fileno()).st_size != self.size:
+                    raise ValueError('%s changed since the upload was '
+                                     'prepared' % self.path)
+                for start in range(0, self.size, size):
+                    yield fd.read(min(size, self.size - start))
+            return
+        view = map_file(self.path)
+        if len(view) != self.size:
+            raise ValueError('%s changed since the upload was prepared'
+                             % self.path)
+        for start in range(0, self.size, size):
+            yield view[start:start + size]
+
+    def __repr__(self):
+        return '<FilePart %s (%d bytes)>' % (self.path, self.size)
+
+
+class MultipartBody:
+    """A ``multipart/form-data`` body made of ``lines`` joined by CRLF,
+    as returned by :meth:`webtest.app.TestApp.encode_multipart_stream`.
+
+    Lines are bytes or :class:`FilePart`. The body is never joined in a
+    single bytes object: iterating over it yields :class:`memoryview`
+    slices of the lines and file chunks and ``len()`` gives its exact
+    size. Wrap it in an :class:`IterableInput` to use it as ``wsgi.input``.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, lines):
+        self.parts = []
+        pending = []
+        for i, line in enumerate(lines):
+            if i:
+                pending.append(b'\r\n')
+            if isinstance(line, bytes) and len(line) < 1024:
+                # headers and small values are merged together
+                pending.append(line)
+            else:
+                if pending:
+                    self.parts.append(b''.join(pending))
+                    pending = []
+                self.parts.append(line)
+        if pending:
+            self.parts.append(b''.join(pending))
+        self.length = sum(len(part) for part in self.parts)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        size = self.chunk_size
+        for part in self.parts:
+            if isinstance(part, FilePart):
+                yield from part
+            else:
+                view = memoryview(part)
+                for start in range(0, len(view), size):
+                    yield view[start:start + size]
+
+    def getvalue(self):
+        """Return the whole body as bytes."""
+        return b''.join(self)
+
+    def __repr__(self):
+        return '<MultipartBody (%d bytes)>' % self.length
+
+
+def body_stream(body):
+    """If ``body`` is a file object or an iterable of bytes chunks (other
+    than a list or a tuple), return a ``(wsgi_input, content_length)``
+    pair to stream it to the application. ``content_length`` is None when
+    the size can not be known in advance. Return None for other bodies."""
+    if isinstance(body, (str, bytes, bytearray, memoryview, list, tuple,
+                         dict)) or hasattr(body, 'items'):
+        return None
+    if hasattr(body, 'read'):
+        length = None
+        try:
+            length = os.fstat(body.fileno()).st_size - body.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            try:
+                position = body.tell()
+                length = body.seek(0, io.SEEK_END) - position
+                body.seek(position)
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+        return body, length
+    if hasattr(body, '__iter__'):
+        return IterableInput(body), None
+    return None
+
+
+def set_body_stream(req, stream, length):
+    """Use ``stream`` as the ``wsgi.input`` of ``req``. Without a
+    ``length`` the body is sent like a chunked request."""
+    req.environ['wsgi.input'] = stream
+    if length is None:
+        req.environ.pop('CONTENT_LENGTH', None)
+        req.environ['wsgi.input_terminated'] = True
+        req.environ['HTTP_TRANSFER_ENCODING'] = 'chunked'
+    else:
+        req.content_length = length
+
+
+def copy_cookiejar(cookiejar):
+    """Return an independent copy of ``cookiejar``. Cookie objects are
+    shared since a jar replaces them instead of modifying them."""
+    if not isinstance(cookiejar, http_cookiejar.CookieJar):
+        return copy.deepcopy(cookiejar)
+    new = copy.copy(cookiejar)
+    new._cookies_lock = threading.RLock()
+    with cookiejar._cookies_lock:
+        new._cookies = {
+            domain: {path: dict(cookies) for path, cookies in paths.items()}
+            for domain, paths in cookiejar._cookies.items()}
+    return new
+
+
+class StreamingAppIter:
+    """Iterate over the chunks already ``buffered`` then over the
+    remaining of ``iterator``, an iterator on ``app_iter``. Closing it
+    closes ``app_iter``.
+
+    ``time_to_first_byte`` is the time spent in the application until it
+    produced a non empty chunk: ``app_time``, the time spent before, plus
+    the time of the calls of ``iterator``, but not the time spent by the
+    consumer between them."""
+
+    def __init__(self, app_iter, iterator, buffered=()):
+        self.app_iter = app_iter
+        self.iterator = iterator
+        self.buffered = list(buffered)
+        self.app_time = 0.0
+        self.time_to_first_byte = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.buffered:
+            return self.buffered.pop(0)
+        if self.time_to_first_byte is not None:
+            return next(self.iterator)
+        start = time.perf_counter()
+        try:
+            chunk = next(self.iterator)
+        finally:
+            self.app_time += time.perf_counter() - start
+        if chunk:
+            self.time_to_first_byte = self.app_time
+        return chunk
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+class TimedAppIter:
+    """Wrap an application iterator to mark the ``first_chunk`` and
+    ``drain`` phases of a :class:`~webtest.response.Timings`."""
+
+    def __init__(self, app_iter, timings):
+        self.app_iter = app_iter
+        self.timings = timings
+
+    def __iter__(self):
+        timings = self.timings
+        iterator = iter(self.app_iter)
+        for chunk in iterator:
+            timings.mark('first_chunk')
+            yield chunk
+            break
+        yield from iterator
+        timings.mark('drain')
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+class DecodingAppIter:
+    """Wrap an application iterator producing a ``gzip`` or ``deflate``
+    body to decompress it chunk by chunk. The sizes read and produced are
+    counted in :attr:`compressed_size` and :attr:`decompressed_size`.
+
+    ``content_length``, the ``Content-Length`` of the compressed body, is
+    checked once the iteration ends."""
+
+    def __init__(self, app_iter, encoding, content_length=None):
+        if encoding not in ('gzip', 'deflate'):
+            raise ValueError(
+                "I don't know how to decode the content %s" % encoding)
+        self.app_iter = app_iter
+        self.encoding = encoding
+        self.content_length = content_length
+        self.compressed_size = 0
+        self.decompressed_size = 0
+
+    def __iter__(self):
+        if self.encoding == 'gzip':
+            wbits = 16 + zlib.MAX_WBITS
+        else:
+            wbits = zlib.MAX_WBITS
+        decompressor = zlib.decompressobj(wbits)
+        # kept until the zlib header is checked, to retry as a raw deflate
+        # stream like webob.Response.decode_content() does
+        pending = b'' if self.encoding == 'deflate' else None
+        for chunk in self.app_iter:
+            self.compressed_size += len(chunk)
+            if pending is not None:
+                pending += chunk
+                try:
+                    data = decompressor.decompress(chunk)
+                except zlib.error:
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    data = decompressor.decompress(pending)
+                    pending = None
+                else:
+                    if len(pending) >= 2:
+                        pending = None
+            else:
+                data = decompressor.decompress(chunk)
+            # concatenated gzip members
+            while decompressor.unused_data and self.encoding == 'gzip':
+                unused = decompressor.unused_data
+                data += decompressor.flush()
+                decompressor = zlib.decompressobj(wbits)
+                data += decompressor.decompress(unused)
+            if data:
+                self.decompressed_size += len(data)
+                yield data
+        data = decompressor.flush()
+        if data:
+            self.decompressed_size += len(data)
+            yield data
+        if self.content_length is not None and \
+                self.content_length != self.compressed_size:
+            raise AssertionError(
+                "Content-Length is different from actual app_iter length "
+                "(%r!=%r)" % (self.content_length, self.compressed_size))
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
 class _RequestCookieAdapter:
     """
     cookielib.CookieJar support for webob.Request
     """
     def __init__(self, request):
         self._request = request
+        self._url = None
         self.origin_req_host = request.host
 
     def is_unverifiable(self):
@@ -122,7 +543,10 @@ class _RequestCookieAdapter:
         return True
 
     def get_full_url(self):
-        return self._request.url
+        # cookielib asks for it many times per request
+        if self._url is None:
+            self._url = self._request.url
+        return self._url
 
     @property
     def host(self):
@@ -153,17 +577,19 @@ class _RequestCookieAdapter:
 
 class _ResponseCookieAdapter:
     """
-    cookielib.CookieJar support for webob.Response
+    cookielib.CookieJar support for webob.Response, or anything with a
+    ``getall()`` method like :class:`~webtest.app.BatchResult`
     """
     def __init__(self, response):
-        self._response = response
+        getall = getattr(response, 'getall', None)
+        self._getall = getall or response.headers.getall
 
     def info(self):
         return self
 
     def getheaders(self, header):
-        return self._response.headers.getall(header)
+        return self._getall(header)
 
     def get_all(self, headers, default):  # NOQA
         # This is undocumented method that Python 3 cookielib uses
-        return self._response.headers.getall(headers)
+        return self._getall(headers)